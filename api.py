@@ -1,21 +1,38 @@
-from fastapi import FastAPI, BackgroundTasks, Depends, Query, HTTPException
+from fastapi import FastAPI, BackgroundTasks, Depends, Query, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, desc, func, text, inspect
+from sqlalchemy.orm import Session, defer
+from sqlalchemy import and_, or_, func, text
 from typing import List, Optional, Generator
 import models, database
 from pydantic import BaseModel
 from datetime import datetime
 import asyncio
-from scraper import get_scraper
+from scraper.parser_pool import shutdown_parser_pool
+from scraper.pipeline import run_pipeline, with_deadline
+from scraper.runner import MarketplaceRunner, get_scrape_concurrency
+from ingest import (
+    OfferWriter, archive_missing, load_dealer_configs, queue_counts, iter_frontier,
+    unfinished_frontier, requeue_unfinished, fetch_validators,
+)
+from scraper.http_client import NotModified
+from migrations import apply_migrations
+from refresh import due_vehicles, schedule_refreshes
+from search import search_filter, text_match
+from stats import read_stats, update_stats
+import exports
+import artifacts
+import cache
+from exports import with_latest_snapshot
 import logging
 import json
 import os
-import csv
-import io
 import time
 import re
-from fastapi.responses import StreamingResponse
+import base64
+import gzip
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi.responses import StreamingResponse, FileResponse
+from responses import CompressionMiddleware, FastJSONResponse, negotiate_encoding
 
 # Konfiguracja loggera
 logging.basicConfig(level=logging.INFO)
@@ -23,6 +40,35 @@ logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Auto-Scraper API")
 
+# Odpowiedzi niecache'owane (nagłówki ustawiane per żądanie)
+UNCACHED_HEADERS = {"content-length", "set-cookie", "date", "server"}
+
+# Rejestrowane przed CORS - CORS jest warstwą zewnętrzną i dodaje nagłówki także do odpowiedzi z cache
+@app.middleware("http")
+async def response_cache_middleware(request: Request, call_next):
+    """Cache odpowiedzi GET endpointów odczytu pod wersją danych (cache.py) z ETag / 304."""
+    cacheable, ttl = cache.cache_ttl(request.url.path)
+    if request.method != "GET" or not cacheable:
+        return await call_next(request)
+
+    token = cache.data_version.cached_token() or await asyncio.to_thread(cache.data_version.current_token)
+    key = cache.response_key(request.url.path, request.query_params.multi_items())
+    entry = cache.responses.get(token, key, ttl)
+    if entry is None:
+        response = await call_next(request)
+        if response.status_code != 200:
+            return response
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        headers = {k: v for k, v in response.headers.items() if k.lower() not in UNCACHED_HEADERS}
+        entry = cache.CachedResponse(body, response.status_code, headers, cache.body_etag(body), time.monotonic())
+        cache.responses.put(token, key, entry)
+
+    headers = {**entry.headers, "ETag": entry.etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and entry.etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers={"ETag": entry.etag, "Cache-Control": "no-cache"})
+    return Response(content=entry.body, status_code=entry.status_code, headers=headers)
+
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:3000")
 
 app.add_middleware(
@@ -32,7 +78,11 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Paginacja GET /vehicles (odczyt nagłówków z przeglądarki)
+    expose_headers=["X-Total-Count", "X-Total-Count-Exact", "X-Next-Cursor", "X-Change-Cursor", "ETag"],
 )
+# Warstwa zewnętrzna: kompresuje odpowiedzi (także z cache) wg Accept-Encoding
+app.add_middleware(CompressionMiddleware)
 
 class ScraperConfigCreate(BaseModel):
     marketplace: str
@@ -103,54 +153,6 @@ def delete_dealer_config(config_id: int, db: Session = Depends(database.get_db))
     raise HTTPException(status_code=404, detail="Not found")
 
 models.Base.metadata.create_all(bind=database.engine)
-
-def apply_migrations():
-    """Prosta migracja dodająca brakujące kolumny."""
-    try:
-        inspector = inspect(database.engine)
-        tables = inspector.get_table_names()
-        if 'vehicle_snapshots' in tables:
-            columns = [c['name'] for c in inspector.get_columns('vehicle_snapshots')]
-            with database.engine.connect() as conn:
-                if 'equipment' not in columns:
-                    logger.info("Dodawanie kolumny 'equipment' do vehicle_snapshots")
-                    conn.execute(text("ALTER TABLE vehicle_snapshots ADD COLUMN equipment TEXT"))
-                if 'additional_equipment' not in columns:
-                    logger.info("Dodawanie kolumny 'additional_equipment' do vehicle_snapshots")
-                    conn.execute(text("ALTER TABLE vehicle_snapshots ADD COLUMN additional_equipment TEXT"))
-                conn.commit()
-
-        if 'vehicles' in tables:
-            columns = [c['name'] for c in inspector.get_columns('vehicles')]
-            with database.engine.connect() as conn:
-                if 'status' not in columns:
-                    logger.info("Dodawanie kolumny 'status' do vehicles")
-                    conn.execute(text("ALTER TABLE vehicles ADD COLUMN status VARCHAR DEFAULT 'active'"))
-                if 'dealer_street' not in columns:
-                    logger.info("Dodawanie kolumny 'dealer_street' do vehicles")
-                    conn.execute(text("ALTER TABLE vehicles ADD COLUMN dealer_street VARCHAR"))
-                if 'dealer_postcode' not in columns:
-                    logger.info("Dodawanie kolumny 'dealer_postcode' do vehicles")
-                    conn.execute(text("ALTER TABLE vehicles ADD COLUMN dealer_postcode VARCHAR"))
-                if 'dealer_city' not in columns:
-                    logger.info("Dodawanie kolumny 'dealer_city' do vehicles")
-                    conn.execute(text("ALTER TABLE vehicles ADD COLUMN dealer_city VARCHAR"))
-                if 'dealer_map_link' not in columns:
-                    logger.info("Dodawanie kolumny 'dealer_map_link' do vehicles")
-                    conn.execute(text("ALTER TABLE vehicles ADD COLUMN dealer_map_link VARCHAR"))
-                if 'dealer_id' not in columns:
-                    logger.info("Dodawanie kolumny 'dealer_id' do vehicles")
-                    conn.execute(text("ALTER TABLE vehicles ADD COLUMN dealer_id VARCHAR"))
-                if 'rodzaj_sprzedazy' not in columns:
-                    logger.info("Dodawanie kolumny 'rodzaj_sprzedazy' do vehicles")
-                    conn.execute(text("ALTER TABLE vehicles ADD COLUMN rodzaj_sprzedazy VARCHAR"))
-                if 'dealer_group' not in columns:
-                    logger.info("Dodawanie kolumny 'dealer_group' do vehicles")
-                    conn.execute(text("ALTER TABLE vehicles ADD COLUMN dealer_group VARCHAR"))
-                conn.commit()
-    except Exception as e:
-        logger.error(f"Błąd podczas migracji: {e}")
-
 apply_migrations()
 
 scrape_progress = {
@@ -162,18 +164,19 @@ scrape_progress = {
 
 # Pydantic models for API responses
 class VehicleSchema(BaseModel):
+    # Wszystkie pola poza id opcjonalne - GET /vehicles?fields= zwraca tylko wybrane
     id: int
-    url: str
-    marka: Optional[str]
-    model: Optional[str]
-    wersja: Optional[str]
-    rocznik: Optional[int]
-    typ_nadwozia: Optional[str]
-    lokalizacja_miasto: Optional[str]
-    latest_price: Optional[int]
-    latest_mileage: Optional[int]
-    latest_image: Optional[str]
-    scraped_at: Optional[datetime]
+    url: Optional[str] = None
+    marka: Optional[str] = None
+    model: Optional[str] = None
+    wersja: Optional[str] = None
+    rocznik: Optional[int] = None
+    typ_nadwozia: Optional[str] = None
+    lokalizacja_miasto: Optional[str] = None
+    latest_price: Optional[int] = None
+    latest_mileage: Optional[int] = None
+    latest_image: Optional[str] = None
+    scraped_at: Optional[datetime] = None
     equipment: Optional[dict] = None
 
     class Config:
@@ -204,14 +207,42 @@ class ScrapeLogSchema(BaseModel):
         from_attributes = True
 
 
-async def run_scraper_task(marketplace: str = "autopunkt", limit: Optional[int] = None, log_id: Optional[int] = None):
+# Pojemność kolejki URL-i między zbieraniem a parsowaniem (0 = 4 * równoległość)
+SCRAPE_QUEUE_SIZE = int(os.getenv("SCRAPE_QUEUE_SIZE", "0"))
+
+# "inprocess" - scrapowanie w tle procesu API (domyślnie),
+# "worker" - API tylko kolejkuje przebiegi, wykonują je procesy `python -m scraper.worker`
+SCRAPE_MODE = os.getenv("SCRAPE_MODE", "inprocess")
+
+# Wznawianie przebiegu przerwanego restartem API przy starcie (1 = włączone)
+SCRAPE_AUTO_RESUME = os.getenv("SCRAPE_AUTO_RESUME", "0") == "1"
+# Referencje do zadań wznowionych przy starcie (żeby nie zebrał ich garbage collector)
+resume_tasks = set()
+
+async def run_scraper_task(marketplace: str = "autopunkt", limit: Optional[int] = None, log_id: Optional[int] = None,
+                           resume: bool = False, mode: str = "full", time_budget: Optional[int] = None):
+    """
+    Przebieg scrapowania w procesie API. URL-e i status każdego z nich są zapisywane
+    w scrape_queue, więc przerwany przebieg można wznowić (resume=True) bez ponownego
+    zbierania i bez pobierania już zapisanych ofert.
+
+    mode="refresh" pomija zbieranie URL-i i odświeża zaległe oferty wg harmonogramu
+    (refresh.py); `limit` jest wtedy budżetem requestów, `time_budget` - budżetem czasu (s).
+    """
     global scrape_progress
     db = database.SessionLocal()
     
     scrape_log = None
+    runner = None
     if log_id:
         scrape_log = db.query(models.ScrapeLog).filter(models.ScrapeLog.id == log_id).first()
-    
+    if not scrape_log:
+        # Np. przebieg z harmonogramu - frontier wymaga wpisu w scrape_logs
+        scrape_log = models.ScrapeLog(marketplace=marketplace, status="running", scrape_limit=limit, mode=mode, time_budget=time_budget)
+        db.add(scrape_log)
+        db.commit()
+    log_id = scrape_log.id
+
     try:
         scrape_progress["status"] = "collecting"
         scrape_progress["message"] = f"Zbieranie URL-i ofert ({marketplace})..."
@@ -220,18 +251,13 @@ async def run_scraper_task(marketplace: str = "autopunkt", limit: Optional[int]
         
         logger.info(f"Starting background scrape task for {marketplace}...")
         
-        session = None
-        if marketplace == "pewneauto":
-            import scraper_pewneauto as scraper
-            import requests
-            session = requests.Session()
-            urls = []
-            url_to_group = {}
-            configs = db.query(models.ScraperConfig).filter(models.ScraperConfig.marketplace == "pewneauto").all()
-            configs = [c for c in configs if c.is_active]
+        deadline = time.monotonic() + time_budget if time_budget else None
+        dealer_configs = []
+        if marketplace == "pewneauto" and mode != "refresh":
+            dealer_configs = load_dealer_configs(db, "pewneauto")
 
             # Default configuration if none found
-            if not configs:
+            if not dealer_configs:
                 logger.warning("No active configs found for pewneauto. Skipping scrape.")
                 scrape_progress["status"] = "complete"
                 scrape_progress["message"] = "Brak aktywnych konfiguracji dla Pewne Auto."
@@ -241,152 +267,138 @@ async def run_scraper_task(marketplace: str = "autopunkt", limit: Optional[int]
                     db.commit()
                 return
 
-            for conf in configs:
-                logger.info(f"Scraping config: {conf.dealer_name} ({conf.base_url})")
-                conf_urls = await asyncio.to_thread(scraper.collect_offer_links, session, max_pages=10 if limit else 1000, base_url=conf.base_url)
-                for u in conf_urls:
-                    url_to_group.setdefault(u, conf.dealer_name)
-                urls.extend(list(conf_urls))
+        runner = MarketplaceRunner(marketplace, dealer_configs=dealer_configs)
+
+        # Źródło URL-i: przy wznowieniu najpierw niezapisane URL-e z kolejki przebiegu,
+        # potem (jeśli zbieranie nie zostało ukończone) dalsze zbieranie z pominięciem znanych URL-i
+        leftover = unfinished_frontier(db, log_id) if resume else []
+        for url, dealer_group in leftover:
+            if dealer_group:
+                runner.url_to_group[url] = dealer_group
+        if leftover:
+            logger.info(f"Wznawianie przebiegu {log_id}: {len(leftover)} niezapisanych ofert")
+
+        if mode == "refresh":
+            # Zamiast zbierania: znane oferty, których termin odświeżenia minął (najpilniejsze najpierw)
+            due = due_vehicles(db, marketplace, limit)
+            logger.info(f"Odświeżanie {marketplace}: {len(due)} zaległych ofert")
+            for url, dealer_group in due:
+                if dealer_group:
+                    runner.url_to_group.setdefault(url, dealer_group)
+
+            async def discovered_urls():
+                for url, _ in due:
+                    yield url
         else:
-            scraper = get_scraper(marketplace)
-            if marketplace == "autopunkt":
-                urls = await scraper.collect_urls(limit=limit)
-            elif marketplace == "findcar":
-                max_pages = (limit // 50) + 1 if limit else 1000
-                urls = await scraper.collect_urls(max_pages=max_pages)
-            elif marketplace in ["fiat_pgd", "pgd", "fiat"]:
-                urls = await scraper.collect_urls(limit=limit)
-            else:  # vehis
-                max_pages = (limit // 50) + 1 if limit else 1000
-                urls = await scraper.collect_urls(max_pages=max_pages, page_size=50)
-        
-        if limit and limit < len(urls):
-            logger.info(f"Ograniczam do {limit} ofert")
-            urls = urls[:limit]
-        
-        scrape_progress["total"] = len(urls)
-        scrape_progress["status"] = "scraping"
-        
-        for i, url in enumerate(urls):
+            def discovered_urls():
+                return runner.iter_urls(limit=limit)
+
+        # Walidatory HTTP (ETag / Last-Modified) ładowane paczkami razem z URL-ami, poza pętlą zdarzeń
+        validators: dict[str, dict] = {}
+
+        async def url_source():
+            for start in range(0, len(leftover), concurrency):
+                if deadline is not None and time.monotonic() >= deadline:
+                    return
+                chunk = [url for url, _ in leftover[start:start + concurrency]]
+                validators.update(await asyncio.to_thread(fetch_validators, chunk))
+                for url in chunk:
+                    yield url
+            if not scrape_log.discovery_done:
+                async for url in iter_frontier(log_id, marketplace, with_deadline(discovered_urls(), deadline),
+                                               runner.url_to_group, limit=limit, flush_size=concurrency,
+                                               validators=validators):
+                    yield url
+
+        # Potok: zbieranie URL-i i równoległe parsowanie ofert (poza pętlą zdarzeń),
+        # zapis do bazy w kolejności ukończenia
+        concurrency = get_scrape_concurrency(marketplace)
+        logger.info(f"Parsowanie ofert ({marketplace}) z równoległością {concurrency}")
+        processed = 0
+
+        def on_discovered(count: int):
+            scrape_progress["status"] = "scraping"
+            scrape_progress["total"] = count
+
+        # Zapis paczkami: oferty, heartbeaty 304 i statusy URL-i (jedna transakcja na paczkę)
+        writer = OfferWriter(marketplace, log_id)
+
+        async def handle(url: str):
+            nonlocal processed
+            error = None
+            unchanged = False
             try:
-                scrape_progress["current"] = i + 1
-                scrape_progress["message"] = f"Parsowanie oferty {i + 1} z {len(urls)}"
-                
-                if marketplace == "pewneauto":
-                    data = await asyncio.to_thread(scraper.scrape_offer, session, url)
-                    if not data:
-                        continue
-                    data["dealer_group"] = url_to_group.get(url)
-                else:
-                    data = scraper.parse_offer(url)
-
-                model_keys = models.Vehicle.__table__.columns.keys()
-                vehicle_data = {k: v for k, v in data.items() if k in model_keys}
-
-                vehicle = db.query(models.Vehicle).filter(models.Vehicle.url == url).first()
-                if not vehicle:
-                    vehicle_data["status"] = "active"
-                    vehicle = models.Vehicle(**vehicle_data)
-                    db.add(vehicle)
-                    db.flush()
-                else:
-                    vehicle.status = "active"
-                    for k, v in vehicle_data.items():
-                        if v is not None and k not in ("id", "url", "created_at", "status"):
-                            setattr(vehicle, k, v)
-                
-                # Normalize equipment for snapshots
-                if marketplace == "autopunkt" or marketplace == "pewneauto":
-                    equipment_json = {
-                        "technologia": data.get("technologia"),
-                        "komfort": data.get("komfort"),
-                        "bezpieczenstwo": data.get("bezpieczenstwo"),
-                        "wyglad": data.get("wyglad") or data.get("wyposazenie_inne"),
-                    }
-                elif marketplace in ["findcar", "fiat_pgd", "pgd", "fiat"]:
-                    equipment_json = {
-                        "technologia": data.get("equipment_audio_multimedia"),
-                        "komfort": data.get("equipment_comfort_extras"),
-                        "bezpieczenstwo": data.get("equipment_safety"),
-                        "wyglad": data.get("equipment_other"),
-                        "additional_info_header": data.get("additional_info_header"),
-                        "additional_info_content": data.get("additional_info_content"),
-                    }
-                else:  # vehis
-                    equipment_json = {
-                        "technologia": data.get("equipment_audio_multimedia"),
-                        "komfort": data.get("equipment_comfort_extras"),
-                        "bezpieczenstwo": data.get("equipment_safety"),
-                        "wyglad": data.get("equipment_other"),
-                        "additional_info_content": data.get("additional_info_content"),
-                    }
-                
-                snapshot = models.VehicleSnapshot(
-                    vehicle_id=vehicle.id,
-                    price=data.get("cena_brutto_pln") or data.get("cena_netto_pln"),
-                    old_price=data.get("stara_cena_pln") or data.get("omnibus_lowest_30d_pln"),
-                    mileage=data.get("przebieg_km"),
-                    equipment_json=equipment_json,
-                    equipment=data.get("equipment"),
-                    additional_equipment=data.get("additional_equipment"),
-                    tags=data.get("tagi_oferty") or data.get("additional_info_header"),
-                    pictures=data.get("zdjecia"),
-                    source=data.get("source", "autopunkt.pl"),
-                    scraped_at=datetime.now()
-                )
-                db.add(snapshot)
-                db.commit()
-                logger.info(f"Logged snapshot for: {vehicle.marka} {vehicle.model} (ID: {vehicle.id}) from {marketplace}")
-                
+                data = await runner.parse(url, validators=validators.pop(url, None))
+            except NotModified:
+                data, unchanged = None, True
             except Exception as e:
                 logger.error(f"Error scraping {url}: {e}")
-                db.rollback()
+                data, error = None, str(e)
+            finally:
+                processed += 1
+                scrape_progress["current"] = processed
+                scrape_progress["message"] = f"Parsowanie oferty {processed} z {scrape_progress['total']}"
+
+            if unchanged:
+                await writer.add_unchanged(url)
+            elif data:
+                await writer.add(url, data)
+            else:
+                await writer.add_failed(url, error or "Brak danych oferty")
+
+        await run_pipeline(
+            url_source(),
+            handle,
+            workers=concurrency,
+            queue_size=SCRAPE_QUEUE_SIZE or None,
+            on_discovered=on_discovered,
+        )
+        await writer.flush()
+        scrape_log.discovery_done = 1
+        db.commit()
+
+        # Archiwizacja i licznik obejmują cały przebieg, także część sprzed wznowienia
+        total_urls = sum(queue_counts(db, log_id).values())
+        scrape_progress["total"] = total_urls
         
         # Archiving logic: if this was a full scrape (no limit, or limit was 0), 
-        # mark all vehicles for this marketplace that were NOT in the scraped URLs as "archiwum".
+        # mark all vehicles for this marketplace that were NOT seen in this run as "archiwum".
         # For findcar/vehis, a full scrape might mean max_pages is high and no limit provided.
         # For autopunkt, urls can be up to 3000+. Let's assume if limit is None, it is a full scrape.
-        is_full_scrape = True if (not limit or limit == 0) else False
+        is_full_scrape = True if (mode == "full" and not limit and not time_budget) else False
         
         # Additional safety check: If it's Autopunkt and we found very few URLs without a limit, 
         # it might be a silent failure of Playwright, but usually we trust `limit is None`.
-        if is_full_scrape and urls:
+        if is_full_scrape and total_urls:
             try:
-                # Find current active vehicles for this marketplace
-                # Scraper sets source as "autopunkt.pl", "findcar.pl", "vehis.pl", "fiat.pgd.pl"
-                if marketplace in ["fiat_pgd", "pgd", "fiat"]:
-                    source_domain = "fiat.pgd.pl"
-                else:
-                    source_domain = f"{marketplace}.pl" if not marketplace.endswith('.pl') else marketplace
-                active_urls = set(urls)
-                db_vehicles = db.query(models.Vehicle.id, models.Vehicle.url).filter(
-                    models.Vehicle.source == source_domain, 
-                    or_(models.Vehicle.status == 'active', models.Vehicle.status.is_(None))
-                ).all()
-                
-                archived_count = 0
-                for v_id, v_url in db_vehicles:
-                    if v_url not in active_urls:
-                        db.query(models.Vehicle).filter(models.Vehicle.id == v_id).update({"status": "archiwum"})
-                        archived_count += 1
-                        
-                if archived_count > 0:
-                    db.commit()
-                    logger.info(f"Oznaczono {archived_count} pojazdów jako 'archiwum' dla {marketplace}")
+                archive_missing(db, marketplace, log_id)
             except Exception as e:
                 logger.error(f"Error during archiving logic: {e}")
                 db.rollback()
         
+        try:
+            schedule_refreshes(db, marketplace)
+        except Exception as e:
+            logger.error(f"Error scheduling refreshes: {e}")
+            db.rollback()
+        stats = update_stats(db)
+
         scrape_progress["status"] = "complete"
-        scrape_progress["message"] = f"Zakończono! Zebrano {len(urls)} ofert z {marketplace}"
+        scrape_progress["message"] = f"Zakończono! Zebrano {total_urls} ofert z {marketplace}"
         logger.info(f"Scrape task for {marketplace} finished.")
         
-        if scrape_log:
-            scrape_log.status = "completed"
-            scrape_log.vehicles_scraped = len(urls)
-            scrape_log.end_time = datetime.utcnow()
-            scrape_log.total_vehicles_in_db = db.query(models.Vehicle).count()
-            db.commit()
+        scrape_log.status = "completed"
+        scrape_log.vehicles_scraped = total_urls
+        scrape_log.end_time = datetime.utcnow()
+        scrape_log.total_vehicles_in_db = stats.total_vehicles if stats else db.query(models.Vehicle).count()
+        db.commit()
+        cache.data_version.invalidate()
+
+        # Gotowe eksporty car-scout dla źródła (serwowane z dysku z ETag)
+        try:
+            await asyncio.to_thread(artifacts.refresh_artifacts, marketplace)
+        except Exception as e:
+            logger.error(f"Error refreshing export artifacts: {e}")
         
     except Exception as e:
         scrape_progress["status"] = "error"
@@ -394,6 +406,7 @@ async def run_scraper_task(marketplace: str = "autopunkt", limit: Optional[int]
         logger.error(f"Scrape task error: {e}")
         
         if scrape_log:
+            db.rollback()
             scrape_log.status = "error"
             scrape_log.error_message = str(e)
             scrape_log.end_time = datetime.utcnow()
@@ -401,21 +414,61 @@ async def run_scraper_task(marketplace: str = "autopunkt", limit: Optional[int]
             db.commit()
             
     finally:
+        if runner is not None:
+            await runner.aclose()
         db.close()
 
+def enqueue_scrape(db: Session, marketplace: str, limit: Optional[int] = None, mode: str = "full",
+                   time_budget: Optional[int] = None) -> models.ScrapeLog:
+    """Tworzy przebieg ze statusem 'queued' - podejmie go pierwszy wolny worker."""
+    new_log = models.ScrapeLog(
+        marketplace=marketplace,
+        status="queued",
+        scrape_limit=limit,
+        mode=mode,
+        time_budget=time_budget,
+        discovery_done=0
+    )
+    db.add(new_log)
+    db.commit()
+    db.refresh(new_log)
+    logger.info(f"Scrape for {marketplace} queued for workers (log_id={new_log.id})")
+    return new_log
+
 # API Endpoints
 @app.get("/")
 def read_root():
     return {"message": "Auto-Scraper API with Trends is running"}
 
 @app.post("/scrape")
-async def trigger_scrape(background_tasks: BackgroundTasks, marketplace: str = "autopunkt", limit: Optional[int] = None, db: Session = Depends(database.get_db)):
+async def trigger_scrape(background_tasks: BackgroundTasks, marketplace: str = "autopunkt", limit: Optional[int] = None,
+                         resume: Optional[int] = None, mode: str = "full", time_budget: Optional[int] = None,
+                         db: Session = Depends(database.get_db)):
+    """
+    Uruchamia przebieg scrapowania. `resume=<log_id>` wznawia przerwany przebieg:
+    pomija zbieranie URL-i (jeśli zostało ukończone) i oferty już zapisane.
+    `mode=refresh` odświeża zaległe oferty wg harmonogramu w ramach budżetu
+    requestów (`limit`) i/lub czasu (`time_budget`, sekundy).
+    """
     global scrape_progress
+
+    if resume:
+        return resume_scrape(background_tasks, resume, db)
+    if mode not in ("full", "refresh"):
+        raise HTTPException(status_code=400, detail="mode musi być 'full' lub 'refresh'")
+
+    if SCRAPE_MODE == "worker":
+        new_log = enqueue_scrape(db, marketplace, limit, mode, time_budget)
+        scrape_progress = {"status": "collecting", "current": 0, "total": 0, "message": "Oczekiwanie na wolnego workera...", "log_id": new_log.id, "marketplace": marketplace}
+        return {"message": f"Scrape for {marketplace} queued for workers", "log_id": new_log.id}
     
     # Create the log entry first
     new_log = models.ScrapeLog(
         marketplace=marketplace,
-        status="running"
+        status="running",
+        scrape_limit=limit,
+        mode=mode,
+        time_budget=time_budget
     )
     db.add(new_log)
     db.commit()
@@ -423,12 +476,72 @@ async def trigger_scrape(background_tasks: BackgroundTasks, marketplace: str = "
     log_id = new_log.id
     
     scrape_progress = {"status": "idle", "current": 0, "total": 0, "message": "", "log_id": log_id, "marketplace": marketplace}
-    background_tasks.add_task(run_scraper_task, marketplace=marketplace, limit=limit, log_id=log_id)
+    background_tasks.add_task(run_scraper_task, marketplace=marketplace, limit=limit, log_id=log_id, mode=mode, time_budget=time_budget)
     return {"message": f"Scrape for {marketplace} started in background", "log_id": log_id}
 
+def resume_scrape(background_tasks: BackgroundTasks, log_id: int, db: Session):
+    global scrape_progress
+    scrape_log = db.query(models.ScrapeLog).filter(models.ScrapeLog.id == log_id).first()
+    if not scrape_log:
+        raise HTTPException(status_code=404, detail="Not found")
+    if scrape_log.status == "completed":
+        raise HTTPException(status_code=409, detail="Przebieg został już zakończony")
+    if scrape_log.status == "queued":
+        raise HTTPException(status_code=409, detail="Przebieg czeka już na workera")
+    # W trybie worker 'running' może oznaczać worker, który przestał działać w trakcie zbierania
+    if scrape_log.status == "running" and SCRAPE_MODE != "worker":
+        raise HTTPException(status_code=409, detail="Przebieg jest w trakcie")
+
+    # Nieudane i przerwane w trakcie URL-e wracają do kolejki
+    requeued = requeue_unfinished(db, log_id)
+    scrape_log.error_message = None
+    scrape_log.end_time = None
+    marketplace = scrape_log.marketplace
+    logger.info(f"Resuming scrape {log_id} ({marketplace}): {requeued} URLs to process")
+
+    if SCRAPE_MODE == "worker":
+        # Worker dokończy zbieranie (jeśli było przerwane) i zamknie przebieg
+        scrape_log.status = "queued"
+        db.commit()
+        scrape_progress = {"status": "collecting", "current": 0, "total": 0, "message": "Oczekiwanie na wolnego workera...", "log_id": log_id, "marketplace": marketplace}
+        return {"message": f"Scrape {log_id} for {marketplace} re-queued for workers", "log_id": log_id}
+
+    scrape_log.status = "running"
+    db.commit()
+    scrape_progress = {"status": "idle", "current": 0, "total": 0, "message": "", "log_id": log_id, "marketplace": marketplace}
+    background_tasks.add_task(run_scraper_task, marketplace=marketplace, limit=scrape_log.scrape_limit, log_id=log_id, resume=True,
+                              mode=scrape_log.mode or "full", time_budget=scrape_log.time_budget)
+    return {"message": f"Scrape {log_id} for {marketplace} resumed in background", "log_id": log_id}
+
+def read_queue_progress(log_id: int) -> dict:
+    """Postęp przebiegu wykonywanego przez workery - liczony z tabeli scrape_queue."""
+    db = database.SessionLocal()
+    try:
+        scrape_log = db.query(models.ScrapeLog).filter(models.ScrapeLog.id == log_id).first()
+        if not scrape_log:
+            return {"status": "error", "message": "Nie znaleziono przebiegu", "current": 0, "total": 0}
+        counts = queue_counts(db, log_id)
+        total = sum(counts.values())
+        current = counts.get("done", 0) + counts.get("failed", 0) + counts.get("skipped", 0)
+        if scrape_log.status == "queued":
+            status, message = "collecting", "Oczekiwanie na wolnego workera..."
+        elif scrape_log.status == "completed":
+            status, message = "complete", f"Zakończono! Zebrano {total} ofert z {scrape_log.marketplace}"
+        elif scrape_log.status == "error":
+            status, message = "error", f"Błąd: {scrape_log.error_message}"
+        elif not scrape_log.discovery_done:
+            status, message = "scraping" if total else "collecting", f"Zbieranie URL-i ofert ({scrape_log.marketplace}), znaleziono {total}..."
+        else:
+            status, message = "scraping", f"Parsowanie oferty {current} z {total}"
+        return {"status": status, "message": message, "current": current, "total": total}
+    finally:
+        db.close()
+
 def generate_progress() -> Generator[str, None, None]:
     global scrape_progress
     while True:
+        if SCRAPE_MODE == "worker" and scrape_progress.get("log_id"):
+            scrape_progress.update(read_queue_progress(scrape_progress["log_id"]))
         data = json.dumps({
             "status": scrape_progress["status"],
             "message": scrape_progress["message"],
@@ -452,10 +565,62 @@ def get_scrape_logs(skip: int = 0, limit: int = 50, db: Session = Depends(databa
     logs = db.query(models.ScrapeLog).order_by(models.ScrapeLog.start_time.desc()).offset(skip).limit(limit).all()
     return logs
 
-@app.get("/vehicles", response_model=List[VehicleSchema])
+# Sortowanie listy pojazdów: kolumna, malejąco, czy może mieć NULL (NULL-e na końcu)
+VEHICLE_SORTS = {
+    "newest": (models.VehicleSnapshot.scraped_at, True, False),
+    "price_asc": (models.VehicleSnapshot.price, False, True),
+    "price_desc": (models.VehicleSnapshot.price, True, True),
+}
+VEHICLE_FIELDS = set(VehicleSchema.model_fields)
+# count=true liczy wyniki filtra najwyżej do tej wartości (większe liczby są dolnym oszacowaniem)
+VEHICLES_COUNT_CAP = int(os.getenv("VEHICLES_COUNT_CAP", "10000"))
+
+def vehicles_total(db: Session, query, filtered: bool) -> tuple[int, bool]:
+    """
+    (liczba wyników, czy dokładna) dla X-Total-Count bez pełnego COUNT: bez filtrów na
+    Postgresie - szacunek z pg_class.reltuples, w pozostałych przypadkach COUNT
+    ograniczony do VEHICLES_COUNT_CAP + 1 wierszy.
+    """
+    if not filtered and db.get_bind().dialect.name == "postgresql":
+        estimate = db.execute(text(
+            "SELECT reltuples::bigint FROM pg_class WHERE relname = 'vehicles'"
+        )).scalar()
+        if estimate is not None and estimate >= 0:
+            return int(estimate), False
+    capped = query.with_entities(models.Vehicle.id).limit(VEHICLES_COUNT_CAP + 1).subquery()
+    total = db.query(func.count()).select_from(capped).scalar() or 0
+    return min(total, VEHICLES_COUNT_CAP), total <= VEHICLES_COUNT_CAP
+
+def encode_cursor(sort: str, value, vehicle_id: int) -> str:
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    return base64.urlsafe_b64encode(json.dumps([sort, value, vehicle_id]).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, sort: str):
+    try:
+        cursor_sort, value, vehicle_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if cursor_sort != sort:
+            raise ValueError(sort)
+        if sort == "newest" and value is not None:
+            value = datetime.fromisoformat(value)
+        return value, int(vehicle_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Nieprawidłowy kursor")
+
+def keyset_after(column, descending: bool, nullable: bool, value, vehicle_id: int):
+    """Warunek "po ostatnim elemencie strony" dla sortowania (kolumna, id) z NULL-ami na końcu."""
+    id_after = models.Vehicle.id < vehicle_id if descending else models.Vehicle.id > vehicle_id
+    if value is None:
+        return and_(column.is_(None), id_after)
+    after = or_(column < value if descending else column > value, and_(column == value, id_after))
+    return or_(after, column.is_(None)) if nullable else after
+
+# Odpowiedź to gotowy FastJSONResponse (bez walidacji response_model) - schemat tylko do dokumentacji
+# OpenAPI; z `fields=` wiersze zawierają wyłącznie wybrane pola VehicleSchema (i zawsze id).
+@app.get("/vehicles", response_model=None, responses={200: {"model": List[VehicleSchema]}})
 def get_vehicles(
     skip: int = 0, 
-    limit: int = 50, 
+    limit: int = 50,
     marka: Optional[str] = None,
     model: Optional[str] = None,
     rok_min: Optional[int] = None,
@@ -463,50 +628,87 @@ def get_vehicles(
     cena_min: Optional[int] = None,
     cena_max: Optional[int] = None,
     miasto: Optional[str] = None,
+    q: Optional[str] = None,
+    sort: str = "newest",
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    count: bool = False,
     db: Session = Depends(database.get_db)
 ):
-    # Base query for vehicles
-    # We join with the latest snapshot for each vehicle to allow filtering by price
-    
-    # Subquery to get the ID of the latest snapshot for each vehicle
-    latest_snapshot_ids = db.query(
-        models.VehicleSnapshot.vehicle_id,
-        func.max(models.VehicleSnapshot.scraped_at).label('max_scraped_at')
-    ).group_by(models.VehicleSnapshot.vehicle_id).subquery()
-
-    latest_snapshots = db.query(models.VehicleSnapshot).join(
-        latest_snapshot_ids,
-        and_(
-            models.VehicleSnapshot.vehicle_id == latest_snapshot_ids.c.vehicle_id,
-            models.VehicleSnapshot.scraped_at == latest_snapshot_ids.c.max_scraped_at
-        )
-    ).subquery()
+    """
+    Lista pojazdów z najnowszym snapshotem.
+
+    Paginacja kursorem (keyset): następna strona przez `cursor` z nagłówka X-Next-Cursor -
+    koszt nie rośnie z numerem strony (`skip` działa jak dotąd, ale głębokie strony są wolne).
+    `count=true` dodaje X-Total-Count na pierwszej stronie: szacunek bez filtrów na Postgresie,
+    inaczej liczba ograniczona do VEHICLES_COUNT_CAP; X-Total-Count-Exact mówi, czy jest dokładna.
+    `fields=id,marka,latest_price` ogranicza pola odpowiedzi.
+    `q=kamera cofania hak` - wyszukiwanie pełnotekstowe po wyposażeniu i tagach (search.py).
+    """
+    if sort not in VEHICLE_SORTS:
+        raise HTTPException(status_code=400, detail=f"Nieznane sortowanie: {sort}")
+    selected = VEHICLE_FIELDS
+    if fields:
+        selected = {f.strip() for f in fields.split(",") if f.strip()} | {"id"}
+        unknown = selected - VEHICLE_FIELDS
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Nieznane pola: {', '.join(sorted(unknown))}")
 
-    query = db.query(models.Vehicle).join(latest_snapshots, models.Vehicle.id == latest_snapshots.c.vehicle_id)
+    # Base query for vehicles
+    # We join with the latest snapshot for each vehicle (latest_snapshot_id) to allow filtering by price
+    query = db.query(models.Vehicle, models.VehicleSnapshot).join(
+        models.VehicleSnapshot, models.VehicleSnapshot.id == models.Vehicle.latest_snapshot_id
+    )
 
     if marka:
-        query = query.filter(models.Vehicle.marka.ilike(f"%{marka}%"))
+        query = query.filter(text_match(db, models.Vehicle.marka, marka))
     if model:
-        query = query.filter(models.Vehicle.model.ilike(f"%{model}%"))
+        query = query.filter(text_match(db, models.Vehicle.model, model))
     if rok_min:
         query = query.filter(models.Vehicle.rocznik >= rok_min)
     if rok_max:
         query = query.filter(models.Vehicle.rocznik <= rok_max)
     if cena_min:
-        query = query.filter(latest_snapshots.c.price >= cena_min)
+        query = query.filter(models.VehicleSnapshot.price >= cena_min)
     if cena_max:
-        query = query.filter(latest_snapshots.c.price <= cena_max)
+        query = query.filter(models.VehicleSnapshot.price <= cena_max)
     if miasto:
-        query = query.filter(models.Vehicle.dealer_city.ilike(f"%{miasto}%"))
-    
-    vehicles = query.offset(skip).limit(limit).all()
+        query = query.filter(text_match(db, models.Vehicle.dealer_city, miasto))
+    matches = search_filter(db, q)
+    if matches is not None:
+        query = query.filter(matches)
+
+    headers = {}
+    if count and not cursor:
+        filtered = any((marka, model, rok_min, rok_max, cena_min, cena_max, miasto, matches is not None))
+        total, exact = vehicles_total(db, query, filtered)
+        headers["X-Total-Count"] = str(total)
+        headers["X-Total-Count-Exact"] = "true" if exact else "false"
+
+    # Niepotrzebne kolumny snapshotu nie są w ogóle pobierane
+    if "equipment" not in selected:
+        query = query.options(defer(models.VehicleSnapshot.equipment_json))
+    if "latest_image" not in selected:
+        query = query.options(defer(models.VehicleSnapshot.pictures))
+
+    column, descending, nullable = VEHICLE_SORTS[sort]
+    if cursor:
+        query = query.filter(keyset_after(column, descending, nullable, *decode_cursor(cursor, sort)))
+    order = [column.desc() if descending else column.asc(), models.Vehicle.id.desc() if descending else models.Vehicle.id.asc()]
+    if nullable:
+        order.insert(0, column.is_(None))
+    query = query.order_by(*order)
+    if not cursor and skip:
+        query = query.offset(skip)
+    vehicles = query.limit(limit).all()
+
+    if vehicles and len(vehicles) == limit:
+        v, latest = vehicles[-1]
+        headers["X-Next-Cursor"] = encode_cursor(sort, getattr(latest, column.key), v.id)
     
     # Map to schema
     result = []
-    for v in vehicles:
-        # Get latest snapshot manually for simplicity in mapping (or we could use the joined data)
-        latest = db.query(models.VehicleSnapshot).filter(models.VehicleSnapshot.vehicle_id == v.id).order_by(models.VehicleSnapshot.scraped_at.desc()).first()
-        
+    for v, latest in vehicles:
         v_dict = {
             "id": v.id,
             "url": v.url,
@@ -518,12 +720,13 @@ def get_vehicles(
             "lokalizacja_miasto": v.dealer_city,
             "latest_price": latest.price if latest else None,
             "latest_mileage": latest.mileage if latest else None,
-            "latest_image": re.split(r'\s*\|\s*', latest.pictures)[0] if latest and latest.pictures else None,
+            "latest_image": re.split(r'\s*\|\s*', latest.pictures)[0] if "latest_image" in selected and latest and latest.pictures else None,
             "scraped_at": latest.scraped_at if latest else None,
-            "equipment": latest.equipment_json if latest else None
+            "equipment": latest.equipment_json if "equipment" in selected and latest else None
         }
-        result.append(v_dict)
-    return result
+        result.append({k: value for k, value in v_dict.items() if k in selected} if fields else v_dict)
+    # Gotowa odpowiedź (orjson) - bez walidacji każdego wiersza przez response_model
+    return FastJSONResponse(result, headers=headers)
 
 @app.get("/vehicles/{vehicle_id}/trends", response_model=List[PriceTrendSchema])
 def get_vehicle_trends(vehicle_id: int, db: Session = Depends(database.get_db)):
@@ -531,439 +734,155 @@ def get_vehicle_trends(vehicle_id: int, db: Session = Depends(database.get_db)):
     return [{"scraped_at": s.scraped_at, "price": s.price, "mileage": s.mileage} for s in snapshots]
 
 @app.get("/stats", response_model=StatsSchema)
-def get_stats(db: Session = Depends(database.get_db)):
-    total_vehicles = db.query(models.Vehicle).count()
-    total_snapshots = db.query(models.VehicleSnapshot).count()
-    avg_price = db.query(func.avg(models.VehicleSnapshot.price)).scalar() or 0
-    brands = db.query(func.count(func.distinct(models.Vehicle.marka))).scalar() or 0
-    return {
-        "total_vehicles": total_vehicles,
-        "total_snapshots": total_snapshots,
-        "avg_price": float(avg_price),
-        "unique_brands": brands
-    }
+def get_stats(source: Optional[str] = None, db: Session = Depends(database.get_db)):
+    """Agregaty z source_stats (aktualizowane po przebiegu) - bez skanowania historii snapshotów."""
+    return read_stats(db, source)
 
 @app.get("/brands", response_model=List[str])
 def get_brands(db: Session = Depends(database.get_db)):
-    brands = db.query(models.Vehicle.marka).distinct().filter(models.Vehicle.marka.isnot(None)).order_by(models.Vehicle.marka).all()
-    return [b[0] for b in brands]
+    return cache.facets.values(db, "brands")
 
 @app.get("/models", response_model=List[str])
 def get_models(marka: Optional[str] = None, db: Session = Depends(database.get_db)):
-    query = db.query(models.Vehicle.model).distinct().filter(models.Vehicle.model.isnot(None))
-    if marka:
-        query = query.filter(models.Vehicle.marka.ilike(f"%{marka}%"))
-    models_list = query.order_by(models.Vehicle.model).all()
-    return [m[0] for m in models_list]
+    return cache.facets.models_for(db, marka)
 
 @app.get("/cities", response_model=List[str])
 def get_cities(db: Session = Depends(database.get_db)):
-    cities_raw = db.query(models.Vehicle.dealer_city).distinct().filter(models.Vehicle.dealer_city.isnot(None)).all()
-    return sorted([row[0] for row in cities_raw])
+    return cache.facets.values(db, "cities")
 
 @app.get("/sources", response_model=List[str])
 def get_sources(db: Session = Depends(database.get_db)):
     """Return all unique source values from vehicles."""
-    sources = db.query(models.Vehicle.source).distinct().filter(models.Vehicle.source.isnot(None)).order_by(models.Vehicle.source).all()
-    return [s[0] for s in sources]
+    return cache.facets.values(db, "sources")
 
-def get_latest_scrape_timestamp(db: Session, source: Optional[str] = None):
-    """Finds the most recent scraped_at timestamp for a given source."""
-    query = db.query(func.max(models.VehicleSnapshot.scraped_at))
-    if source:
-        query = query.filter(models.VehicleSnapshot.source == source)
-    return query.scalar()
+@app.get("/facets")
+def get_facets(
+    marka: Optional[str] = None,
+    model: Optional[str] = None,
+    miasto: Optional[str] = None,
+    source: Optional[str] = None,
+    db: Session = Depends(database.get_db)
+):
+    """Liczba pojazdów dla wartości facetów (brands, models, cities, sources) pod aktywnymi filtrami."""
+    return cache.facets.counts(db, marka=marka, model=model, miasto=miasto, source=source)
 
 @app.get("/export/csv")
-def export_csv(source: Optional[str] = None, dealer_group: Optional[str] = None, db: Session = Depends(database.get_db)):
-    query = db.query(models.Vehicle).filter(
-        or_(models.Vehicle.status == 'active', models.Vehicle.status.is_(None))
-    )
-    if source:
-        query = query.filter(models.Vehicle.source == source)
-    if dealer_group:
-        query = query.filter(models.Vehicle.dealer_group == dealer_group)
-    vehicles = query.all()
-    
-    logger.info(f"Exporting {len(vehicles)} vehicles to CSV")
-    
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow([
-        "ID", "Marka", "Model", "Wersja", "Rok", "Pierwsza rejestracja", "VIN",
-        "Paliwo", "Pojemność cm3", "Moc km", "Skrzynia biegów", "Napęd",
-        "Typ nadwozia", "Kolor", "Ilość drzwi",
-        "Cena", "Przebieg", "Zdjęcie główne", "Pozostałe zdjęcia",
-        "Lokalizacja", "URL",
-        "Wyposazenie Technologia", "Wyposazenie Komfort", "Wyposazenie Bezpieczenstwo", "Wyposazenie Wyglad"
-    ])
-    
-    for v in vehicles:
-        latest = db.query(models.VehicleSnapshot).filter(models.VehicleSnapshot.vehicle_id == v.id).order_by(models.VehicleSnapshot.scraped_at.desc()).first()
-        
-        raw_equipment = latest.equipment_json if latest else {}
-        if isinstance(raw_equipment, str):
-            try:
-                equipment = json.loads(raw_equipment)
-            except:
-                equipment = {}
-        elif isinstance(raw_equipment, dict):
-            equipment = raw_equipment
-        else:
-            equipment = {}
-        
-        all_pictures = latest.pictures if latest and latest.pictures else ""
-        picture_list = re.split(r'\s*\|\s*', all_pictures) if all_pictures else []
-        main_image = picture_list[0] if picture_list else ""
-        other_images = " | ".join(picture_list[1:]) if len(picture_list) > 1 else ""
-        
-        writer.writerow([
-            v.id,
-            v.marka or "",
-            v.model or "",
-            v.wersja or "",
-            v.rocznik or "",
-            v.pierwsza_rejestracja or "",
-            v.vin or "",
-            v.typ_silnika or "",
-            v.pojemnosc_cm3 or "",
-            v.moc_km or "",
-            v.skrzynia_biegow or "",
-            v.naped or "",
-            v.typ_nadwozia or "",
-            v.kolor or "",
-            v.ilosc_drzwi or "",
-            latest.price if latest else "",
-            latest.mileage if latest else "",
-            main_image,
-            other_images,
-            v.dealer_city or "",
-            v.url,
-            equipment.get("technologia", "") if equipment else "",
-            equipment.get("komfort", "") if equipment else "",
-            equipment.get("bezpieczenstwo", "") if equipment else "",
-            equipment.get("wyglad", "") if equipment else "",
-        ])
-    
-    output.seek(0)
-    if source and dealer_group:
-        filename = f"vehicles_{source}_{dealer_group.replace(' ', '-')}.csv"
-    elif source:
-        filename = f"vehicles_{source}.csv"
-    else:
-        filename = "vehicles.csv"
+def export_csv(source: Optional[str] = None, dealer_group: Optional[str] = None):
+    filename = exports.export_filename("vehicles", source, dealer_group)
     return StreamingResponse(
-        iter([output.getvalue()]),
+        exports.stream_csv(exports.VEHICLE_COLUMNS, exports.vehicle_rows, source=source, dealer_group=dealer_group),
         media_type="text/csv",
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
 
-@app.get("/export/csv/car-scout")
-def export_car_scout_csv(source: Optional[str] = None, dealer_group: Optional[str] = None, db: Session = Depends(database.get_db)):
-    # Find latest scrape timestamp for this source
-    latest_ts = get_latest_scrape_timestamp(db, source)
+def not_modified(request: Request, etag: str, last_modified: datetime) -> bool:
+    """Warunkowe pobranie: If-None-Match (pierwszeństwo) lub If-Modified-Since."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return last_modified <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
 
-    query = db.query(models.Vehicle)
+def artifact_response(request: Request, background_tasks: BackgroundTasks, db: Session, kind: str,
+                      source: Optional[str], dealer_group: Optional[str]) -> Optional[Response]:
+    """
+    Gotowy eksport z EXPORT_DIR (gzip, ETag / Last-Modified, 304). None, gdy pliku nie ma
+    lub jest nieaktualny - wtedy eksport idzie na żywo, a plik jest odbudowywany w tle.
+    Nieznane źródło lub grupa dealerów - 404 (bez tworzenia plików dla dowolnych wartości).
+    """
+    source, dealer_group = source or None, dealer_group or None
+    if not artifacts.known_target(db, source, dealer_group):
+        raise HTTPException(status_code=404, detail="Nieznane źródło lub grupa dealerów")
+    version = artifacts.data_version(db, source)
+    artifact = artifacts.load_artifact(kind, source, dealer_group)
+    if not artifact or artifact.get("version") != version:
+        background_tasks.add_task(artifacts.build_artifact_once, kind, source, dealer_group, version)
+        return None
 
-    if dealer_group:
-        query = query.filter(models.Vehicle.dealer_group == dealer_group)
+    # Plik .gz wysyłany wprost albo rozpakowywany - każda reprezentacja ma własny ETag
+    gzipped = negotiate_encoding(request.headers.get("accept-encoding", ""), ("gzip",)) == "gzip"
+    etag = f'{artifact["etag"][:-1]}-gz"' if gzipped else artifact["etag"]
+    headers = {
+        "ETag": etag,
+        "Last-Modified": format_datetime(artifact["last_modified"], usegmt=True),
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+    }
+    if not_modified(request, etag, artifact["last_modified"]):
+        return Response(status_code=304, headers=headers)
 
-    if latest_ts:
-        # We take everything from the last 12 hours of the max timestamp to be safe 
-        # (in case a scrape took a few hours)
-        from datetime import timedelta
-        start_time = latest_ts - timedelta(hours=12)
-        
-        # Subquery for vehicles that have a snapshot in this window
-        recent_vehicle_ids = db.query(models.VehicleSnapshot.vehicle_id).filter(
-            models.VehicleSnapshot.scraped_at >= start_time
-        )
-        if source:
-            recent_vehicle_ids = recent_vehicle_ids.filter(models.VehicleSnapshot.source == source)
-        
-        query = query.filter(models.Vehicle.id.in_(recent_vehicle_ids.subquery()))
-    else:
-        # Fallback to active if no snapshots found (shouldn't happen)
-        query = query.filter(or_(models.Vehicle.status == 'active', models.Vehicle.status.is_(None)))
-        
-    if source:
-        query = query.filter(models.Vehicle.source == source)
-    
-    vehicles = query.all()
-    
-    logger.info(f"Exporting {len(vehicles)} vehicles to Car-Scout CSV")
-    
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow([
-        "listing_id", "listing_url", "scraped_at", "make", "model", "version", "vin",
-        "price_pln", "price_display", "omnibus_lowest_30d_pln", "omnibus_text",
-        "production_year", "mileage_km", "fuel_type", "transmission", "engine_power_hp",
-        "registration_number", "first_registration_date", "engine_capacity_cm3", "drive",
-        "body_type", "doors", "seats", "color", "paint_type", "dealer_name",
-        "dealer_address_line1", "dealer_address_line2", "dealer_address_line3",
-        "dealer_google_rating", "dealer_review_count", "dealer_google_link",
-        "contact_phone", "primary_image_url", "image_count", "image_urls",
-        "equipment_audio_multimedia", "equipment_safety", "equipment_comfort_extras",
-        "equipment_other", "additional_info_header", "additional_info_content", "specs_json"
-    ])
-    
-    for v in vehicles:
-        if not v.vin and not v.id:
-            continue
-            
-        latest = db.query(models.VehicleSnapshot).filter(
-            models.VehicleSnapshot.vehicle_id == v.id
-        ).order_by(models.VehicleSnapshot.scraped_at.desc()).first()
-        
-        if not latest:
-            continue
-            
-        # Relaxed check: allow 0 (e.g. for new cars with 0 mileage)
-        # Vehicles from 'vehis' and 'fiat.pgd.pl' are exempt from strict mileage validation
-        if v.source in ["vehis", "fiat.pgd.pl"]:
-            has_required = True
-        else:
-            has_required = latest.price is not None and v.rocznik is not None and latest.mileage is not None
-            
-        if not has_required:
-            continue
-            
-        raw_equipment = latest.equipment_json if latest else {}
-        if isinstance(raw_equipment, str):
-            try:
-                equipment = json.loads(raw_equipment)
-            except:
-                equipment = {}
-        elif isinstance(raw_equipment, dict):
-            equipment = raw_equipment
-        else:
-            equipment = {}
-        
-        all_pictures = latest.pictures if latest and latest.pictures else ""
-        
-        picture_list = re.split(r'\s*\|\s*', all_pictures) if all_pictures else []
-        
-        main_image = picture_list[0] if picture_list else ""
-        other_images = " | ".join(picture_list[1:]) if len(picture_list) > 1 else ""
-        all_pictures_str = " | ".join(picture_list)
-        
-        price_display = f"{latest.price:,} PLN".replace(",", " ") if latest.price else ""
-        
-        equipment_audio = equipment.get("technologia", [])
-        equipment_safety = equipment.get("bezpieczenstwo", [])
-        equipment_comfort = equipment.get("komfort", [])
-        equipment_other = equipment.get("wyglad", [])
-        
-        # New: Extract additional info for Findcar
-        add_info_header = equipment.get("additional_info_header", "")
-        add_info_content = equipment.get("additional_info_content", latest.tags if latest else "")
-        
-        audio_str = "|".join(equipment_audio) if isinstance(equipment_audio, list) else str(equipment_audio or "")
-        safety_str = "|".join(equipment_safety) if isinstance(equipment_safety, list) else str(equipment_safety or "")
-        comfort_str = "|".join(equipment_comfort) if isinstance(equipment_comfort, list) else str(equipment_comfort or "")
-        other_str = "|".join(equipment_other) if isinstance(equipment_other, list) else str(equipment_other or "")
-        
-        # Priority for raw equipment if available (e.g. for Vehis)
-        if latest.equipment:
-            audio_str = latest.equipment
-        if latest.additional_equipment:
-            other_str = latest.additional_equipment
-        
-        scraped_at = latest.scraped_at.isoformat() if latest.scraped_at else ""
-        
-        writer.writerow([
-            v.numer_oferty or (str(v.id) if v.id else ""),
-            v.url or "",
-            scraped_at,
-            v.marka or "",
-            v.model or "",
-            v.wersja or "",
-            v.vin or "",
-            str(latest.price) if latest.price is not None else "",
-            price_display,
-            str(latest.old_price) if latest.old_price is not None else "",
-            "",
-            str(v.rocznik) if v.rocznik is not None else "",
-            str(latest.mileage) if latest.mileage is not None else "",
-            v.typ_silnika or "",
-            v.skrzynia_biegow or "",
-            str(v.moc_km) if v.moc_km is not None else "",
-            "",
-            v.pierwsza_rejestracja or "",
-            str(v.pojemnosc_cm3) if v.pojemnosc_cm3 is not None else "",
-            v.naped or "",
-            v.typ_nadwozia or "",
-            v.ilosc_drzwi or "",
-            "",
-            v.kolor or "",
-            "",
-            v.dealer_name or "",
-            v.dealer_street or "",
-            " ".join(filter(None, [v.dealer_postcode, v.dealer_city])),
-            "",
-            "",
-            "",
-            "",
-            v.contact_phone or "",
-            main_image,
-            "",
-            all_pictures_str,
-            audio_str,
-            safety_str,
-            comfort_str,
-            other_str,
-            add_info_header or "",
-            add_info_content or "",
-            ""
-        ])
-    
-    output.seek(0)
-    if source and dealer_group:
-        filename = f"car-scout-export_{source}_{dealer_group.replace(' ', '-')}.csv"
-    elif source:
-        filename = f"car-scout-export_{source}.csv"
-    else:
-        filename = "car-scout-export.csv"
+    headers["Content-Disposition"] = f"attachment; filename={artifact['path'].name.removesuffix('.gz')}"
+    if gzipped:
+        headers["Content-Encoding"] = "gzip"
+        return FileResponse(artifact["path"], media_type="text/csv", headers=headers)
+
+    def decompressed():
+        with gzip.open(artifact["path"], "rb") as f:
+            while chunk := f.read(64 * 1024):
+                yield chunk
+    return StreamingResponse(decompressed(), media_type="text/csv", headers=headers)
+
+@app.get("/export/csv/car-scout")
+def export_car_scout_csv(request: Request, background_tasks: BackgroundTasks, source: Optional[str] = None,
+                         dealer_group: Optional[str] = None, db: Session = Depends(database.get_db)):
+    cached = artifact_response(request, background_tasks, db, "car-scout-export", source, dealer_group)
+    if cached is not None:
+        return cached
+    filename = exports.export_filename("car-scout-export", source, dealer_group)
     return StreamingResponse(
-        iter([output.getvalue()]),
+        exports.stream_csv(exports.CAR_SCOUT_COLUMNS, exports.car_scout_rows, source=source, dealer_group=dealer_group),
         media_type="text/csv",
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
 
 @app.get("/export/csv/car-scout/archive")
-def export_car_scout_archive_csv(source: Optional[str] = None, dealer_group: Optional[str] = None, db: Session = Depends(database.get_db)):
+def export_car_scout_archive_csv(request: Request, background_tasks: BackgroundTasks, source: Optional[str] = None,
+                                 dealer_group: Optional[str] = None, db: Session = Depends(database.get_db)):
     """Exports ALL historical entries for car-scout, even archived ones."""
-    query = db.query(models.Vehicle)
-    if source:
-        query = query.filter(models.Vehicle.source == source)
-    if dealer_group:
-        query = query.filter(models.Vehicle.dealer_group == dealer_group)
-    vehicles = query.all()
-    
-    logger.info(f"Exporting ARCHIVE: {len(vehicles)} vehicles to Car-Scout CSV")
-    
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow([
-        "listing_id", "listing_url", "scraped_at", "make", "model", "version", "vin",
-        "price_pln", "price_display", "omnibus_lowest_30d_pln", "omnibus_text",
-        "production_year", "mileage_km", "fuel_type", "transmission", "engine_power_hp",
-        "registration_number", "first_registration_date", "engine_capacity_cm3", "drive",
-        "body_type", "doors", "seats", "color", "paint_type", "dealer_name",
-        "dealer_address_line1", "dealer_address_line2", "dealer_address_line3",
-        "dealer_google_rating", "dealer_review_count", "dealer_google_link",
-        "contact_phone", "primary_image_url", "image_count", "image_urls",
-        "equipment_audio_multimedia", "equipment_safety", "equipment_comfort_extras",
-        "equipment_other", "additional_info_header", "additional_info_content", "specs_json", "status"
-    ])
-    
-    for v in vehicles:
-        latest = db.query(models.VehicleSnapshot).filter(
-            models.VehicleSnapshot.vehicle_id == v.id
-        ).order_by(models.VehicleSnapshot.scraped_at.desc()).first()
-        
-        if not latest:
-            continue
-            
-        raw_equipment = latest.equipment_json if latest else {}
-        if isinstance(raw_equipment, str):
-            try:
-                equipment = json.loads(raw_equipment)
-            except:
-                equipment = {}
-        elif isinstance(raw_equipment, dict):
-            equipment = raw_equipment
-        else:
-            equipment = {}
-        
-        all_pictures = latest.pictures if latest and latest.pictures else ""
-        picture_list = re.split(r'\s*\|\s*', all_pictures) if all_pictures else []
-        main_image = picture_list[0] if picture_list else ""
-        all_pictures_str = " | ".join(picture_list)
-        
-        price_display = f"{latest.price:,} PLN".replace(",", " ") if latest.price else ""
-        
-        equipment_audio = equipment.get("technologia", [])
-        equipment_safety = equipment.get("bezpieczenstwo", [])
-        equipment_comfort = equipment.get("komfort", [])
-        equipment_other = equipment.get("wyglad", [])
-        
-        add_info_header = equipment.get("additional_info_header", "")
-        add_info_content = equipment.get("additional_info_content", latest.tags if latest else "")
-        
-        audio_str = "|".join(equipment_audio) if isinstance(equipment_audio, list) else str(equipment_audio or "")
-        safety_str = "|".join(equipment_safety) if isinstance(equipment_safety, list) else str(equipment_safety or "")
-        comfort_str = "|".join(equipment_comfort) if isinstance(equipment_comfort, list) else str(equipment_comfort or "")
-        other_str = "|".join(equipment_other) if isinstance(equipment_other, list) else str(equipment_other or "")
-        
-        if latest.equipment:
-            audio_str = latest.equipment
-        if latest.additional_equipment:
-            other_str = latest.additional_equipment
-        
-        scraped_at = latest.scraped_at.isoformat() if latest.scraped_at else ""
-        
-        writer.writerow([
-            v.numer_oferty or (str(v.id) if v.id else ""),
-            v.url or "",
-            scraped_at,
-            v.marka or "",
-            v.model or "",
-            v.wersja or "",
-            v.vin or "",
-            str(latest.price) if latest.price is not None else "",
-            price_display,
-            str(latest.old_price) if latest.old_price is not None else "",
-            "",
-            str(v.rocznik) if v.rocznik is not None else "",
-            str(latest.mileage) if latest.mileage is not None else "",
-            v.typ_silnika or "",
-            v.skrzynia_biegow or "",
-            str(v.moc_km) if v.moc_km is not None else "",
-            "",
-            v.pierwsza_rejestracja or "",
-            str(v.pojemnosc_cm3) if v.pojemnosc_cm3 is not None else "",
-            v.naped or "",
-            v.typ_nadwozia or "",
-            v.ilosc_drzwi or "",
-            "",
-            v.kolor or "",
-            "",
-            v.dealer_name or "",
-            v.dealer_street or "",
-            " ".join(filter(None, [v.dealer_postcode, v.dealer_city])),
-            "",
-            "",
-            "",
-            "",
-            v.contact_phone or "",
-            main_image,
-            "",
-            all_pictures_str,
-            audio_str,
-            safety_str,
-            comfort_str,
-            other_str,
-            add_info_header or "",
-            add_info_content or "",
-            "",
-            v.status or "active"
-        ])
-    
-    output.seek(0)
-    if source and dealer_group:
-        filename = f"car-scout-archive_{source}_{dealer_group.replace(' ', '-')}.csv"
-    elif source:
-        filename = f"car-scout-archive_{source}.csv"
-    else:
-        filename = "car-scout-archive.csv"
+    cached = artifact_response(request, background_tasks, db, "car-scout-archive", source, dealer_group)
+    if cached is not None:
+        return cached
+    filename = exports.export_filename("car-scout-archive", source, dealer_group)
     return StreamingResponse(
-        iter([output.getvalue()]),
+        exports.stream_csv(exports.CAR_SCOUT_ARCHIVE_COLUMNS, exports.car_scout_archive_rows,
+                           source=source, dealer_group=dealer_group),
         media_type="text/csv",
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
 
+def columnar_response(fmt: str, prefix: str, fields, records, source: Optional[str], dealer_group: Optional[str]):
+    if fmt not in exports.COLUMNAR_FORMATS:
+        raise HTTPException(status_code=404, detail=f"Nieobsługiwany format eksportu: {fmt}")
+    ext, media_type = exports.COLUMNAR_FORMATS[fmt]
+    try:
+        content = exports.stream_columnar(fmt, fields, records, source=source, dealer_group=dealer_group)
+    except ImportError:
+        raise HTTPException(status_code=501, detail="Eksport Parquet/Arrow wymaga pakietu pyarrow")
+    filename = exports.export_filename(prefix, source, dealer_group, ext=ext)
+    return StreamingResponse(
+        content,
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+@app.get("/export/{fmt}/car-scout")
+def export_car_scout_columnar(fmt: str, source: Optional[str] = None, dealer_group: Optional[str] = None):
+    """Car-Scout jako Parquet (fmt=parquet) lub Arrow IPC (fmt=arrow) - kolumny typowane."""
+    return columnar_response(fmt, "car-scout-export", exports.CAR_SCOUT_FIELDS, exports.car_scout_records,
+                             source, dealer_group)
+
+@app.get("/export/{fmt}/car-scout/archive")
+def export_car_scout_archive_columnar(fmt: str, source: Optional[str] = None, dealer_group: Optional[str] = None):
+    """Archiwum Car-Scout jako Parquet lub Arrow IPC."""
+    return columnar_response(fmt, "car-scout-archive", exports.CAR_SCOUT_ARCHIVE_FIELDS,
+                             exports.car_scout_archive_records, source, dealer_group)
+
 @app.post("/admin/reset-db")
 def reset_db(background_tasks: BackgroundTasks, db: Session = Depends(database.get_db)):
     background_tasks.add_task(_reset_db_task, db)
@@ -972,8 +891,13 @@ def reset_db(background_tasks: BackgroundTasks, db: Session = Depends(database.g
 def _reset_db_task(db: Session):
     try:
         db.query(models.VehicleSnapshot).delete()
+        db.query(models.VehicleChange).delete()
+        db.query(models.VehicleSearch).delete()
+        db.query(models.SourceStats).delete()
         db.query(models.Vehicle).delete()
         db.commit()
+        artifacts.clear_artifacts()
+        cache.data_version.invalidate()
         logger.info("Database cleared successfully")
     except Exception as e:
         logger.error(f"Error clearing database: {e}")
@@ -983,9 +907,30 @@ def _reset_db_task(db: Session):
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
+def public_vehicle(v: models.Vehicle, latest: Optional[models.VehicleSnapshot]) -> dict:
+    return {
+        "id": v.id,
+        "url": v.url,
+        "marka": v.marka,
+        "model": v.model,
+        "rocznik": v.rocznik,
+        "dealer_name": v.dealer_name,
+        "dealer_id": v.dealer_id,
+        "dealer_group": v.dealer_group,
+        "rodzaj_sprzedazy": v.rodzaj_sprzedazy,
+        "price": latest.price if latest else None,
+        "mileage": latest.mileage if latest else None,
+        "pictures": latest.pictures.split(" | ") if latest and latest.pictures else []
+    }
+
+def latest_change_id(db: Session) -> int:
+    return db.query(func.max(models.VehicleChange.id)).scalar() or 0
+
 @app.get("/api/public/vehicles")
 def get_public_vehicles(source: Optional[str] = None, dealer_id: Optional[str] = None, dealer_group: Optional[str] = None, db: Session = Depends(database.get_db)):
-    query = db.query(models.Vehicle).filter(or_(models.Vehicle.status == 'active', models.Vehicle.status.is_(None)))
+    # Kursor feedu zmian odczytany przed listą - synchronizacja przyrostowa startuje od tego miejsca
+    change_cursor = latest_change_id(db)
+    query = with_latest_snapshot(db).filter(or_(models.Vehicle.status == 'active', models.Vehicle.status.is_(None)))
     if source:
         query = query.filter(models.Vehicle.source == source)
     if dealer_id:
@@ -993,38 +938,110 @@ def get_public_vehicles(source: Optional[str] = None, dealer_id: Optional[str] =
     if dealer_group:
         query = query.filter(models.Vehicle.dealer_group == dealer_group)
 
-    vehicles = query.all()
-    results = []
-    for v in vehicles:
-        latest = db.query(models.VehicleSnapshot).filter(models.VehicleSnapshot.vehicle_id == v.id).order_by(desc(models.VehicleSnapshot.scraped_at)).first()
-        results.append({
-            "id": v.id,
-            "url": v.url,
-            "marka": v.marka,
-            "model": v.model,
-            "rocznik": v.rocznik,
-            "dealer_name": v.dealer_name,
-            "dealer_id": v.dealer_id,
-            "dealer_group": v.dealer_group,
-            "rodzaj_sprzedazy": v.rodzaj_sprzedazy,
-            "price": latest.price if latest else None,
-            "mileage": latest.mileage if latest else None,
-            "pictures": latest.pictures.split(" | ") if latest and latest.pictures else []
-        })
-    return results
+    return FastJSONResponse([public_vehicle(v, latest) for v, latest in query.all()],
+                            headers={"X-Change-Cursor": str(change_cursor)})
+
+@app.get("/api/public/vehicles/changes")
+def get_public_vehicle_changes(
+    since: int = Query(0, ge=0),
+    limit: int = Query(500, ge=1, le=5000),
+    source: Optional[str] = None,
+    dealer_id: Optional[str] = None,
+    dealer_group: Optional[str] = None,
+    db: Session = Depends(database.get_db)
+):
+    """
+    Zmiany pojazdów po kursorze `since` (new / updated / archived) w kolejności zapisu,
+    z aktualnym stanem pojazdu. Kolejną stronę pobiera się z since=next_cursor.
+    """
+    query = db.query(models.VehicleChange, models.Vehicle, models.VehicleSnapshot).join(
+        models.Vehicle, models.Vehicle.id == models.VehicleChange.vehicle_id
+    ).outerjoin(
+        models.VehicleSnapshot, models.VehicleSnapshot.id == models.Vehicle.latest_snapshot_id
+    ).filter(models.VehicleChange.id > since)
+    if source:
+        query = query.filter(models.VehicleChange.source == source)
+    if dealer_id:
+        query = query.filter(models.Vehicle.dealer_id == dealer_id)
+    if dealer_group:
+        query = query.filter(models.Vehicle.dealer_group == dealer_group)
+
+    rows = query.order_by(models.VehicleChange.id).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    # Pusta strona - klient pyta ponownie od tego samego kursora
+    next_cursor = rows[-1][0].id if rows else since
+    return FastJSONResponse({
+        "changes": [
+            {
+                "change_id": change.id,
+                "type": change.change_type,
+                "fields": change.changed_fields or [],
+                "changed_at": change.changed_at,
+                "vehicle": {**public_vehicle(v, latest), "status": v.status or "active"},
+            }
+            for change, v, latest in rows
+        ],
+        "next_cursor": next_cursor,
+        "has_more": has_more,
+    }, headers={"X-Next-Cursor": str(next_cursor)})
 
 scheduler = AsyncIOScheduler(timezone="Europe/Warsaw")
 
 @scheduler.scheduled_job("cron", hour=6, minute=0)
 async def scheduled_daily_scrape():
     logger.info("Running scheduled daily scrape for pewneauto...")
+    if SCRAPE_MODE == "worker":
+        db = database.SessionLocal()
+        try:
+            enqueue_scrape(db, "pewneauto")
+        finally:
+            db.close()
+        return
     await run_scraper_task(marketplace="pewneauto")
 
 @app.on_event("startup")
 async def startup_event():
     logger.info("Starting APScheduler...")
     scheduler.start()
+    if SCRAPE_MODE != "worker":
+        interrupted_id = mark_interrupted_scrapes()
+        if interrupted_id and SCRAPE_AUTO_RESUME:
+            db = database.SessionLocal()
+            try:
+                tasks = BackgroundTasks()
+                resume_scrape(tasks, interrupted_id, db)
+                task = asyncio.create_task(tasks())
+                resume_tasks.add(task)
+                task.add_done_callback(resume_tasks.discard)
+            finally:
+                db.close()
+
+def mark_interrupted_scrapes() -> Optional[int]:
+    """
+    Przebiegi 'running' z poprzedniego procesu API zostały przerwane (restart, deploy, OOM).
+    Oznaczamy je jako 'interrupted' - można je wznowić przez POST /scrape?resume=<log_id>,
+    a przy SCRAPE_AUTO_RESUME=1 najnowszy z nich jest wznawiany automatycznie.
+    Zwraca id najnowszego przerwanego przebiegu.
+    """
+    db = database.SessionLocal()
+    try:
+        orphaned = db.query(models.ScrapeLog).filter(models.ScrapeLog.status == "running").order_by(models.ScrapeLog.id).all()
+        for scrape_log in orphaned:
+            scrape_log.status = "interrupted"
+            scrape_log.error_message = "Przebieg przerwany restartem API"
+            scrape_log.end_time = datetime.utcnow()
+        db.commit()
+        if orphaned:
+            logger.warning(f"Oznaczono {len(orphaned)} przerwanych przebiegów jako 'interrupted'")
+            return orphaned[-1].id
+    except Exception as e:
+        logger.error(f"Error marking interrupted scrapes: {e}")
+        db.rollback()
+    finally:
+        db.close()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     scheduler.shutdown()
+    shutdown_parser_pool()
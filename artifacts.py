@@ -0,0 +1,182 @@
+"""
+Artifacts - gotowe pliki eksportów car-scout (CSV, gzip) w EXPORT_DIR
+
+Dane zmieniają się tylko po zakończeniu przebiegu scrapowania, więc eksporty car-scout
+są generowane w tle po zakończeniu przebiegu (dla źródła, każdej jego grupy dealerów
+i zbiorczo) i serwowane z dysku z ETag / Last-Modified - kolejne odpytania bez zmian
+dostają 304 i nie obciążają bazy.
+
+Każdy plik ma obok metadane (.json) z wersją danych źródła wyznaczaną z zapisów: najwyższe
+id snapshotu i wpisu dziennika zmian źródła. Plik z nieaktualną wersją (zapisy workera
+w innym kontenerze, przerwany przebieg, `--save-to-db` z CLI) jest przy pobraniu
+zastępowany eksportem na żywo i odbudowywany w tle.
+
+Pliki powstają tylko dla znanych źródeł (MARKETPLACES) i istniejących grup dealerów
+(`known_target`), a nazwa pliku składa się wyłącznie z bezpiecznych znaków.
+"""
+import os
+import json
+import gzip
+import shutil
+import hashlib
+import logging
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+import models, database
+import exports
+from ingest import MARKETPLACES, source_domain
+
+logger = logging.getLogger(__name__)
+
+EXPORT_DIR = Path(os.getenv("EXPORT_DIR", "./export_artifacts"))
+
+# Rodzaj artefaktu -> (kolumny, generator wierszy)
+ARTIFACTS = {
+    "car-scout-export": (exports.CAR_SCOUT_COLUMNS, exports.car_scout_rows),
+    "car-scout-archive": (exports.CAR_SCOUT_ARCHIVE_COLUMNS, exports.car_scout_archive_rows),
+}
+
+# Artefakty budowane właśnie w tym procesie (bez podwójnej pracy przy równoległych pobraniach)
+_building: set[tuple] = set()
+_building_lock = threading.Lock()
+
+
+# Wartości kolumny `source` obsługiwanych marketplace
+KNOWN_SOURCES = {source_domain(marketplace) for marketplace in MARKETPLACES}
+
+
+def data_version(db: Session, source: str | None = None) -> str:
+    """
+    Wersja danych źródła (wszystkich źródeł dla source=None): najwyższe id snapshotu
+    i wpisu vehicle_changes - zmienia się przy każdym zapisie, niezależnie od ścieżki.
+    """
+    snapshots = db.query(func.max(models.VehicleSnapshot.id))
+    changes = db.query(func.max(models.VehicleChange.id))
+    if source is not None:
+        snapshots = snapshots.filter(models.VehicleSnapshot.source == source)
+        changes = changes.filter(models.VehicleChange.source == source)
+    return f"{snapshots.scalar() or 0}.{changes.scalar() or 0}"
+
+
+def known_target(db: Session, source: str | None = None, dealer_group: str | None = None) -> bool:
+    """Czy eksport dotyczy znanego źródła i istniejącej grupy dealerów (tylko takie mają pliki)."""
+    if source is not None and source not in KNOWN_SOURCES:
+        return False
+    if dealer_group is None:
+        return True
+    query = db.query(models.Vehicle.id).filter(models.Vehicle.dealer_group == dealer_group)
+    if source is not None:
+        query = query.filter(models.Vehicle.source == source)
+    return query.first() is not None
+
+
+def artifact_path(kind: str, source: str | None = None, dealer_group: str | None = None) -> Path:
+    """
+    Plik artefaktu w EXPORT_DIR. Nazwa zawiera tylko bezpieczne znaki; gdy wartości trzeba
+    było zmienić, dochodzi skrót oryginału, więc różne grupy nie trafią do jednego pliku.
+    """
+    name = "_".join(part for part in (kind, source, dealer_group) if part)
+    safe = exports.SAFE_FILENAME.sub("-", name).strip(".-")[:120]
+    if safe != name:
+        safe = f"{safe}-{hashlib.sha256(name.encode()).hexdigest()[:8]}"
+    return EXPORT_DIR / kind / f"{safe}.csv.gz"
+
+
+def load_artifact(kind: str, source: str | None = None, dealer_group: str | None = None) -> dict | None:
+    """Metadane artefaktu (etag, last_modified, version) lub None, gdy pliku nie ma."""
+    path = artifact_path(kind, source, dealer_group)
+    meta_path = path.with_name(path.name + ".json")
+    if not path.exists() or not meta_path.exists():
+        return None
+    try:
+        meta = json.loads(meta_path.read_text())
+    except (OSError, ValueError):
+        return None
+    meta["path"] = path
+    meta["last_modified"] = datetime.fromisoformat(meta["last_modified"])
+    return meta
+
+
+def build_artifact(kind: str, source: str | None = None, dealer_group: str | None = None,
+                   version: str | None = None) -> dict:
+    """
+    Generuje eksport do pliku .gz (zapis atomowy). ETag to skrót treści - gdy dane
+    się nie zmieniły, plik i Last-Modified zostają, aktualizowana jest tylko wersja.
+    """
+    columns, rows = ARTIFACTS[kind]
+    if version is None:
+        with database.SessionLocal() as db:
+            version = data_version(db, source)
+
+    path = artifact_path(kind, source, dealer_group)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    digest = hashlib.sha256()
+    with open(tmp_path, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as gz:
+        for chunk in exports.stream_csv(columns, rows, source=source, dealer_group=dealer_group):
+            data = chunk.encode("utf-8")
+            digest.update(data)
+            gz.write(data)
+
+    etag = f'"{digest.hexdigest()[:32]}"'
+    previous = load_artifact(kind, source, dealer_group)
+    if previous and previous.get("etag") == etag:
+        os.remove(tmp_path)
+        last_modified = previous["last_modified"]
+    else:
+        os.replace(tmp_path, path)
+        last_modified = datetime.now(timezone.utc).replace(microsecond=0)
+
+    meta = {"etag": etag, "last_modified": last_modified.isoformat(), "version": version}
+    meta_path = path.with_name(path.name + ".json")
+    tmp_meta = meta_path.with_name(f"{meta_path.name}.{os.getpid()}.tmp")
+    tmp_meta.write_text(json.dumps(meta))
+    os.replace(tmp_meta, meta_path)
+    return meta
+
+
+def build_artifact_once(kind: str, source: str | None = None, dealer_group: str | None = None,
+                        version: str | None = None):
+    """build_artifact, pomijane gdy ten sam artefakt jest już budowany w tym procesie."""
+    key = (kind, source, dealer_group)
+    with _building_lock:
+        if key in _building:
+            return
+        _building.add(key)
+    try:
+        build_artifact(kind, source, dealer_group, version)
+    except Exception as e:
+        logger.error(f"Błąd generowania eksportu {kind} ({source}, {dealer_group}): {e}")
+    finally:
+        with _building_lock:
+            _building.discard(key)
+
+
+def refresh_artifacts(marketplace: str | None = None):
+    """
+    Odbudowuje eksporty po zakończeniu przebiegu: dla źródła marketplace, każdej jego
+    grupy dealerów oraz zbiorcze (wszystkie źródła). Wywoływane w tle.
+    """
+    sources = [source_domain(marketplace)] if marketplace else []
+    with database.SessionLocal() as db:
+        targets = []
+        for source in sources:
+            groups = db.query(models.Vehicle.dealer_group).filter(
+                models.Vehicle.source == source, models.Vehicle.dealer_group.isnot(None)
+            ).distinct().all()
+            targets += [(source, None)] + [(source, group) for (group,) in groups]
+        targets.append((None, None))
+        versions = {source: data_version(db, source) for source in {source for source, _ in targets}}
+
+    for source, dealer_group in targets:
+        for kind in ARTIFACTS:
+            build_artifact_once(kind, source, dealer_group, versions[source])
+    logger.info(f"Odświeżono {len(targets) * len(ARTIFACTS)} plików eksportu ({marketplace or 'wszystkie'})")
+
+
+def clear_artifacts():
+    """Usuwa wszystkie artefakty (np. po wyczyszczeniu bazy)."""
+    shutil.rmtree(EXPORT_DIR, ignore_errors=True)
@@ -0,0 +1,12 @@
+"""
+Benchmarks - offline benchmark parserów ofert na nagranym korpusie stron
+
+1. Nagranie korpusu (surowe bajty HTML/JSON, benchmarks/corpus/<źródło>/):
+       python -m benchmarks.record --source findcar --limit 300
+       python -m benchmarks.record --source pewneauto --base-url https://pewneauto.pl/... --limit 300
+2. Pomiar (każdy parser w osobnym procesie - osobny pomiar szczytowego RSS):
+       python -m benchmarks.run
+       python -m benchmarks.run --save-baseline     # zapisuje benchmarks/baseline.json
+   Przy istniejącym baseline wynik jest z nim porównywany; regresja przepustowości
+   powyżej --max-regression kończy się kodem wyjścia 1.
+"""
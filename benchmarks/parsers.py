@@ -0,0 +1,59 @@
+"""
+Parsery objęte benchmarkiem - czyste funkcje (url, surowe bajty) -> dict, bez dostępu do sieci.
+
+Źródła HTML korzystają z tych samych funkcji, które wykonuje pula parserów w produkcji;
+dla źródeł JSON dekodowanie odpowiedzi jest częścią mierzonego czasu.
+"""
+import json
+from functools import lru_cache
+
+from scraper import offer_parser
+from scraper.fiat_pgd import FiatPgdScraper
+from scraper.findcar import FindcarScraper
+from scraper.vehis import VehisScraper
+import scraper_pewneauto
+
+
+@lru_cache(maxsize=None)
+def _scraper(cls):
+    # LLM (fiat_pgd) wyłączony - benchmark mierzy wyłącznie parsowanie
+    return cls(use_llm=False) if cls is FiatPgdScraper else cls()
+
+
+def parse_autopunkt(url: str, raw: bytes) -> dict:
+    return offer_parser.parse_offer_html(url, raw)
+
+
+def parse_pewneauto(url: str, raw: bytes) -> dict:
+    return scraper_pewneauto.parse_offer_html(url, raw)
+
+
+def parse_fiat_pgd(url: str, raw: bytes) -> dict:
+    return _scraper(FiatPgdScraper).parse_offer_html(url, raw)
+
+
+def parse_findcar(url: str, raw: bytes) -> dict:
+    return _scraper(FindcarScraper).detail_to_row(json.loads(raw), url.split("/")[-1])
+
+
+def parse_vehis(url: str, raw: bytes) -> dict:
+    return _scraper(VehisScraper).payload_to_row(url, json.loads(raw) or {})
+
+
+PARSERS = {
+    "autopunkt": parse_autopunkt,
+    "pewneauto": parse_pewneauto,
+    "fiat_pgd": parse_fiat_pgd,
+    "findcar": parse_findcar,
+    "vehis": parse_vehis,
+}
+
+# Rozszerzenie plików korpusu dla źródła
+CORPUS_EXT = {
+    "findcar": "json",
+    "vehis": "json",
+}
+
+
+def corpus_ext(source: str) -> str:
+    return CORPUS_EXT.get(source, "html")
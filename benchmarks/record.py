@@ -0,0 +1,98 @@
+"""
+Nagrywanie korpusu do benchmarku parserów
+
+Zbiera URL-e ofert tak jak zwykły przebieg (MarketplaceRunner) i zapisuje surowe
+odpowiedzi (HTML stron ofert lub JSON szczegółów) do benchmarks/corpus/<źródło>/
+razem z index.json (plik -> URL). Pełny korpus nie trafia do repozytorium (.gitignore);
+w repozytorium jest tylko mały korpus benchmarks/fixtures w tym samym formacie.
+
+Użycie:
+    python -m benchmarks.record --source autopunkt --limit 300
+    python -m benchmarks.record --source pewneauto --base-url https://... --limit 300
+"""
+import json
+import asyncio
+import logging
+import argparse
+from pathlib import Path
+
+import scraper_pewneauto
+from scraper import offer_parser
+from scraper.http_client import make_async_client
+from scraper.pipeline import run_pipeline
+from scraper.runner import MarketplaceRunner
+from .parsers import PARSERS, corpus_ext
+
+logger = logging.getLogger(__name__)
+
+CORPUS_DIR = Path(__file__).parent / "corpus"
+
+
+async def fetch_raw(runner: MarketplaceRunner, url: str, client=None) -> bytes | None:
+    """Pobiera surową odpowiedź, którą parser danego źródła przyjmuje offline."""
+    source, scraper = runner.marketplace, runner.scraper
+    if source == "pewneauto":
+        response = await scraper_pewneauto.fetch_html_async(url, client)
+        return response.content if response else None
+    if source == "autopunkt":
+        return (await offer_parser.fetch_html_async(scraper.get_async_client(), url)).content
+    if source == "findcar":
+        return (await scraper.fetch_async(scraper.detail_api.format(url.split("/")[-1]))).content
+    if source == "vehis":
+        return (await scraper.fetch_async(url, headers=await scraper.auth_headers_async())).content
+    return (await scraper.fetch_async(url)).content
+
+
+async def record(source: str, limit: int, base_url: str | None = None, workers: int = 4) -> int:
+    out_dir = CORPUS_DIR / source
+    out_dir.mkdir(parents=True, exist_ok=True)
+    dealer_configs = [("benchmark", base_url)] if base_url else []
+    runner = MarketplaceRunner(source, dealer_configs=dealer_configs)
+    client = None
+    if source == "pewneauto":
+        client = make_async_client(headers=scraper_pewneauto.HEADERS)
+
+    ext = corpus_ext(source)
+    index = []
+
+    async def handle(url: str):
+        try:
+            raw = await fetch_raw(runner, url, client)
+        except Exception as e:
+            logger.error(f"Nie udało się pobrać {url}: {e}")
+            return
+        if not raw:
+            return
+        name = f"{len(index) + 1:04d}.{ext}"
+        index.append({"file": name, "url": url})
+        (out_dir / name).write_bytes(raw)
+
+    try:
+        await run_pipeline(runner.iter_urls(limit=limit), handle, workers=workers, limit=limit)
+    finally:
+        if client is not None:
+            await client.aclose()
+        await runner.aclose()
+
+    (out_dir / "index.json").write_text(json.dumps(index, indent=2, ensure_ascii=False), encoding="utf-8")
+    return len(index)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Nagrywanie korpusu stron do benchmarku parserów")
+    parser.add_argument("--source", choices=sorted(PARSERS), required=True, help="Źródło (marketplace)")
+    parser.add_argument("--limit", type=int, default=300, help="Liczba stron do nagrania")
+    parser.add_argument("--base-url", help="Adres listy ofert dealera (wymagany dla pewneauto)")
+    parser.add_argument("--workers", type=int, default=4, help="Liczba równoległych pobrań")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.source == "pewneauto" and not args.base_url:
+        parser.error("--base-url jest wymagany dla pewneauto")
+
+    count = asyncio.run(record(args.source, args.limit, args.base_url, args.workers))
+    print(f"Zapisano {count} stron do {CORPUS_DIR / args.source}")
+
+
+if __name__ == "__main__":
+    main()
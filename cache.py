@@ -0,0 +1,280 @@
+"""
+Cache - pamięć podręczna odczytów w procesie API (facety i odpowiedzi GET)
+
+Odczyty są cache'owane w pamięci pod tokenem wersji danych wyznaczanym z samych zapisów:
+najwyższe id snapshotu i wpisu dziennika zmian (vehicle_changes) oraz czas aktualizacji
+statystyk (source_stats) + licznik lokalnych unieważnień (np. po wyczyszczeniu bazy).
+Token przesuwa się więc przy każdym zapisie - także z przerwanego przebiegu, workera czy
+`--save-to-db` z CLI. Wersja jest sprawdzana w bazie co najwyżej raz na
+CACHE_VERSION_CHECK_SECONDS - zapisy innych procesów są widoczne z takim opóźnieniem,
+przebiegi w procesie API unieważniają cache od razu (`data_version.invalidate()`).
+
+ResponseCache trzyma gotowe odpowiedzi endpointów odczytu (LRU ograniczone liczbą wpisów
+i rozmiarem) z ETag, więc powtórne odczyty dashboardu nie trafiają do bazy, a klienci
+z If-None-Match dostają 304.
+"""
+import os
+import re
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from urllib.parse import urlencode
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+import models, database
+from search import normalize_text, prefix_text_match, text_matches
+from stats import ALL_SOURCES
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION_CHECK_SECONDS = float(os.getenv("CACHE_VERSION_CHECK_SECONDS", "10"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Endpointy GET z cache odpowiedzi -> dodatkowy czas życia wpisu w sekundach (None = do zmiany wersji).
+# /scrape/logs zmienia się w trakcie przebiegu (status, postęp), więc wpis żyje tylko chwilę.
+CACHED_ROUTES = [
+    (re.compile(r"^/vehicles$"), None),
+    (re.compile(r"^/vehicles/\d+/trends$"), None),
+    (re.compile(r"^/stats$"), None),
+    (re.compile(r"^/(brands|models|cities|sources|facets)$"), None),
+    (re.compile(r"^/scrape/logs$"), 2.0),
+]
+
+# Facety: nazwa -> indeks w wierszu agregatu (marka, model, dealer_city, source, liczba)
+FACETS = {"brands": 0, "models": 1, "cities": 2, "sources": 3}
+# Parametry filtrów facetów -> facet, którego dotyczą
+FACET_FILTERS = {"marka": "brands", "model": "models", "miasto": "cities", "source": "sources"}
+# Limit zapamiętanych wyników counts() dla różnych filtrów
+FACET_COUNTS_CACHE_SIZE = 256
+
+
+class DataVersion:
+    """Token wersji danych dla cache'y odczytów."""
+
+    def __init__(self, check_interval: float = CACHE_VERSION_CHECK_SECONDS):
+        self.check_interval = check_interval
+        self._writes: str | None = None
+        self._generation = 0
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def current(self, db: Session) -> str:
+        now = time.monotonic()
+        if self._writes is None or now - self._checked_at >= self.check_interval:
+            # Jedno zapytanie: max po kluczach głównych (indeks) i wiersz łączny statystyk
+            snapshot_id, change_id, stats_at = db.execute(select(
+                select(func.max(models.VehicleSnapshot.id)).scalar_subquery(),
+                select(func.max(models.VehicleChange.id)).scalar_subquery(),
+                select(models.SourceStats.updated_at).where(
+                    models.SourceStats.source == ALL_SOURCES
+                ).scalar_subquery(),
+            )).one()
+            stats_version = stats_at.timestamp() if stats_at else 0
+            with self._lock:
+                self._writes, self._checked_at = f"{snapshot_id or 0}.{change_id or 0}.{stats_version}", now
+        return f"{self._writes}.{self._generation}"
+
+    def cached_token(self) -> str | None:
+        """Token bez zapytania do bazy lub None, gdy wersję trzeba sprawdzić (current)."""
+        if self._writes is None or time.monotonic() - self._checked_at >= self.check_interval:
+            return None
+        return f"{self._writes}.{self._generation}"
+
+    def current_token(self) -> str:
+        """current() we własnej sesji (poza zależnością FastAPI, np. w middleware)."""
+        with database.SessionLocal() as db:
+            return self.current(db)
+
+    def invalidate(self):
+        """Wymusza nową wersję (i ponowne sprawdzenie bazy) przy następnym odczycie."""
+        with self._lock:
+            self._generation += 1
+            self._checked_at = 0.0
+
+
+class FacetCache:
+    """
+    Wartości facetów (marki, modele, miasta, źródła) z liczbą pojazdów, trzymane w pamięci.
+    Ładowane jednym GROUP BY po (marka, model, dealer_city, source) przy zmianie wersji danych;
+    listy, mapa marka -> modele i liczniki pod aktywnymi filtrami liczone są z tego agregatu.
+    Filtry tekstowe dopasowują tak samo jak /vehicles (search.text_match): po normalize_text,
+    prefiks na SQLite, dowolny fragment na Postgresie.
+    """
+
+    def __init__(self, version: DataVersion):
+        self.version = version
+        self._token: str | None = None
+        self._rows: list[tuple] = []
+        self._normalized: list[tuple] = []  # (marka, model, dealer_city) po normalize_text, jak w _rows
+        self._prefix = True
+        self._values: dict[str, list[str]] = {}
+        self._models_by_brand: dict[str, list[str]] = {}
+        self._counts: dict[tuple, dict] = {}
+        self._lock = threading.Lock()
+
+    def _load(self, db: Session):
+        token = self.version.current(db)
+        if token == self._token:
+            return
+        with self._lock:
+            if token == self._token:
+                return
+            rows = [tuple(row) for row in db.query(
+                models.Vehicle.marka, models.Vehicle.model, models.Vehicle.dealer_city,
+                models.Vehicle.source, func.count(models.Vehicle.id)
+            ).group_by(
+                models.Vehicle.marka, models.Vehicle.model, models.Vehicle.dealer_city, models.Vehicle.source
+            )]
+            values = {facet: sorted({row[idx] for row in rows if row[idx] is not None}) for facet, idx in FACETS.items()}
+            models_by_brand: dict[str, set] = {}
+            for marka, model, *_ in rows:
+                if marka is not None and model is not None:
+                    models_by_brand.setdefault(marka, set()).add(model)
+            self._rows, self._values, self._counts = rows, values, {}
+            self._normalized = [tuple(normalize_text(value) for value in row[:3]) for row in rows]
+            self._prefix = prefix_text_match(db)
+            self._models_by_brand = {brand: sorted(names) for brand, names in models_by_brand.items()}
+            self._token = token
+            logger.info(f"Załadowano cache facetów ({len(rows)} kombinacji, wersja {token})")
+
+    def values(self, db: Session, facet: str) -> list[str]:
+        """Posortowane wartości facetu (bez None)."""
+        self._load(db)
+        return self._values[facet]
+
+    def models_for(self, db: Session, marka: str | None = None) -> list[str]:
+        """Modele marek pasujących do `marka` (jak filtr marka w /vehicles) lub wszystkie."""
+        self._load(db)
+        if not marka:
+            return self._values["models"]
+        needle = normalize_text(marka)
+        names = set()
+        for brand, brand_models in self._models_by_brand.items():
+            if text_matches(normalize_text(brand), needle, self._prefix):
+                names.update(brand_models)
+        return sorted(names)
+
+    def counts(self, db: Session, **filters: str | None) -> dict[str, dict[str, int]]:
+        """
+        Liczba pojazdów dla każdej wartości każdego facetu pod aktywnymi filtrami
+        (marka, model, miasto - jak text_match; source - dokładnie). Filtr facetu nie
+        zawęża jego własnych wartości, więc można z nich wybierać alternatywy.
+        """
+        self._load(db)
+        active = {
+            FACETS[FACET_FILTERS[name]]: value if name == "source" else normalize_text(value)
+            for name, value in filters.items() if value
+        }
+        key = tuple(sorted(active.items()))
+        cached = self._counts.get(key)
+        if cached is not None:
+            return cached
+
+        def matches(row: tuple, normalized: tuple, skip: int) -> bool:
+            for idx, value in active.items():
+                if idx == skip:
+                    continue
+                if row[idx] is None:
+                    return False
+                if idx == FACETS["sources"]:
+                    if row[idx] != value:
+                        return False
+                elif not text_matches(normalized[idx], value, self._prefix):
+                    return False
+            return True
+
+        result = {}
+        for facet, idx in FACETS.items():
+            counts: dict[str, int] = {}
+            for row, normalized in zip(self._rows, self._normalized):
+                if row[idx] is not None and matches(row, normalized, idx):
+                    counts[row[idx]] = counts.get(row[idx], 0) + row[-1]
+            result[facet] = dict(sorted(counts.items()))
+
+        if len(self._counts) >= FACET_COUNTS_CACHE_SIZE:
+            self._counts.clear()
+        self._counts[key] = result
+        return result
+
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    status_code: int
+    headers: dict[str, str]
+    etag: str
+    created_at: float
+
+
+def cache_ttl(path: str) -> tuple[bool, float | None]:
+    """(czy endpoint jest cache'owany, dodatkowy TTL wpisu)."""
+    for pattern, ttl in CACHED_ROUTES:
+        if pattern.match(path):
+            return True, ttl
+    return False, None
+
+
+def response_key(path: str, query: list[tuple[str, str]]) -> str:
+    """Klucz wpisu: ścieżka + posortowane parametry (kolejność w URL bez znaczenia)."""
+    params = sorted((name, value) for name, value in query if value != "")
+    return f"{path}?{urlencode(params)}"
+
+
+def body_etag(body: bytes) -> str:
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+class ResponseCache:
+    """Odpowiedzi endpointów odczytu dla bieżącej wersji danych (LRU: liczba wpisów i bajty)."""
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_SIZE, max_bytes: int = RESPONSE_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, CachedResponse] = OrderedDict()
+        self._bytes = 0
+        self._token: str | None = None
+        self._lock = threading.Lock()
+
+    def _switch(self, token: str):
+        # Nowa wersja danych - stare wpisy są bezużyteczne
+        if token != self._token:
+            self._entries.clear()
+            self._bytes = 0
+            self._token = token
+
+    def get(self, token: str, key: str, ttl: float | None = None) -> CachedResponse | None:
+        with self._lock:
+            self._switch(token)
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if ttl is not None and time.monotonic() - entry.created_at > ttl:
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, token: str, key: str, entry: CachedResponse):
+        if len(entry.body) > self.max_bytes:
+            return
+        with self._lock:
+            self._switch(token)
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = entry
+            self._bytes += len(entry.body)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry.body)
+
+
+data_version = DataVersion()
+facets = FacetCache(data_version)
+responses = ResponseCache()
@@ -0,0 +1,637 @@
+"""
+Exports - eksporty CSV pojazdów
+
+Wiersze są generowane strumieniowo: pojazdy razem z najnowszym snapshotem czytane są
+paczkami (yield_per, w Postgresie kursor po stronie serwera), a CSV jest wysyłany
+kawałkami w trakcie generowania - pamięć nie zależy od liczby pojazdów.
+"""
+import io
+import os
+import re
+import csv
+import json
+import logging
+from datetime import timedelta
+from typing import Callable, Iterator
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+import models, database
+
+logger = logging.getLogger(__name__)
+
+# Liczba pojazdów czytanych z bazy jedną paczką
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "500"))
+# Rozmiar (znaki) kawałka CSV wysyłanego do klienta
+EXPORT_FLUSH_CHARS = 64 * 1024
+
+VEHICLE_COLUMNS = [
+        "ID", "Marka", "Model", "Wersja", "Rok", "Pierwsza rejestracja", "VIN",
+        "Paliwo", "Pojemność cm3", "Moc km", "Skrzynia biegów", "Napęd",
+        "Typ nadwozia", "Kolor", "Ilość drzwi",
+        "Cena", "Przebieg", "Zdjęcie główne", "Pozostałe zdjęcia",
+        "Lokalizacja", "URL",
+        "Wyposazenie Technologia", "Wyposazenie Komfort", "Wyposazenie Bezpieczenstwo", "Wyposazenie Wyglad"
+]
+
+CAR_SCOUT_COLUMNS = [
+        "listing_id", "listing_url", "scraped_at", "make", "model", "version", "vin",
+        "price_pln", "price_display", "omnibus_lowest_30d_pln", "omnibus_text",
+        "production_year", "mileage_km", "fuel_type", "transmission", "engine_power_hp",
+        "registration_number", "first_registration_date", "engine_capacity_cm3", "drive",
+        "body_type", "doors", "seats", "color", "paint_type", "dealer_name",
+        "dealer_address_line1", "dealer_address_line2", "dealer_address_line3",
+        "dealer_google_rating", "dealer_review_count", "dealer_google_link",
+        "contact_phone", "primary_image_url", "image_count", "image_urls",
+        "equipment_audio_multimedia", "equipment_safety", "equipment_comfort_extras",
+        "equipment_other", "additional_info_header", "additional_info_content", "specs_json"
+]
+
+CAR_SCOUT_ARCHIVE_COLUMNS = CAR_SCOUT_COLUMNS + ["status"]
+
+
+def with_latest_snapshot(db: Session):
+    """Pojazdy razem z najnowszym snapshotem (lub None) - jeden LEFT JOIN po latest_snapshot_id."""
+    return db.query(models.Vehicle, models.VehicleSnapshot).outerjoin(
+        models.VehicleSnapshot, models.VehicleSnapshot.id == models.Vehicle.latest_snapshot_id
+    )
+
+
+def get_latest_scrape_timestamp(db: Session, source: str | None = None):
+    """Finds the most recent scraped_at timestamp for a given source (including 304 heartbeats)."""
+    query = db.query(func.max(models.VehicleSnapshot.scraped_at))
+    seen_query = db.query(func.max(models.Vehicle.last_seen_at))
+    if source:
+        query = query.filter(models.VehicleSnapshot.source == source)
+        seen_query = seen_query.filter(models.Vehicle.source == source)
+    timestamps = [ts for ts in (query.scalar(), seen_query.scalar()) if ts]
+    return max(timestamps) if timestamps else None
+
+
+# Znaki spoza tego zbioru (i ciągi kropek) w nazwie pliku zamieniane na "-"
+SAFE_FILENAME = re.compile(r"[^A-Za-z0-9._-]+|\.{2,}")
+
+
+def export_filename(prefix: str, source: str | None = None, dealer_group: str | None = None, ext: str = "csv") -> str:
+    if source and dealer_group:
+        return f"{prefix}_{source}_{SAFE_FILENAME.sub('-', dealer_group)}.{ext}"
+    if source:
+        return f"{prefix}_{source}.{ext}"
+    return f"{prefix}.{ext}"
+
+
+def stream_csv(columns: list[str], rows: Callable[..., Iterator[list]], **filters) -> Iterator[str]:
+    """
+    Generator CSV dla StreamingResponse. Otwiera własną sesję - sesja z zależności
+    FastAPI może zostać zamknięta, zanim odpowiedź zostanie w całości wysłana.
+    """
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(columns)
+    count = 0
+    db = database.SessionLocal()
+    try:
+        for row in rows(db, **filters):
+            writer.writerow(row)
+            count += 1
+            if output.tell() >= EXPORT_FLUSH_CHARS:
+                yield output.getvalue()
+                output.seek(0)
+                output.truncate()
+        yield output.getvalue()
+    finally:
+        db.close()
+    logger.info(f"Exported {count} vehicles to CSV ({rows.__name__})")
+
+
+def vehicle_rows(db: Session, source: str | None = None, dealer_group: str | None = None) -> Iterator[list]:
+    """Wiersze eksportu /export/csv: aktywne pojazdy z najnowszym snapshotem."""
+    query = with_latest_snapshot(db).filter(
+        or_(models.Vehicle.status == 'active', models.Vehicle.status.is_(None))
+    )
+    if source:
+        query = query.filter(models.Vehicle.source == source)
+    if dealer_group:
+        query = query.filter(models.Vehicle.dealer_group == dealer_group)
+    
+    for v, latest in query.yield_per(EXPORT_CHUNK_SIZE):
+        raw_equipment = latest.equipment_json if latest else {}
+        if isinstance(raw_equipment, str):
+            try:
+                equipment = json.loads(raw_equipment)
+            except:
+                equipment = {}
+        elif isinstance(raw_equipment, dict):
+            equipment = raw_equipment
+        else:
+            equipment = {}
+        
+        all_pictures = latest.pictures if latest and latest.pictures else ""
+        picture_list = re.split(r'\s*\|\s*', all_pictures) if all_pictures else []
+        main_image = picture_list[0] if picture_list else ""
+        other_images = " | ".join(picture_list[1:]) if len(picture_list) > 1 else ""
+        
+        yield [
+            v.id,
+            v.marka or "",
+            v.model or "",
+            v.wersja or "",
+            v.rocznik or "",
+            v.pierwsza_rejestracja or "",
+            v.vin or "",
+            v.typ_silnika or "",
+            v.pojemnosc_cm3 or "",
+            v.moc_km or "",
+            v.skrzynia_biegow or "",
+            v.naped or "",
+            v.typ_nadwozia or "",
+            v.kolor or "",
+            v.ilosc_drzwi or "",
+            latest.price if latest else "",
+            latest.mileage if latest else "",
+            main_image,
+            other_images,
+            v.dealer_city or "",
+            v.url,
+            equipment.get("technologia", "") if equipment else "",
+            equipment.get("komfort", "") if equipment else "",
+            equipment.get("bezpieczenstwo", "") if equipment else "",
+            equipment.get("wyglad", "") if equipment else "",
+        ]
+
+
+def car_scout_query(db: Session, source: str | None = None, dealer_group: str | None = None):
+    """Pojazdy eksportu Car-Scout: z ostatniego przebiegu źródła (także 304), z najnowszym snapshotem."""
+    # Find latest scrape timestamp for this source
+    latest_ts = get_latest_scrape_timestamp(db, source)
+
+    query = with_latest_snapshot(db)
+
+    if dealer_group:
+        query = query.filter(models.Vehicle.dealer_group == dealer_group)
+
+    if latest_ts:
+        # We take everything from the last 12 hours of the max timestamp to be safe 
+        # (in case a scrape took a few hours)
+        start_time = latest_ts - timedelta(hours=12)
+        
+        # Subquery for vehicles that have a snapshot in this window
+        recent_vehicle_ids = db.query(models.VehicleSnapshot.vehicle_id).filter(
+            models.VehicleSnapshot.scraped_at >= start_time
+        )
+        if source:
+            recent_vehicle_ids = recent_vehicle_ids.filter(models.VehicleSnapshot.source == source)
+        
+        # Oferty niezmienione (304) nie mają nowego snapshotu - liczy się ich last_seen_at
+        query = query.filter(or_(
+            models.Vehicle.id.in_(recent_vehicle_ids.scalar_subquery()),
+            models.Vehicle.last_seen_at >= start_time
+        ))
+    else:
+        # Fallback to active if no snapshots found (shouldn't happen)
+        query = query.filter(or_(models.Vehicle.status == 'active', models.Vehicle.status.is_(None)))
+        
+    if source:
+        query = query.filter(models.Vehicle.source == source)
+    return query
+
+
+def car_scout_rows(db: Session, source: str | None = None, dealer_group: str | None = None) -> Iterator[list]:
+    """Wiersze eksportu Car-Scout: pojazdy z ostatniego przebiegu źródła (także 304)."""
+    query = car_scout_query(db, source, dealer_group)
+    for v, latest in query.yield_per(EXPORT_CHUNK_SIZE):
+        if not v.vin and not v.id:
+            continue
+            
+        if not latest:
+            continue
+            
+        # Relaxed check: allow 0 (e.g. for new cars with 0 mileage)
+        # Vehicles from 'vehis' and 'fiat.pgd.pl' are exempt from strict mileage validation
+        if v.source in ["vehis", "fiat.pgd.pl"]:
+            has_required = True
+        else:
+            has_required = latest.price is not None and v.rocznik is not None and latest.mileage is not None
+            
+        if not has_required:
+            continue
+            
+        raw_equipment = latest.equipment_json if latest else {}
+        if isinstance(raw_equipment, str):
+            try:
+                equipment = json.loads(raw_equipment)
+            except:
+                equipment = {}
+        elif isinstance(raw_equipment, dict):
+            equipment = raw_equipment
+        else:
+            equipment = {}
+        
+        all_pictures = latest.pictures if latest and latest.pictures else ""
+        
+        picture_list = re.split(r'\s*\|\s*', all_pictures) if all_pictures else []
+        
+        main_image = picture_list[0] if picture_list else ""
+        other_images = " | ".join(picture_list[1:]) if len(picture_list) > 1 else ""
+        all_pictures_str = " | ".join(picture_list)
+        
+        price_display = f"{latest.price:,} PLN".replace(",", " ") if latest.price else ""
+        
+        equipment_audio = equipment.get("technologia", [])
+        equipment_safety = equipment.get("bezpieczenstwo", [])
+        equipment_comfort = equipment.get("komfort", [])
+        equipment_other = equipment.get("wyglad", [])
+        
+        # New: Extract additional info for Findcar
+        add_info_header = equipment.get("additional_info_header", "")
+        add_info_content = equipment.get("additional_info_content", latest.tags if latest else "")
+        
+        audio_str = "|".join(equipment_audio) if isinstance(equipment_audio, list) else str(equipment_audio or "")
+        safety_str = "|".join(equipment_safety) if isinstance(equipment_safety, list) else str(equipment_safety or "")
+        comfort_str = "|".join(equipment_comfort) if isinstance(equipment_comfort, list) else str(equipment_comfort or "")
+        other_str = "|".join(equipment_other) if isinstance(equipment_other, list) else str(equipment_other or "")
+        
+        # Priority for raw equipment if available (e.g. for Vehis)
+        if latest.equipment:
+            audio_str = latest.equipment
+        if latest.additional_equipment:
+            other_str = latest.additional_equipment
+        
+        scraped_at = latest.scraped_at.isoformat() if latest.scraped_at else ""
+        
+        yield [
+            v.numer_oferty or (str(v.id) if v.id else ""),
+            v.url or "",
+            scraped_at,
+            v.marka or "",
+            v.model or "",
+            v.wersja or "",
+            v.vin or "",
+            str(latest.price) if latest.price is not None else "",
+            price_display,
+            str(latest.old_price) if latest.old_price is not None else "",
+            "",
+            str(v.rocznik) if v.rocznik is not None else "",
+            str(latest.mileage) if latest.mileage is not None else "",
+            v.typ_silnika or "",
+            v.skrzynia_biegow or "",
+            str(v.moc_km) if v.moc_km is not None else "",
+            "",
+            v.pierwsza_rejestracja or "",
+            str(v.pojemnosc_cm3) if v.pojemnosc_cm3 is not None else "",
+            v.naped or "",
+            v.typ_nadwozia or "",
+            v.ilosc_drzwi or "",
+            "",
+            v.kolor or "",
+            "",
+            v.dealer_name or "",
+            v.dealer_street or "",
+            " ".join(filter(None, [v.dealer_postcode, v.dealer_city])),
+            "",
+            "",
+            "",
+            "",
+            v.contact_phone or "",
+            main_image,
+            "",
+            all_pictures_str,
+            audio_str,
+            safety_str,
+            comfort_str,
+            other_str,
+            add_info_header or "",
+            add_info_content or "",
+            ""
+        ]
+
+
+def car_scout_archive_query(db: Session, source: str | None = None, dealer_group: str | None = None):
+    """Wszystkie pojazdy (także zarchiwizowane) z najnowszym snapshotem."""
+    query = with_latest_snapshot(db)
+    if source:
+        query = query.filter(models.Vehicle.source == source)
+    if dealer_group:
+        query = query.filter(models.Vehicle.dealer_group == dealer_group)
+    return query
+
+
+def car_scout_archive_rows(db: Session, source: str | None = None, dealer_group: str | None = None) -> Iterator[list]:
+    """Wiersze archiwum Car-Scout: wszystkie pojazdy, także zarchiwizowane."""
+    query = car_scout_archive_query(db, source, dealer_group)
+    for v, latest in query.yield_per(EXPORT_CHUNK_SIZE):
+        if not latest:
+            continue
+            
+        raw_equipment = latest.equipment_json if latest else {}
+        if isinstance(raw_equipment, str):
+            try:
+                equipment = json.loads(raw_equipment)
+            except:
+                equipment = {}
+        elif isinstance(raw_equipment, dict):
+            equipment = raw_equipment
+        else:
+            equipment = {}
+        
+        all_pictures = latest.pictures if latest and latest.pictures else ""
+        picture_list = re.split(r'\s*\|\s*', all_pictures) if all_pictures else []
+        main_image = picture_list[0] if picture_list else ""
+        all_pictures_str = " | ".join(picture_list)
+        
+        price_display = f"{latest.price:,} PLN".replace(",", " ") if latest.price else ""
+        
+        equipment_audio = equipment.get("technologia", [])
+        equipment_safety = equipment.get("bezpieczenstwo", [])
+        equipment_comfort = equipment.get("komfort", [])
+        equipment_other = equipment.get("wyglad", [])
+        
+        add_info_header = equipment.get("additional_info_header", "")
+        add_info_content = equipment.get("additional_info_content", latest.tags if latest else "")
+        
+        audio_str = "|".join(equipment_audio) if isinstance(equipment_audio, list) else str(equipment_audio or "")
+        safety_str = "|".join(equipment_safety) if isinstance(equipment_safety, list) else str(equipment_safety or "")
+        comfort_str = "|".join(equipment_comfort) if isinstance(equipment_comfort, list) else str(equipment_comfort or "")
+        other_str = "|".join(equipment_other) if isinstance(equipment_other, list) else str(equipment_other or "")
+        
+        if latest.equipment:
+            audio_str = latest.equipment
+        if latest.additional_equipment:
+            other_str = latest.additional_equipment
+        
+        scraped_at = latest.scraped_at.isoformat() if latest.scraped_at else ""
+        
+        yield [
+            v.numer_oferty or (str(v.id) if v.id else ""),
+            v.url or "",
+            scraped_at,
+            v.marka or "",
+            v.model or "",
+            v.wersja or "",
+            v.vin or "",
+            str(latest.price) if latest.price is not None else "",
+            price_display,
+            str(latest.old_price) if latest.old_price is not None else "",
+            "",
+            str(v.rocznik) if v.rocznik is not None else "",
+            str(latest.mileage) if latest.mileage is not None else "",
+            v.typ_silnika or "",
+            v.skrzynia_biegow or "",
+            str(v.moc_km) if v.moc_km is not None else "",
+            "",
+            v.pierwsza_rejestracja or "",
+            str(v.pojemnosc_cm3) if v.pojemnosc_cm3 is not None else "",
+            v.naped or "",
+            v.typ_nadwozia or "",
+            v.ilosc_drzwi or "",
+            "",
+            v.kolor or "",
+            "",
+            v.dealer_name or "",
+            v.dealer_street or "",
+            " ".join(filter(None, [v.dealer_postcode, v.dealer_city])),
+            "",
+            "",
+            "",
+            "",
+            v.contact_phone or "",
+            main_image,
+            "",
+            all_pictures_str,
+            audio_str,
+            safety_str,
+            comfort_str,
+            other_str,
+            add_info_header or "",
+            add_info_content or "",
+            "",
+            v.status or "active"
+        ]
+
+
+# --- Eksporty kolumnowe (Parquet / Arrow IPC) ---
+# pyarrow jest importowany dopiero przy eksporcie, żeby API i workery działały bez niego
+
+COLUMNAR_FORMATS = {
+    "parquet": ("parquet", "application/vnd.apache.parquet"),
+    "arrow": ("arrow", "application/vnd.apache.arrow.file"),
+}
+
+# Kolumny Car-Scout z typami: liczby jako liczby, listy (zdjęcia, wyposażenie) jako list<string>,
+# powtarzalne wartości tekstowe (marka, paliwo, dealer...) kodowane słownikowo
+CAR_SCOUT_FIELDS = [
+    ("listing_id", "string"),
+    ("listing_url", "string"),
+    ("scraped_at", "timestamp"),
+    ("source", "category"),
+    ("make", "category"),
+    ("model", "category"),
+    ("version", "string"),
+    ("vin", "string"),
+    ("price_pln", "int"),
+    ("omnibus_lowest_30d_pln", "int"),
+    ("production_year", "int"),
+    ("mileage_km", "int"),
+    ("fuel_type", "category"),
+    ("transmission", "category"),
+    ("engine_power_hp", "int"),
+    ("first_registration_date", "string"),
+    ("engine_capacity_cm3", "int"),
+    ("drive", "category"),
+    ("body_type", "category"),
+    ("doors", "category"),
+    ("color", "category"),
+    ("dealer_name", "category"),
+    ("dealer_address_line1", "string"),
+    ("dealer_address_line2", "string"),
+    ("contact_phone", "string"),
+    ("primary_image_url", "string"),
+    ("image_count", "int"),
+    ("image_urls", "list"),
+    ("equipment_audio_multimedia", "list"),
+    ("equipment_safety", "list"),
+    ("equipment_comfort_extras", "list"),
+    ("equipment_other", "list"),
+    ("additional_info_header", "string"),
+    ("additional_info_content", "string"),
+]
+
+CAR_SCOUT_ARCHIVE_FIELDS = CAR_SCOUT_FIELDS + [("status", "category")]
+
+
+def split_list(value) -> list[str]:
+    """Lista z wartości zapisanej jako lista lub tekst rozdzielony '|'."""
+    if not value:
+        return []
+    if isinstance(value, list):
+        return [str(item).strip() for item in value if item]
+    return [item.strip() for item in str(value).split("|") if item.strip()]
+
+
+def car_scout_record(v: models.Vehicle, latest: models.VehicleSnapshot) -> dict:
+    """Typowany rekord Car-Scout (te same dane co wiersz CSV, bez pustych kolumn)."""
+    equipment = latest.equipment_json or {}
+    if isinstance(equipment, str):
+        try:
+            equipment = json.loads(equipment)
+        except ValueError:
+            equipment = {}
+    if not isinstance(equipment, dict):
+        equipment = {}
+    pictures = split_list(latest.pictures)
+
+    return {
+        "listing_id": v.numer_oferty or str(v.id),
+        "listing_url": v.url,
+        "scraped_at": latest.scraped_at,
+        "source": v.source,
+        "make": v.marka,
+        "model": v.model,
+        "version": v.wersja,
+        "vin": v.vin,
+        "price_pln": latest.price,
+        "omnibus_lowest_30d_pln": latest.old_price,
+        "production_year": v.rocznik,
+        "mileage_km": latest.mileage,
+        "fuel_type": v.typ_silnika,
+        "transmission": v.skrzynia_biegow,
+        "engine_power_hp": v.moc_km,
+        "first_registration_date": v.pierwsza_rejestracja,
+        "engine_capacity_cm3": v.pojemnosc_cm3,
+        "drive": v.naped,
+        "body_type": v.typ_nadwozia,
+        "doors": v.ilosc_drzwi,
+        "color": v.kolor,
+        "dealer_name": v.dealer_name,
+        "dealer_address_line1": v.dealer_street,
+        "dealer_address_line2": " ".join(filter(None, [v.dealer_postcode, v.dealer_city])) or None,
+        "contact_phone": v.contact_phone,
+        "primary_image_url": pictures[0] if pictures else None,
+        "image_count": len(pictures),
+        "image_urls": pictures,
+        # Surowe wyposażenie (np. Vehis) ma pierwszeństwo - tak jak w CSV
+        "equipment_audio_multimedia": split_list(latest.equipment or equipment.get("technologia")),
+        "equipment_safety": split_list(equipment.get("bezpieczenstwo")),
+        "equipment_comfort_extras": split_list(equipment.get("komfort")),
+        "equipment_other": split_list(latest.additional_equipment or equipment.get("wyglad")),
+        "additional_info_header": equipment.get("additional_info_header") or None,
+        "additional_info_content": equipment.get("additional_info_content", latest.tags) or None,
+        "status": v.status or "active",
+    }
+
+
+def car_scout_records(db: Session, source: str | None = None, dealer_group: str | None = None) -> Iterator[dict]:
+    """Rekordy eksportu Car-Scout (filtr wymaganych pól jak w CSV)."""
+    for v, latest in car_scout_query(db, source, dealer_group).yield_per(EXPORT_CHUNK_SIZE):
+        if not latest:
+            continue
+        if v.source not in ["vehis", "fiat.pgd.pl"] and (
+                latest.price is None or v.rocznik is None or latest.mileage is None):
+            continue
+        yield car_scout_record(v, latest)
+
+
+def car_scout_archive_records(db: Session, source: str | None = None, dealer_group: str | None = None) -> Iterator[dict]:
+    """Rekordy archiwum Car-Scout: wszystkie pojazdy z co najmniej jednym snapshotem."""
+    for v, latest in car_scout_archive_query(db, source, dealer_group).yield_per(EXPORT_CHUNK_SIZE):
+        if latest:
+            yield car_scout_record(v, latest)
+
+
+class _ChunkSink(io.RawIOBase):
+    """Plik tylko do zapisu, z którego zapisane bajty odbiera się kawałkami (drain)."""
+
+    def __init__(self):
+        self.chunks: list[bytes] = []
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def drain(self) -> bytes:
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+
+class _BatchEncoder:
+    """
+    Zamienia rekordy na RecordBatch wg listy pól. Słowniki kolumn kategorycznych rosną
+    między paczkami (tylko dopisywanie), więc plik Arrow IPC dostaje delty słowników.
+    """
+
+    def __init__(self, pa, fields: list[tuple[str, str]]):
+        self.pa = pa
+        self.fields = fields
+        self.types = {
+            "string": pa.string(),
+            "int": pa.int64(),
+            "timestamp": pa.timestamp("us"),
+            "list": pa.list_(pa.string()),
+            "category": pa.dictionary(pa.int32(), pa.string()),
+        }
+        self.schema = pa.schema([(name, self.types[kind]) for name, kind in fields])
+        self.dictionaries: dict[str, dict[str, int]] = {name: {} for name, kind in fields if kind == "category"}
+
+    def encode(self, records: list[dict]):
+        pa = self.pa
+        arrays = []
+        for name, kind in self.fields:
+            values = [record.get(name) for record in records]
+            if kind == "category":
+                dictionary = self.dictionaries[name]
+                indices = [None if value is None else dictionary.setdefault(str(value), len(dictionary)) for value in values]
+                arrays.append(pa.DictionaryArray.from_arrays(
+                    pa.array(indices, pa.int32()), pa.array(list(dictionary), pa.string())
+                ))
+            else:
+                arrays.append(pa.array(values, self.types[kind]))
+        return pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+
+
+def stream_columnar(fmt: str, fields: list[tuple[str, str]], records: Callable[..., Iterator[dict]],
+                    **filters) -> Iterator[bytes]:
+    """
+    Generator pliku Parquet lub Arrow IPC dla StreamingResponse, zapisywanego paczkami
+    po EXPORT_CHUNK_SIZE rekordów. ImportError (brak pyarrow) zgłaszany jest od razu,
+    jeszcze przed rozpoczęciem odpowiedzi.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    def generate():
+        encoder = _BatchEncoder(pa, fields)
+        sink = _ChunkSink()
+        if fmt == "parquet":
+            writer = pq.ParquetWriter(sink, encoder.schema, compression="zstd")
+        else:
+            writer = pa.ipc.new_file(sink, encoder.schema, options=pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True))
+
+        count = 0
+        db = database.SessionLocal()
+        try:
+            batch = []
+            for record in records(db, **filters):
+                batch.append(record)
+                if len(batch) >= EXPORT_CHUNK_SIZE:
+                    writer.write_batch(encoder.encode(batch))
+                    count += len(batch)
+                    batch = []
+                    yield sink.drain()
+            if batch:
+                writer.write_batch(encoder.encode(batch))
+                count += len(batch)
+            writer.close()
+            yield sink.drain()
+        finally:
+            db.close()
+        logger.info(f"Exported {count} vehicles to {fmt} ({records.__name__})")
+
+    return generate()
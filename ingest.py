@@ -0,0 +1,495 @@
+"""
+Ingest - zapis wyników scrapowania do bazy
+
+Wspólne dla przebiegów w procesie API (run_scraper_task) i dla workerów
+(python -m scraper.worker): zapis ofert i snapshotów paczkami (upsert), archiwizacja ofert,
+które zniknęły z marketplace, oraz kolejka URL-i przebiegu (scrape_queue),
+dzięki której przerwany przebieg można wznowić.
+"""
+import os
+import asyncio
+import logging
+from contextlib import aclosing
+from datetime import datetime
+from typing import AsyncIterator
+from sqlalchemy import JSON, func, insert as sa_insert, literal, null, or_, select, update
+from sqlalchemy.orm import Session
+import models, database
+from search import TEXT_MATCH_COLUMNS, normalize_text, snapshot_document
+from stats import ALL_SOURCES
+
+logger = logging.getLogger(__name__)
+
+# Liczba ofert zapisywanych jedną transakcją (upsert pojazdów + snapshoty)
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "50"))
+
+# Pola snapshotu, których zmiana trafia do dziennika zmian (vehicle_changes) jako 'updated'
+TRACKED_FIELDS = ("price", "mileage", "pictures")
+
+
+# Obsługiwane marketplace (MarketplaceRunner, scraper_fiat_pgd.py)
+MARKETPLACES = ("autopunkt", "pewneauto", "findcar", "vehis", "fiat_pgd")
+
+
+def source_domain(marketplace: str) -> str:
+    """Wartość kolumny `source` dla pojazdów z danego marketplace."""
+    # Scraper sets source as "autopunkt.pl", "findcar.pl", "vehis", "fiat.pgd.pl"
+    if marketplace in ["fiat_pgd", "pgd", "fiat"]:
+        return "fiat.pgd.pl"
+    if marketplace == "vehis":
+        return "vehis"
+    return f"{marketplace}.pl" if not marketplace.endswith('.pl') else marketplace
+
+
+def load_dealer_configs(db: Session, marketplace: str) -> list[tuple[str, str]]:
+    """Aktywne konfiguracje dealerów jako lista (dealer_name, base_url)."""
+    configs = db.query(models.ScraperConfig).filter(models.ScraperConfig.marketplace == marketplace).all()
+    return [(c.dealer_name, c.base_url) for c in configs if c.is_active]
+
+
+def equipment_json(marketplace: str, data: dict) -> dict:
+    """Znormalizowane wyposażenie oferty do snapshotu (wspólne klucze dla wszystkich źródeł)."""
+    if marketplace == "autopunkt" or marketplace == "pewneauto":
+        return {
+            "technologia": data.get("technologia"),
+            "komfort": data.get("komfort"),
+            "bezpieczenstwo": data.get("bezpieczenstwo"),
+            "wyglad": data.get("wyglad") or data.get("wyposazenie_inne"),
+        }
+    if marketplace in ["findcar", "fiat_pgd", "pgd", "fiat"]:
+        return {
+            "technologia": data.get("equipment_audio_multimedia"),
+            "komfort": data.get("equipment_comfort_extras"),
+            "bezpieczenstwo": data.get("equipment_safety"),
+            "wyglad": data.get("equipment_other"),
+            "additional_info_header": data.get("additional_info_header"),
+            "additional_info_content": data.get("additional_info_content"),
+        }
+    # vehis
+    return {
+        "technologia": data.get("equipment_audio_multimedia"),
+        "komfort": data.get("equipment_comfort_extras"),
+        "bezpieczenstwo": data.get("equipment_safety"),
+        "wyglad": data.get("equipment_other"),
+        "additional_info_content": data.get("additional_info_content"),
+    }
+
+
+def _dialect_insert(db: Session):
+    """`insert` z obsługą ON CONFLICT dla silnika sesji (Postgres lub SQLite)."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"Upsert pojazdów nieobsługiwany dla bazy {dialect}")
+    return insert
+
+
+def _upsert_offers(db: Session, marketplace: str, offers: list[tuple[str, dict]], run_id: int | None = None):
+    """
+    Jedna transakcja na paczkę: INSERT ... ON CONFLICT (url) DO UPDATE dla pojazdów,
+    jedno wstawienie snapshotów i aktualizacja `latest_snapshot_id`. Puste wartości (None)
+    nie nadpisują zapisanych danych, walidatory HTTP zawsze pochodzą z ostatniej odpowiedzi.
+    Nowe pojazdy i zmiany ceny / przebiegu / zdjęć trafiają do dziennika zmian (vehicle_changes),
+    a wyposażenie snapshotu do indeksu wyszukiwania (vehicle_search).
+    """
+    now = datetime.now()
+    offers = list(dict(offers).items())  # duplikaty URL-i w paczce - wygrywa ostatni
+    table = models.Vehicle.__table__
+    columns = [c for c in table.columns.keys() if c not in ("id", "created_at")]
+
+    # Stan przed zapisem (dziennik zmian): url -> (status, cena, przebieg, zdjęcia z najnowszego snapshotu)
+    previous = {
+        url: (status, {"price": price, "mileage": mileage, "pictures": pictures})
+        for url, status, price, mileage, pictures in db.query(
+            models.Vehicle.url, models.Vehicle.status, models.VehicleSnapshot.price,
+            models.VehicleSnapshot.mileage, models.VehicleSnapshot.pictures
+        ).outerjoin(
+            models.VehicleSnapshot, models.VehicleSnapshot.id == models.Vehicle.latest_snapshot_id
+        ).filter(models.Vehicle.url.in_([url for url, _ in offers]))
+    }
+
+    rows = []
+    for url, data in offers:
+        row = {c: data.get(c) for c in columns}
+        row.update(url=url, status="active", last_seen_at=now, last_seen_run_id=run_id,
+                   source=data.get("source", "autopunkt.pl"))
+        for name in TEXT_MATCH_COLUMNS:
+            row[f"{name}_norm"] = normalize_text(row[name]) or None
+        rows.append(row)
+
+    insert = _dialect_insert(db)
+    stmt = insert(table).values(rows)
+    always = ("status", "last_seen_at", "http_etag", "http_last_modified")
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.url],
+        set_={
+            c: stmt.excluded[c] if c in always else func.coalesce(stmt.excluded[c], table.c[c])
+            for c in columns if c != "url"
+        },
+    ).returning(table.c.id, table.c.url)
+    vehicle_ids = {url: vehicle_id for vehicle_id, url in db.execute(stmt)}
+
+    snapshots = models.VehicleSnapshot.__table__
+    snapshot_rows = [
+        {
+            "vehicle_id": vehicle_ids[url],
+            "price": data.get("cena_brutto_pln") or data.get("cena_netto_pln"),
+            "old_price": data.get("stara_cena_pln") or data.get("omnibus_lowest_30d_pln"),
+            "mileage": data.get("przebieg_km"),
+            "equipment_json": equipment_json(marketplace, data),
+            "equipment": data.get("equipment"),
+            "additional_equipment": data.get("additional_equipment"),
+            "tags": data.get("tagi_oferty") or data.get("additional_info_header"),
+            "pictures": data.get("zdjecia"),
+            "source": data.get("source", "autopunkt.pl"),
+            "scraped_at": now,
+        }
+        for url, data in offers
+    ]
+    inserted = db.execute(snapshots.insert().returning(snapshots.c.id, snapshots.c.vehicle_id), snapshot_rows)
+    # Wskaźnik na najnowszy snapshot - endpointy odczytu robią jeden JOIN zamiast zapytania per pojazd
+    db.execute(update(models.Vehicle), [
+        {"id": vehicle_id, "latest_snapshot_id": snapshot_id} for snapshot_id, vehicle_id in inserted
+    ])
+
+    # Dokument wyszukiwania pełnotekstowego z najnowszego snapshotu
+    search = insert(models.VehicleSearch.__table__).values([
+        {"vehicle_id": snapshot["vehicle_id"], "document": snapshot_document(snapshot)} for snapshot in snapshot_rows
+    ])
+    db.execute(search.on_conflict_do_update(
+        index_elements=[models.VehicleSearch.vehicle_id], set_={"document": search.excluded.document}
+    ))
+
+    changes = []
+    for (url, _), snapshot in zip(offers, snapshot_rows):
+        change = {"vehicle_id": vehicle_ids[url], "source": snapshot["source"], "log_id": run_id, "changed_at": now}
+        if url not in previous:
+            changes.append({**change, "change_type": "new", "changed_fields": None})
+            continue
+        status, values = previous[url]
+        fields = [f for f in TRACKED_FIELDS if snapshot[f] != values[f]]
+        if status == "archiwum":
+            fields.append("status")
+        if fields:
+            changes.append({**change, "change_type": "updated", "changed_fields": fields})
+    if changes:
+        db.execute(models.VehicleChange.__table__.insert(), changes)
+    _count_snapshots(db, insert, snapshot_rows)
+    db.commit()
+
+
+def _count_snapshots(db: Session, insert, snapshot_rows: list[dict]):
+    """
+    Dolicza snapshoty paczki do source_stats w tej samej transakcji co ich zapis - liczniki
+    nie zależą od kolejności commitów równoległych workerów. Przed pierwszym przeliczeniem
+    (brak wiersza łącznego) snapshoty policzy jednorazowo stats.update_stats.
+    """
+    totals: dict[str, list[int]] = {}
+    for snapshot in snapshot_rows:
+        price = snapshot["price"]
+        for source in filter(None, (ALL_SOURCES, snapshot["source"])):
+            counts = totals.setdefault(source, [0, 0, 0])
+            counts[0] += 1
+            counts[1] += price or 0
+            counts[2] += price is not None
+    stats = models.SourceStats.__table__
+    count, price_sum, price_count = totals.pop(ALL_SOURCES)
+    # Najpierw wiersz łączny - stała kolejność blokad między równoległymi paczkami
+    counted = db.execute(update(stats).where(stats.c.source == ALL_SOURCES).values(
+        total_snapshots=stats.c.total_snapshots + count,
+        price_sum=stats.c.price_sum + price_sum,
+        price_count=stats.c.price_count + price_count,
+    )).rowcount
+    if not counted:
+        return
+    for source, (count, price_sum, price_count) in sorted(totals.items()):
+        stmt = insert(stats).values(source=source, total_snapshots=count, price_sum=price_sum,
+                                    price_count=price_count, total_vehicles=0, unique_brands=0)
+        db.execute(stmt.on_conflict_do_update(index_elements=[stats.c.source], set_={
+            "total_snapshots": stats.c.total_snapshots + stmt.excluded.total_snapshots,
+            "price_sum": stats.c.price_sum + stmt.excluded.price_sum,
+            "price_count": stats.c.price_count + stmt.excluded.price_count,
+        }))
+
+
+def save_offers(db: Session, marketplace: str, offers: list[tuple[str, dict]],
+                run_id: int | None = None) -> dict[str, str]:
+    """
+    Zapisuje paczkę sparsowanych ofert (url, dane): upsert pojazdów i nowe snapshoty;
+    pojazdy dostają `last_seen_run_id` przebiegu `run_id`.
+    Gdy zapis paczki się nie powiedzie, oferty są zapisywane pojedynczo, żeby jedna
+    błędna oferta nie blokowała reszty. Zwraca błędy zapisu jako url -> komunikat.
+    """
+    if not offers:
+        return {}
+    try:
+        _upsert_offers(db, marketplace, offers, run_id)
+        logger.info(f"Zapisano {len(offers)} ofert ({marketplace})")
+        return {}
+    except Exception as e:
+        db.rollback()
+        if len(offers) == 1:
+            logger.error(f"Error saving {offers[0][0]}: {e}")
+            return {offers[0][0]: str(e)}
+        logger.error(f"Błąd zapisu paczki {len(offers)} ofert ({marketplace}): {e} - zapis pojedynczo")
+
+    errors = {}
+    for offer in offers:
+        errors.update(save_offers(db, marketplace, [offer], run_id))
+    return errors
+
+
+class OfferWriter:
+    """
+    Bufor zapisu przebiegu w procesie API: sparsowane oferty, heartbeaty 304 i statusy
+    URL-i w scrape_queue trafiają do bazy paczkami po `batch_size` (jedna transakcja na paczkę).
+
+    Każda paczka jest zapisywana w osobnej, krótkiej sesji w wątku (asyncio.to_thread) -
+    zapis nie wstrzymuje pętli zdarzeń, a obiekty z zapisu nie zostają w identity map
+    sesji przebiegu, więc pamięć nie rośnie z liczbą ofert.
+    """
+
+    def __init__(self, marketplace: str, log_id: int, batch_size: int = INGEST_BATCH_SIZE,
+                 session_factory=database.SessionLocal):
+        self.marketplace = marketplace
+        self.log_id = log_id
+        self.batch_size = max(1, batch_size)
+        self.session_factory = session_factory
+        self.offers: list[tuple[str, dict]] = []
+        self.unchanged: list[str] = []
+        self.failed: dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self.offers) + len(self.unchanged) + len(self.failed)
+
+    async def add(self, url: str, data: dict):
+        self.offers.append((url, data))
+        await self._maybe_flush()
+
+    async def add_unchanged(self, url: str):
+        self.unchanged.append(url)
+        await self._maybe_flush()
+
+    async def add_failed(self, url: str, error: str):
+        self.failed[url] = error
+        await self._maybe_flush()
+
+    async def _maybe_flush(self):
+        if len(self) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self):
+        # Bufor jest przejmowany w pętli zdarzeń, zapis paczki idzie w wątku
+        offers, unchanged, failed = self.offers, self.unchanged, self.failed
+        self.offers, self.unchanged, self.failed = [], [], {}
+        if offers or unchanged or failed:
+            await asyncio.to_thread(self._write, offers, unchanged, failed)
+
+    def _write(self, offers: list[tuple[str, dict]], unchanged: list[str], failed: dict[str, str]):
+        with self.session_factory() as db:
+            failed.update(save_offers(db, self.marketplace, offers, self.log_id))
+            done = [url for url, _ in offers if url not in failed] + unchanged
+            touch_vehicles(db, unchanged, self.log_id, commit=False)
+            mark_queue_items(db, self.log_id, done, "done", commit=False)
+            for url, error in failed.items():
+                mark_queue_items(db, self.log_id, [url], "failed", error, commit=False)
+            db.commit()
+
+
+def load_validators(db: Session, urls: list[str]) -> dict[str, dict]:
+    """Walidatory HTTP (ETag / Last-Modified) zapisanych pojazdów: url -> słownik."""
+    if not urls:
+        return {}
+    rows = db.query(models.Vehicle.url, models.Vehicle.http_etag, models.Vehicle.http_last_modified).filter(
+        models.Vehicle.url.in_(urls),
+        or_(models.Vehicle.http_etag.isnot(None), models.Vehicle.http_last_modified.isnot(None))
+    ).all()
+    return {url: {"http_etag": etag, "http_last_modified": modified} for url, etag, modified in rows}
+
+
+def _log_changes(db: Session, change_type: str, fields: list[str] | None, run_id: int | None, *criteria):
+    """Wpisy do dziennika zmian dla pojazdów spełniających `criteria` (jeden INSERT ... SELECT)."""
+    changes = models.VehicleChange.__table__
+    db.execute(sa_insert(changes).from_select(
+        ["vehicle_id", "change_type", "changed_fields", "source", "log_id", "changed_at"],
+        select(
+            models.Vehicle.id, literal(change_type), literal(fields, JSON) if fields else null(), models.Vehicle.source,
+            literal(run_id, changes.c.log_id.type), literal(datetime.now()),
+        ).where(*criteria)
+    ))
+
+
+def touch_vehicles(db: Session, urls: list[str], run_id: int | None = None, commit: bool = True):
+    """Heartbeat niezmienionych ofert (304): potwierdza, że są aktywne, bez nowego snapshotu."""
+    if not urls:
+        return
+    # Zarchiwizowana oferta wróciła bez zmian treści - w dzienniku jako zmiana statusu
+    _log_changes(db, "updated", ["status"], run_id, models.Vehicle.url.in_(urls), models.Vehicle.status == "archiwum")
+    values = {"last_seen_at": datetime.now(), "status": "active"}
+    if run_id is not None:
+        values["last_seen_run_id"] = run_id
+    db.query(models.Vehicle).filter(models.Vehicle.url.in_(urls)).update(values, synchronize_session=False)
+    if commit:
+        db.commit()
+    logger.info(f"Bez zmian (304): {len(urls)} ofert")
+
+
+def archive_missing(db: Session, marketplace: str, run_id: int) -> int:
+    """
+    Oznacza jako 'archiwum' aktywne pojazdy marketplace, których przebieg `run_id`
+    nie znalazł na liście ofert (jeden UPDATE po `last_seen_run_id`) i zapisuje je
+    w dzienniku zmian.
+    Wywoływane tylko po pełnym przebiegu (bez limitu).
+    """
+    missing = (
+        models.Vehicle.source == source_domain(marketplace),
+        or_(models.Vehicle.status == 'active', models.Vehicle.status.is_(None)),
+        or_(models.Vehicle.last_seen_run_id.is_(None), models.Vehicle.last_seen_run_id != run_id),
+    )
+    _log_changes(db, "archived", None, run_id, *missing)
+    archived_count = db.query(models.Vehicle).filter(*missing).update({"status": "archiwum"}, synchronize_session=False)
+    db.commit()
+
+    if archived_count > 0:
+        logger.info(f"Oznaczono {archived_count} pojazdów jako 'archiwum' dla {marketplace}")
+    return archived_count
+
+
+def enqueue_urls(db: Session, log_id: int, marketplace: str, urls: list[str], url_to_group: dict | None = None):
+    """
+    Dodaje URL-e przebiegu do kolejki scrape_queue (status 'pending') jednym INSERT
+    i oznacza znane już pojazdy jako widziane w tym przebiegu (`last_seen_run_id`) -
+    oferta obecna na liście nie zostanie zarchiwizowana, nawet jeśli jej parsowanie się nie uda.
+    """
+    if not urls:
+        return
+    url_to_group = url_to_group or {}
+    now = datetime.utcnow()
+    db.execute(models.ScrapeQueueItem.__table__.insert(), [
+        {
+            "log_id": log_id,
+            "marketplace": marketplace,
+            "url": url,
+            "dealer_group": url_to_group.get(url),
+            "status": "pending",
+            "attempts": 0,
+            "updated_at": now,
+        }
+        for url in urls
+    ])
+    db.query(models.Vehicle).filter(models.Vehicle.url.in_(urls)).update(
+        {"last_seen_run_id": log_id}, synchronize_session=False
+    )
+    db.commit()
+
+
+def enqueue_batch(log_id: int, marketplace: str, urls: list[str], url_to_group: dict | None = None,
+                  with_validators: bool = False, session_factory=database.SessionLocal) -> dict[str, dict]:
+    """
+    enqueue_urls we własnej, krótkiej sesji (do wywołania przez asyncio.to_thread);
+    z `with_validators` zwraca też walidatory HTTP paczki (load_validators) z tej samej sesji.
+    """
+    with session_factory() as db:
+        enqueue_urls(db, log_id, marketplace, urls, url_to_group)
+        return load_validators(db, urls) if with_validators else {}
+
+
+def fetch_validators(urls: list[str], session_factory=database.SessionLocal) -> dict[str, dict]:
+    """load_validators we własnej sesji (do wywołania przez asyncio.to_thread)."""
+    with session_factory() as db:
+        return load_validators(db, urls)
+
+
+async def iter_frontier(log_id: int, marketplace: str, urls: AsyncIterator[str],
+                        url_to_group: dict | None = None, limit: int | None = None,
+                        flush_size: int = 50, validators: dict[str, dict] | None = None,
+                        session_factory=database.SessionLocal) -> AsyncIterator[str]:
+    """
+    Zapisuje odkrywane URL-e do kolejki przebiegu i przekazuje je dalej dopiero po zapisie,
+    więc po restarcie przebieg można wznowić bez ponownego zbierania. Zapytania idą
+    w wątku z własną sesją - pętla zdarzeń (pobieranie, parsowanie) nie jest wstrzymywana.
+
+    URL-e, które przebieg ma już w kolejce (wznawiane zbieranie), oraz duplikaty są pomijane;
+    `limit` dotyczy łącznej liczby URL-i przebiegu. Podany słownik `validators` jest
+    uzupełniany walidatorami HTTP każdej paczki (jedno zapytanie na paczkę, przed jej oddaniem).
+    """
+    def load_seen() -> list[str]:
+        with session_factory() as db:
+            return frontier_urls(db, log_id)
+
+    seen = set(await asyncio.to_thread(load_seen))
+    buffer: list[str] = []
+
+    async def flush(batch: list[str]):
+        loaded = await asyncio.to_thread(enqueue_batch, log_id, marketplace, batch, url_to_group,
+                                         validators is not None, session_factory)
+        if validators is not None:
+            validators.update(loaded)
+
+    async with aclosing(urls):
+        if limit and len(seen) >= limit:
+            return
+        async for url in urls:
+            if url in seen:
+                continue
+            seen.add(url)
+            buffer.append(url)
+            limit_reached = bool(limit and len(seen) >= limit)
+            if len(buffer) >= flush_size or limit_reached:
+                await flush(buffer)
+                for queued in buffer:
+                    yield queued
+                buffer = []
+            if limit_reached:
+                break
+    if buffer:
+        await flush(buffer)
+        for queued in buffer:
+            yield queued
+
+
+def frontier_urls(db: Session, log_id: int) -> list[str]:
+    """Wszystkie URL-e przebiegu zapisane w kolejce."""
+    return [url for (url,) in db.query(models.ScrapeQueueItem.url).filter(models.ScrapeQueueItem.log_id == log_id)]
+
+
+def unfinished_frontier(db: Session, log_id: int) -> list[tuple[str, str | None]]:
+    """URL-e przebiegu, które nie zostały jeszcze zapisane (do wznowienia), jako (url, dealer_group)."""
+    return db.query(models.ScrapeQueueItem.url, models.ScrapeQueueItem.dealer_group).filter(
+        models.ScrapeQueueItem.log_id == log_id,
+        models.ScrapeQueueItem.status != "done"
+    ).order_by(models.ScrapeQueueItem.id).all()
+
+
+def requeue_unfinished(db: Session, log_id: int) -> int:
+    """Przywraca status 'pending' URL-om przebiegu, które nie zostały zapisane (wznowienie)."""
+    count = db.query(models.ScrapeQueueItem).filter(
+        models.ScrapeQueueItem.log_id == log_id,
+        models.ScrapeQueueItem.status != "done"
+    ).update({"status": "pending", "attempts": 0, "claimed_by": None, "claimed_at": None}, synchronize_session=False)
+    db.commit()
+    return count
+
+
+def mark_queue_items(db: Session, log_id: int, urls: list[str], status: str, error: str | None = None,
+                     commit: bool = True):
+    """Zapisuje wynik przetwarzania URL-i przebiegu ('done' / 'failed') jednym UPDATE."""
+    if not urls:
+        return
+    db.query(models.ScrapeQueueItem).filter(
+        models.ScrapeQueueItem.log_id == log_id,
+        models.ScrapeQueueItem.url.in_(urls)
+    ).update({"status": status, "error_message": error, "updated_at": datetime.utcnow()}, synchronize_session=False)
+    if commit:
+        db.commit()
+
+
+def queue_counts(db: Session, log_id: int) -> dict[str, int]:
+    """Liczba URL-i przebiegu w kolejce wg statusu (pending/claimed/done/failed)."""
+    rows = db.query(models.ScrapeQueueItem.status, func.count(models.ScrapeQueueItem.id)).filter(
+        models.ScrapeQueueItem.log_id == log_id
+    ).group_by(models.ScrapeQueueItem.status).all()
+    return {status: count for status, count in rows}
@@ -1,18 +1,18 @@
 #!/usr/bin/env python3
 """
-Main scraper script - orchestrates URL collection and offer parsing
+Main scraper script - orchestrates URL collection and offer parsing (pipelined)
 """
 import asyncio
 import argparse
 import logging
 import sys
-import time
-import random
 from pathlib import Path
 import pandas as pd
 from tqdm import tqdm
 
 from scraper import get_scraper
+from scraper.pipeline import run_pipeline
+from scraper.rate_limiter import configure_rate_limits
 
 
 def setup_logging(verbose: bool = False):
@@ -68,14 +68,18 @@ async def main():
     parser.add_argument(
         '--min-delay',
         type=float,
-        default=0.8,
-        help='Minimalne opóźnienie między requestami w sekundach (default: 0.8)'
+        help='Najkrótszy odstęp między requestami do jednego hosta w sekundach (domyślnie: limiter adaptacyjny)'
     )
     parser.add_argument(
         '--max-delay',
         type=float,
-        default=1.8,
-        help='Maksymalne opóźnienie między requestami w sekundach (default: 1.8)'
+        help='Najdłuższy odstęp między requestami przy wycofaniu w sekundach (domyślnie: limiter adaptacyjny)'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=4,
+        help='Liczba równolegle parsowanych ofert (default: 4)'
     )
     parser.add_argument(
         '--limit',
@@ -106,6 +110,9 @@ async def main():
     
     logger = logging.getLogger(__name__)
     
+    # Tempo requestów reguluje współdzielony limiter per host; CLI ustawia tylko jego granice
+    configure_rate_limits(min_interval=args.min_delay, max_interval=args.max_delay)
+    
     # Wybór scrapera
     from scraper import get_scraper
     try:
@@ -116,84 +123,87 @@ async def main():
 
     output_filename = args.output or f"{args.marketplace}_vehicles.csv"
 
-    # === FAZA 1: Zbieranie URL-i ===
+    # === FAZA 1+2: Zbieranie URL-i i parsowanie ofert (potokowo) ===
     logger.info("=" * 60)
-    logger.info(f"FAZA 1: Zbieranie URL-i ofert ({args.marketplace})")
+    logger.info(f"FAZA 1+2: Zbieranie URL-i i parsowanie ofert ({args.marketplace})")
     logger.info("=" * 60)
     
-    try:
-        if args.marketplace == "autopunkt":
-            offer_urls = await scraper.collect_urls(
-                limit=args.limit,
-                max_scroll_rounds=args.max_scrolls,
-                scroll_pause=args.scroll_pause,
-                headless=args.headless
-            )
-        elif args.marketplace == "findcar":
-            # Calculate max_pages based on limit if it's the default value
-            max_pages = args.max_pages
-            if args.limit and args.max_pages == 10:
-                max_pages = (args.limit // 50) + 1
-            elif not args.limit and args.max_pages == 10:
-                max_pages = 1000
+    if args.marketplace == "autopunkt":
+        url_source = scraper.iter_urls(
+            limit=args.limit,
+            max_scroll_rounds=args.max_scrolls,
+            scroll_pause=args.scroll_pause,
+            headless=args.headless
+        )
+    elif args.marketplace == "findcar":
+        # Calculate max_pages based on limit if it's the default value
+        max_pages = args.max_pages
+        if args.limit and args.max_pages == 10:
+            max_pages = (args.limit // 50) + 1
+        elif not args.limit and args.max_pages == 10:
+            max_pages = 1000
 
-            offer_urls = await scraper.collect_urls(
-                max_pages=max_pages,
-                page_size=50,
-                start_page=0,
-                scroll_pause=args.scroll_pause
-            )
-        elif args.marketplace in ["fiat_pgd", "pgd", "fiat"]:
-            max_pages = args.max_pages if args.max_pages != 10 else 100
-            offer_urls = await scraper.collect_urls(
-                limit=args.limit,
-                base_url=args.url,
-                max_pages=max_pages
-            )
-        else:  # vehis
-            max_pages = args.max_pages
-            if args.limit and args.max_pages == 10:
-                max_pages = (args.limit // 50) + 1
-            offer_urls = await scraper.collect_urls(
-                max_pages=max_pages,
-                page_size=50,
-                start_offset=0
-            )
-    except Exception as e:
-        logger.error(f"Błąd podczas zbierania URL-i: {e}")
-        sys.exit(1)
-    
-    if not offer_urls:
-        logger.warning("Nie znaleziono żadnych URL-i ofert!")
-        sys.exit(1)
-    
-    logger.info(f"Zebrano {len(offer_urls)} URL-i")
-    
-    # Opcjonalny limit
-    if args.limit and args.limit < len(offer_urls):
-        logger.info(f"Ograniczam do {args.limit} ofert")
-        offer_urls = offer_urls[:args.limit]
-    
-    # === FAZA 2: Parsowanie ofert ===
-    logger.info("=" * 60)
-    logger.info(f"FAZA 2: Parsowanie ofert ({args.marketplace})")
-    logger.info("=" * 60)
+        url_source = scraper.iter_urls(
+            max_pages=max_pages,
+            page_size=50,
+            start_page=0,
+            scroll_pause=args.scroll_pause
+        )
+    elif args.marketplace in ["fiat_pgd", "pgd", "fiat"]:
+        max_pages = args.max_pages if args.max_pages != 10 else 100
+        url_source = scraper.iter_urls(
+            limit=args.limit,
+            base_url=args.url,
+            max_pages=max_pages
+        )
+    else:  # vehis
+        max_pages = args.max_pages
+        if args.limit and args.max_pages == 10:
+            max_pages = (args.limit // 50) + 1
+        url_source = scraper.iter_urls(
+            max_pages=max_pages,
+            page_size=50,
+            start_offset=0
+        )
     
     rows = []
     errors = []
+    progress = tqdm(desc="Parsowanie ofert", total=0)
     
-    for url in tqdm(offer_urls, desc="Parsowanie ofert"):
+    async def handle(url: str):
         try:
-            offer_data = scraper.parse_offer(url)
+            offer_data = await asyncio.to_thread(scraper.parse_offer, url)
             rows.append(offer_data)
             
-            # Rate limiting
-            delay = random.uniform(args.min_delay, args.max_delay)
-            time.sleep(delay)
-            
         except Exception as e:
             logger.error(f"Błąd parsowania {url}: {e}")
             errors.append({"url": url, "error": str(e)})
+        finally:
+            progress.update(1)
+    
+    def on_discovered(count: int):
+        progress.total = count
+        progress.refresh()
+    
+    try:
+        offer_urls = await run_pipeline(
+            url_source,
+            handle,
+            workers=args.workers,
+            limit=args.limit,
+            on_discovered=on_discovered
+        )
+    except Exception as e:
+        logger.error(f"Błąd podczas zbierania URL-i: {e}")
+        sys.exit(1)
+    finally:
+        progress.close()
+    
+    if not offer_urls:
+        logger.warning("Nie znaleziono żadnych URL-i ofert!")
+        sys.exit(1)
+    
+    logger.info(f"Zebrano {len(offer_urls)} URL-i")
     
     # === FAZA 3: Zapis do CSV ===
     logger.info("=" * 60)
@@ -0,0 +1,115 @@
+"""
+Migrations - tworzenie tabel i prosta migracja brakujących kolumn
+
+Wywoływane przy starcie API oraz workera (python -m scraper.worker).
+"""
+import logging
+from sqlalchemy import inspect, text
+import database
+from search import TEXT_MATCH_COLUMNS, ensure_search_index, ensure_text_match_indexes
+
+logger = logging.getLogger(__name__)
+
+def apply_migrations():
+    """Prosta migracja dodająca brakujące kolumny."""
+    try:
+        inspector = inspect(database.engine)
+        tables = inspector.get_table_names()
+        if 'vehicle_snapshots' in tables:
+            columns = [c['name'] for c in inspector.get_columns('vehicle_snapshots')]
+            with database.engine.connect() as conn:
+                if 'equipment' not in columns:
+                    logger.info("Dodawanie kolumny 'equipment' do vehicle_snapshots")
+                    conn.execute(text("ALTER TABLE vehicle_snapshots ADD COLUMN equipment TEXT"))
+                if 'additional_equipment' not in columns:
+                    logger.info("Dodawanie kolumny 'additional_equipment' do vehicle_snapshots")
+                    conn.execute(text("ALTER TABLE vehicle_snapshots ADD COLUMN additional_equipment TEXT"))
+                conn.execute(text("CREATE INDEX IF NOT EXISTS ix_vehicle_snapshots_source_id ON vehicle_snapshots (source, id)"))
+                conn.commit()
+
+        if 'vehicles' in tables:
+            columns = [c['name'] for c in inspector.get_columns('vehicles')]
+            with database.engine.connect() as conn:
+                if 'status' not in columns:
+                    logger.info("Dodawanie kolumny 'status' do vehicles")
+                    conn.execute(text("ALTER TABLE vehicles ADD COLUMN status VARCHAR DEFAULT 'active'"))
+                if 'dealer_street' not in columns:
+                    logger.info("Dodawanie kolumny 'dealer_street' do vehicles")
+                    conn.execute(text("ALTER TABLE vehicles ADD COLUMN dealer_street VARCHAR"))
+                if 'dealer_postcode' not in columns:
+                    logger.info("Dodawanie kolumny 'dealer_postcode' do vehicles")
+                    conn.execute(text("ALTER TABLE vehicles ADD COLUMN dealer_postcode VARCHAR"))
+                if 'dealer_city' not in columns:
+                    logger.info("Dodawanie kolumny 'dealer_city' do vehicles")
+                    conn.execute(text("ALTER TABLE vehicles ADD COLUMN dealer_city VARCHAR"))
+                if 'dealer_map_link' not in columns:
+                    logger.info("Dodawanie kolumny 'dealer_map_link' do vehicles")
+                    conn.execute(text("ALTER TABLE vehicles ADD COLUMN dealer_map_link VARCHAR"))
+                if 'dealer_id' not in columns:
+                    logger.info("Dodawanie kolumny 'dealer_id' do vehicles")
+                    conn.execute(text("ALTER TABLE vehicles ADD COLUMN dealer_id VARCHAR"))
+                if 'rodzaj_sprzedazy' not in columns:
+                    logger.info("Dodawanie kolumny 'rodzaj_sprzedazy' do vehicles")
+                    conn.execute(text("ALTER TABLE vehicles ADD COLUMN rodzaj_sprzedazy VARCHAR"))
+                if 'dealer_group' not in columns:
+                    logger.info("Dodawanie kolumny 'dealer_group' do vehicles")
+                    conn.execute(text("ALTER TABLE vehicles ADD COLUMN dealer_group VARCHAR"))
+                if 'last_seen_at' not in columns:
+                    logger.info("Dodawanie kolumny 'last_seen_at' do vehicles")
+                    conn.execute(text("ALTER TABLE vehicles ADD COLUMN last_seen_at TIMESTAMP"))
+                    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_vehicles_last_seen_at ON vehicles (last_seen_at)"))
+                if 'next_refresh_at' not in columns:
+                    logger.info("Dodawanie kolumny 'next_refresh_at' do vehicles")
+                    conn.execute(text("ALTER TABLE vehicles ADD COLUMN next_refresh_at TIMESTAMP"))
+                    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_vehicles_next_refresh_at ON vehicles (next_refresh_at)"))
+                if 'http_etag' not in columns:
+                    logger.info("Dodawanie kolumny 'http_etag' do vehicles")
+                    conn.execute(text("ALTER TABLE vehicles ADD COLUMN http_etag VARCHAR"))
+                if 'http_last_modified' not in columns:
+                    logger.info("Dodawanie kolumny 'http_last_modified' do vehicles")
+                    conn.execute(text("ALTER TABLE vehicles ADD COLUMN http_last_modified VARCHAR"))
+                if 'last_seen_run_id' not in columns:
+                    logger.info("Dodawanie kolumny 'last_seen_run_id' do vehicles")
+                    conn.execute(text("ALTER TABLE vehicles ADD COLUMN last_seen_run_id INTEGER"))
+                    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_vehicles_last_seen_run_id ON vehicles (last_seen_run_id)"))
+                if 'latest_snapshot_id' not in columns:
+                    logger.info("Dodawanie kolumny 'latest_snapshot_id' do vehicles (z uzupełnieniem istniejących pojazdów)")
+                    conn.execute(text("ALTER TABLE vehicles ADD COLUMN latest_snapshot_id INTEGER"))
+                    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_vehicles_latest_snapshot_id ON vehicles (latest_snapshot_id)"))
+                    conn.execute(text(
+                        "UPDATE vehicles SET latest_snapshot_id = ("
+                        "SELECT s.id FROM vehicle_snapshots s WHERE s.vehicle_id = vehicles.id "
+                        "ORDER BY s.scraped_at DESC, s.id DESC LIMIT 1)"
+                    ))
+                for name in TEXT_MATCH_COLUMNS:
+                    if f'{name}_norm' not in columns:
+                        logger.info(f"Dodawanie kolumny '{name}_norm' do vehicles")
+                        conn.execute(text(f"ALTER TABLE vehicles ADD COLUMN {name}_norm VARCHAR"))
+                conn.commit()
+
+        if 'scrape_logs' in tables:
+            columns = [c['name'] for c in inspector.get_columns('scrape_logs')]
+            with database.engine.connect() as conn:
+                if 'mode' not in columns:
+                    logger.info("Dodawanie kolumny 'mode' do scrape_logs")
+                    conn.execute(text("ALTER TABLE scrape_logs ADD COLUMN mode VARCHAR DEFAULT 'full'"))
+                if 'time_budget' not in columns:
+                    logger.info("Dodawanie kolumny 'time_budget' do scrape_logs")
+                    conn.execute(text("ALTER TABLE scrape_logs ADD COLUMN time_budget INTEGER"))
+                if 'scrape_limit' not in columns:
+                    logger.info("Dodawanie kolumny 'scrape_limit' do scrape_logs")
+                    conn.execute(text("ALTER TABLE scrape_logs ADD COLUMN scrape_limit INTEGER"))
+                if 'worker_id' not in columns:
+                    logger.info("Dodawanie kolumny 'worker_id' do scrape_logs")
+                    conn.execute(text("ALTER TABLE scrape_logs ADD COLUMN worker_id VARCHAR"))
+                if 'discovery_done' not in columns:
+                    logger.info("Dodawanie kolumny 'discovery_done' do scrape_logs")
+                    conn.execute(text("ALTER TABLE scrape_logs ADD COLUMN discovery_done INTEGER DEFAULT 0"))
+                conn.commit()
+
+        with database.engine.connect() as conn:
+            ensure_search_index(conn)
+            ensure_text_match_indexes(conn)
+            conn.commit()
+    except Exception as e:
+        logger.error(f"Błąd podczas migracji: {e}")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Float, JSON, DateTime, ForeignKey
+from sqlalchemy import BigInteger, Column, Integer, String, Text, Float, JSON, DateTime, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database import Base
@@ -44,6 +44,19 @@ class Vehicle(Base):
     status = Column(String, default="active", index=True)
     
     created_at = Column(DateTime, default=datetime.utcnow)
+    last_seen_at = Column(DateTime, nullable=True, index=True)  # ostatnie potwierdzenie oferty (także 304)
+    next_refresh_at = Column(DateTime, nullable=True, index=True)  # harmonogram odświeżania (refresh.py)
+    last_seen_run_id = Column(Integer, nullable=True, index=True)  # ostatni przebieg (scrape_logs.id), w którym oferta była na liście
+    latest_snapshot_id = Column(Integer, nullable=True, index=True)  # najnowszy snapshot (utrzymywany przy zapisie w ingest.py)
+
+    # Znormalizowane marka / model / miasto (search.normalize_text) dla filtrów tekstowych (search.text_match)
+    marka_norm = Column(String, nullable=True)
+    model_norm = Column(String, nullable=True)
+    dealer_city_norm = Column(String, nullable=True)
+
+    # Walidatory HTTP ostatniego pobrania (warunkowy GET przy kolejnym przebiegu)
+    http_etag = Column(String, nullable=True)
+    http_last_modified = Column(String, nullable=True)
     
     # Relacja do historii
     snapshots = relationship("VehicleSnapshot", back_populates="vehicle", cascade="all, delete-orphan")
@@ -51,6 +64,8 @@ class Vehicle(Base):
 class VehicleSnapshot(Base):
     """Dziennik poszczególnych pobrań danych (dane zmienne)."""
     __tablename__ = "vehicle_snapshots"
+    # Wersja danych źródła dla eksportów (artifacts.data_version): max(id) per source
+    __table_args__ = (Index("ix_vehicle_snapshots_source_id", "source", "id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     vehicle_id = Column(Integer, ForeignKey("vehicles.id"), index=True)
@@ -74,6 +89,41 @@ class VehicleSnapshot(Base):
     
     vehicle = relationship("Vehicle", back_populates="snapshots")
 
+class VehicleSearch(Base):
+    """Dokument wyszukiwania pełnotekstowego pojazdu (z najnowszego snapshotu, search.py)."""
+    __tablename__ = "vehicle_search"
+
+    vehicle_id = Column(Integer, ForeignKey("vehicles.id"), primary_key=True)
+    document = Column(Text)
+
+class VehicleChange(Base):
+    """Dziennik zmian pojazdów (feed synchronizacji przyrostowej) - id jest kursorem."""
+    __tablename__ = "vehicle_changes"
+    __table_args__ = (
+        Index("ix_vehicle_changes_source_id", "source", "id"),
+        {"sqlite_autoincrement": True},  # id nie jest używane ponownie po usunięciu wpisów (kursor)
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    vehicle_id = Column(Integer, index=True)
+    change_type = Column(String)   # 'new', 'updated', 'archived'
+    changed_fields = Column(JSON, nullable=True)  # np. ["price", "mileage"] dla 'updated'
+    source = Column(String)
+    log_id = Column(Integer, nullable=True)  # przebieg (scrape_logs.id), który zapisał zmianę
+    changed_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+class SourceStats(Base):
+    """Agregaty dla /stats per źródło i łącznie (source='*'): snapshoty przy zapisie, pojazdy po przebiegu (stats.py)."""
+    __tablename__ = "source_stats"
+
+    source = Column(String, primary_key=True)
+    total_vehicles = Column(Integer, default=0)
+    unique_brands = Column(Integer, default=0)
+    total_snapshots = Column(BigInteger, default=0)
+    price_sum = Column(BigInteger, default=0)     # suma cen snapshotów (średnia = price_sum / price_count)
+    price_count = Column(BigInteger, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
 class ScrapeLog(Base):
     """Historia poszczególnych procesów scrapowania."""
     __tablename__ = "scrape_logs"
@@ -82,11 +132,40 @@ class ScrapeLog(Base):
     marketplace = Column(String, index=True)
     start_time = Column(DateTime, default=datetime.utcnow, index=True)
     end_time = Column(DateTime, nullable=True)
-    status = Column(String) # 'running', 'completed', 'error'
+    status = Column(String) # 'queued', 'running', 'completed', 'error'
     vehicles_scraped = Column(Integer, default=0)
     total_vehicles_in_db = Column(Integer, default=0)
     error_message = Column(Text, nullable=True)
 
+    mode = Column(String, default="full")            # 'full' (zbieranie URL-i) lub 'refresh' (harmonogram)
+    time_budget = Column(Integer, nullable=True)     # budżet czasu przebiegu w sekundach
+
+    # Przebiegi wykonywane przez workery (SCRAPE_MODE=worker)
+    scrape_limit = Column(Integer, nullable=True)
+    worker_id = Column(String, nullable=True)     # worker, który zbiera URL-e
+    discovery_done = Column(Integer, default=0)   # 1 = wszystkie URL-e są już w scrape_queue
+
+class ScrapeQueueItem(Base):
+    """Kolejka URL-i do sparsowania w ramach przebiegu - workery pobierają je paczkami."""
+    __tablename__ = "scrape_queue"
+    __table_args__ = (
+        UniqueConstraint("log_id", "url", name="uq_scrape_queue_log_url"),
+        Index("ix_scrape_queue_status_id", "status", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    log_id = Column(Integer, ForeignKey("scrape_logs.id"), index=True)
+    marketplace = Column(String, index=True)
+    url = Column(String)
+    dealer_group = Column(String, nullable=True)
+
+    status = Column(String, default="pending") # 'pending', 'claimed', 'done', 'failed'
+    claimed_by = Column(String, nullable=True)
+    claimed_at = Column(DateTime, nullable=True)
+    attempts = Column(Integer, default=0)
+    error_message = Column(Text, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 class ScraperConfig(Base):
     """Konfiguracje dealerów do automatycznego scrapowania."""
     __tablename__ = "scraper_configs"
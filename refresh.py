@@ -0,0 +1,110 @@
+"""
+Refresh - harmonogram odświeżania znanych ofert wg zmienności
+
+Każdy pojazd dostaje `next_refresh_at` wyliczane z historii snapshotów:
+- zmienność ceny (jak często kolejne pobrania miały inną cenę),
+- wiek ogłoszenia (nowe ogłoszenia zmieniają się częściej),
+- czas od ostatniego potwierdzenia oferty (last_seen_at / ostatni snapshot).
+
+Przebieg w trybie "refresh" pomija zbieranie URL-i i bierze zaległe oferty
+w kolejności `next_refresh_at` (najbardziej zaległe i najbardziej zmienne najpierw),
+w ramach budżetu requestów (limit) i/lub czasu (time_budget).
+"""
+import os
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+import models
+from ingest import source_domain
+
+logger = logging.getLogger(__name__)
+
+# Bazowy odstęp odświeżania oferty o stabilnej cenie i typowym wieku
+REFRESH_BASE_HOURS = float(os.getenv("REFRESH_BASE_HOURS", "24"))
+REFRESH_MIN_HOURS = float(os.getenv("REFRESH_MIN_HOURS", "3"))
+REFRESH_MAX_HOURS = float(os.getenv("REFRESH_MAX_HOURS", "72"))
+# Okno historii snapshotów branej pod uwagę przy liczeniu zmienności
+VOLATILITY_WINDOW_DAYS = 30
+# Waga zmienności ceny: oferta zmieniająca cenę przy każdym pobraniu jest odświeżana 5x częściej
+VOLATILITY_WEIGHT = 4.0
+
+
+def refresh_interval(volatility: float, created_at: datetime | None, now: datetime) -> timedelta:
+    """
+    Odstęp do kolejnego odświeżenia oferty.
+
+    Args:
+        volatility: Udział pobrań ze zmianą ceny (0..1)
+        created_at: Data pierwszego zapisania oferty
+        now: Bieżący czas
+    """
+    age_days = (now - created_at).days if created_at else None
+    if age_days is not None and age_days < 7:
+        age_factor = 2.0
+    elif age_days is not None and age_days < 30:
+        age_factor = 1.3
+    else:
+        age_factor = 1.0
+    hours = REFRESH_BASE_HOURS / ((1 + VOLATILITY_WEIGHT * volatility) * age_factor)
+    return timedelta(hours=min(max(hours, REFRESH_MIN_HOURS), REFRESH_MAX_HOURS))
+
+
+def schedule_refreshes(db: Session, marketplace: str | None = None) -> int:
+    """
+    Przelicza `next_refresh_at` aktywnych pojazdów (opcjonalnie jednego marketplace).
+    Wywoływane po zakończeniu przebiegu; zwraca liczbę przeliczonych pojazdów.
+    """
+    now = datetime.now()
+    window_start = now - timedelta(days=VOLATILITY_WINDOW_DAYS)
+
+    stats = db.query(
+        models.VehicleSnapshot.vehicle_id,
+        func.count(models.VehicleSnapshot.id).label("snapshots"),
+        func.count(func.distinct(models.VehicleSnapshot.price)).label("prices"),
+        func.max(models.VehicleSnapshot.scraped_at).label("last_scraped"),
+    ).filter(
+        models.VehicleSnapshot.scraped_at >= window_start
+    ).group_by(models.VehicleSnapshot.vehicle_id).subquery()
+
+    query = db.query(
+        models.Vehicle.id, models.Vehicle.created_at, models.Vehicle.last_seen_at,
+        stats.c.snapshots, stats.c.prices, stats.c.last_scraped,
+    ).outerjoin(stats, stats.c.vehicle_id == models.Vehicle.id).filter(
+        or_(models.Vehicle.status == 'active', models.Vehicle.status.is_(None))
+    )
+    if marketplace:
+        query = query.filter(models.Vehicle.source == source_domain(marketplace))
+
+    updates = []
+    for vehicle_id, created_at, last_seen_at, snapshots, prices, last_scraped in query.all():
+        volatility = (prices - 1) / (snapshots - 1) if snapshots and snapshots > 1 and prices else 0.0
+        seen = [ts for ts in (last_seen_at, last_scraped) if ts]
+        last_seen = max(seen) if seen else (created_at or now)
+        next_refresh = last_seen + refresh_interval(min(volatility, 1.0), created_at, now)
+        updates.append({"id": vehicle_id, "next_refresh_at": next_refresh})
+
+    if updates:
+        db.bulk_update_mappings(models.Vehicle, updates)
+        db.commit()
+    logger.info(f"Przeliczono harmonogram odświeżania dla {len(updates)} pojazdów ({marketplace or 'wszystkie'})")
+    return len(updates)
+
+
+def due_vehicles(db: Session, marketplace: str, limit: int | None = None) -> list[tuple[str, str | None]]:
+    """
+    Oferty do odświeżenia (next_refresh_at w przeszłości lub jeszcze nieprzeliczone),
+    najbardziej zaległe najpierw. Zwraca listę (url, dealer_group).
+    """
+    now = datetime.now()
+    query = db.query(models.Vehicle.url, models.Vehicle.dealer_group).filter(
+        models.Vehicle.source == source_domain(marketplace),
+        or_(models.Vehicle.status == 'active', models.Vehicle.status.is_(None)),
+        or_(models.Vehicle.next_refresh_at.is_(None), models.Vehicle.next_refresh_at <= now)
+    ).order_by(
+        models.Vehicle.next_refresh_at.is_(None).desc(),
+        models.Vehicle.next_refresh_at.asc()
+    )
+    if limit:
+        query = query.limit(limit)
+    return query.all()
@@ -0,0 +1,154 @@
+"""
+Responses - szybka serializacja JSON i kompresja odpowiedzi HTTP
+
+- `FastJSONResponse`: JSON przez orjson dla endpointów zwracających duże listy; endpoint
+  zwraca gotową odpowiedź, więc FastAPI nie waliduje każdego wiersza przez response_model.
+- `CompressionMiddleware`: brotli lub gzip wg nagłówka Accept-Encoding (z wagami q),
+  także dla odpowiedzi strumieniowanych (eksporty CSV). Odpowiedzi już skompresowane
+  (gotowe eksporty .gz), małe, binarne (Parquet / Arrow) i strumień SSE przechodzą bez zmian.
+  Brotli jest opcjonalne - bez pakietu `brotli` negocjowany jest tylko gzip.
+"""
+import os
+import zlib
+import logging
+import orjson
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+
+# Typy treści, które warto kompresować (Parquet / Arrow są już skompresowane wewnętrznie).
+# Lista jawna - text/event-stream (SSE /scrape/progress) musi iść bez kompresji i buforowania.
+COMPRESSIBLE_TYPES = ("application/json", "text/csv", "text/plain", "text/html", "text/css",
+                      "text/javascript", "application/javascript", "application/xml", "text/xml")
+
+try:
+    import brotli
+except ImportError:  # brotli opcjonalne - zostaje gzip
+    brotli = None
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse serializowany przez orjson (datetime jako ISO 8601, jak w Pydantic)."""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+def negotiate_encoding(accept_encoding: str, supported: tuple[str, ...] | None = None) -> str | None:
+    """
+    Najlepsze kodowanie z Accept-Encoding: 'br', 'gzip' lub None (bez kompresji).
+    `supported` zawęża kandydatów (np. ("gzip",) dla gotowych plików .gz).
+    """
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name:
+            weights[name] = q
+    wildcard = weights.get("*", 0.0)
+    if supported is None:
+        supported = (("br",) if brotli is not None else ()) + ("gzip",)
+    # Przy równych wagach pierwszeństwo ma brotli (mniejszy rozmiar przy podobnym koszcie)
+    best = max(supported, key=lambda name: weights.get(name, wildcard))
+    return best if weights.get(best, wildcard) > 0 else None
+
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._zlib = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # 31 = nagłówek gzip
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        if self.encoding == "br":
+            out = self._brotli.process(data)
+            return out + (self._brotli.finish() if final else self._brotli.flush())
+        out = self._zlib.compress(data)
+        return out + self._zlib.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class CompressionMiddleware:
+    """Kompresja odpowiedzi HTTP (brotli / gzip) negocjowana per żądanie."""
+
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Message | None = None
+        compressor: _Compressor | None = None
+        passthrough = False
+
+        async def send_compressed(message: Message):
+            nonlocal start, compressor, passthrough
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "")
+                passthrough = (
+                    "content-encoding" in headers
+                    or message["status"] in (204, 304)
+                    or not content_type.startswith(COMPRESSIBLE_TYPES)
+                )
+                if passthrough:
+                    await send(message)
+                else:
+                    start = message  # wysyłany z pierwszym fragmentem treści
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start is not None:
+                headers = MutableHeaders(raw=start["headers"])
+                if not more_body and len(body) < self.minimum_size:
+                    # Mała odpowiedź w całości - kompresja się nie opłaca
+                    passthrough = True
+                    await send(start)
+                    start = None
+                    await send(message)
+                    return
+                compressor = _Compressor(encoding)
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    headers["ETag"] = f"W/{etag}"  # inna reprezentacja niż nieskompresowana
+                data = compressor.compress(body, final=not more_body)
+                if more_body:
+                    del headers["Content-Length"]
+                else:
+                    headers["Content-Length"] = str(len(data))
+                await send(start)
+                start = None
+                await send({"type": "http.response.body", "body": data, "more_body": more_body})
+                return
+            await send({"type": "http.response.body", "body": compressor.compress(body, final=not more_body),
+                        "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
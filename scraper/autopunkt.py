@@ -3,10 +3,11 @@ import logging
 import asyncio
 import random
 import time
+from typing import AsyncIterator
 from urllib.parse import urljoin
 from playwright.async_api import async_playwright, Page, Browser
 from .base import BaseScraper
-from .offer_parser import parse_offer as legacy_parse_offer
+from .offer_parser import SESSION, parse_offer as legacy_parse_offer, parse_offer_async as legacy_parse_offer_async
 
 logger = logging.getLogger(__name__)
 
@@ -14,9 +15,22 @@ class AutopunktScraper(BaseScraper):
     def __init__(self):
         super().__init__(name="autopunkt", base_url="https://autopunkt.pl")
         self.list_url = "https://autopunkt.pl/znajdz-auto"
+        # Wspólna sesja parsera ofert - jej nagłówki przejmuje też klient async
+        self.session = SESSION
 
     async def collect_urls(self, limit: int | None = None, max_scroll_rounds=60, scroll_pause=1.0, headless=True) -> list[str]:
-        urls = set()
+        urls = {url async for url in self.iter_urls(limit, max_scroll_rounds, scroll_pause, headless)}
+        
+        # If we have a limit, ensure we don't return more than requested
+        final_urls = sorted(list(urls))
+        if limit:
+            final_urls = final_urls[:limit]
+            
+        self.logger.info(f"Zebrano {len(final_urls)} unikalnych URL-i")
+        return final_urls
+
+    async def iter_urls(self, limit: int | None = None, max_scroll_rounds=60, scroll_pause=1.0, headless=True) -> AsyncIterator[str]:
+        """Zwraca nowe URL-e po każdej rundzie scrollowania - parsowanie rusza przed końcem zbierania."""
         self.logger.info(f"Rozpoczynam zbieranie URL-i z: {self.list_url} (limit: {limit})")
         
         async with async_playwright() as p:
@@ -42,21 +56,14 @@ class AutopunktScraper(BaseScraper):
                 await page.goto(self.list_url, wait_until="commit", timeout=60_000)
                 
                 await self._handle_cookie_consent(page)
-                urls = await self._scroll_and_collect(page, max_scroll_rounds, scroll_pause, limit)
+                async for url in self._scroll_and_collect(page, max_scroll_rounds, scroll_pause, limit):
+                    yield url
                 
             except Exception as e:
                 self.logger.error(f"Błąd podczas zbierania URL-i: {e}")
                 raise
             finally:
                 await browser.close()
-        
-        # If we have a limit, ensure we don't return more than requested
-        final_urls = sorted(list(urls))
-        if limit:
-            final_urls = final_urls[:limit]
-            
-        self.logger.info(f"Zebrano {len(final_urls)} unikalnych URL-i")
-        return final_urls
 
     async def _handle_cookie_consent(self, page: Page) -> None:
         consent_texts = ["Akceptuj", "Zgadzam się", "Accept", "OK", "Zgoda"]
@@ -72,7 +79,7 @@ class AutopunktScraper(BaseScraper):
             except Exception:
                 continue
 
-    async def _scroll_and_collect(self, page: Page, max_rounds: int, scroll_pause: float, limit: int | None = None) -> set[str]:
+    async def _scroll_and_collect(self, page: Page, max_rounds: int, scroll_pause: float, limit: int | None = None) -> AsyncIterator[str]:
         urls = set()
         last_count = 0
         no_change_count = 0
@@ -86,7 +93,9 @@ class AutopunktScraper(BaseScraper):
             for h in hrefs:
                 if h and "/samochod/" in h:
                     clean_url = h.split("#", 1)[0].rstrip("/")
-                    urls.add(clean_url)
+                    if clean_url not in urls and not (limit and len(urls) >= limit):
+                        urls.add(clean_url)
+                        yield clean_url
             
             current_count = len(urls)
             self.logger.info(f"Runda {round_num + 1}/{max_rounds}: zebrano {current_count} URL-i")
@@ -109,8 +118,6 @@ class AutopunktScraper(BaseScraper):
                 no_change_count = 0
             
             last_count = current_count
-        
-        return urls
 
     async def _try_load_more_button(self, page: Page, scroll_pause: float) -> bool:
         load_more_patterns = ["Pokaż więcej", "Załaduj więcej", "Wczytaj więcej", "Load more", "Zobacz więcej"]
@@ -129,3 +136,6 @@ class AutopunktScraper(BaseScraper):
     def parse_offer(self, url: str) -> dict:
         # Reuse old offer parser logic for now
         return legacy_parse_offer(url)
+
+    async def parse_offer_async(self, url: str, validators: dict | None = None) -> dict:
+        return await legacy_parse_offer_async(self.get_async_client(), url, validators)
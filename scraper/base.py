@@ -1,17 +1,31 @@
 from abc import ABC, abstractmethod
+import asyncio
 import logging
+from typing import AsyncIterator
+import httpx
+from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception
+from .http_client import make_async_client, conditional_headers, check_not_modified, is_retryable
 
 logger = logging.getLogger(__name__)
 
 class BaseScraper(ABC):
     """
     Abstract base class for all marketplace scrapers.
+
+    URLs can be collected at once (`collect_urls`) or streamed (`iter_urls`).
+    Scrapers expose two offer-parsing contracts:
+    - `parse_offer_async` - native async (pooled httpx client), used by the API,
+    - `parse_offer` - blocking shim kept for CLI scripts such as main.py.
+
+    `parse_offer_async` accepts the validators (ETag / Last-Modified) stored for the
+    offer; when the server answers 304 it raises NotModified instead of returning data.
     """
-    
+
     def __init__(self, name: str, base_url: str):
         self.name = name
         self.base_url = base_url
         self.logger = logging.getLogger(f"{__name__}.{name}")
+        self._async_client: httpx.AsyncClient | None = None
 
     @abstractmethod
     async def collect_urls(self, limit: int | None = None, **kwargs) -> list[str]:
@@ -20,9 +34,63 @@ class BaseScraper(ABC):
         """
         pass
 
+    async def iter_urls(self, limit: int | None = None, **kwargs) -> AsyncIterator[str]:
+        """
+        Yield offer URLs as they are discovered, so parsing can start before
+        collection finishes. Defaults to yielding the result of collect_urls.
+        """
+        for url in await self.collect_urls(limit=limit, **kwargs):
+            yield url
+
     @abstractmethod
     def parse_offer(self, url: str) -> dict:
         """
         Parse a single offer URL and return a dictionary of car data.
         """
         pass
+
+    async def parse_offer_async(self, url: str, validators: dict | None = None) -> dict:
+        """
+        Async variant of parse_offer. Falls back to running the blocking
+        implementation in a worker thread (without conditional fetching);
+        scrapers override it natively.
+        """
+        return await asyncio.to_thread(self.parse_offer, url)
+
+    def get_async_client(self) -> httpx.AsyncClient:
+        """
+        Return the scraper's pooled async HTTP client, creating it on first use.
+        Headers and cookies are copied from the scraper's requests session, if any.
+        """
+        if self._async_client is None:
+            session = getattr(self, "session", None)
+            headers = dict(session.headers) if session is not None else None
+            cookies = session.cookies if session is not None else None
+            self._async_client = make_async_client(headers=headers, cookies=cookies)
+        return self._async_client
+
+    @retry(
+        reraise=True,
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=1, max=8),
+        retry=retry_if_exception(is_retryable),
+    )
+    async def fetch_async(self, url: str, validators: dict | None = None, **kwargs) -> httpx.Response:
+        """
+        Fetch a URL with the pooled async client and raise on HTTP errors.
+        Only transport errors, 429 and 5xx are retried (see is_retryable).
+        With validators the request is conditional and a 304 raises NotModified.
+        """
+        headers = {**kwargs.pop("headers", {}), **conditional_headers(validators)}
+        response = await self.get_async_client().get(url, headers=headers, **kwargs)
+        check_not_modified(response)
+        response.raise_for_status()
+        return response
+
+    async def aclose(self) -> None:
+        """
+        Close the pooled async HTTP client.
+        """
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
@@ -1,18 +1,26 @@
 import os
 import re
 import json
+import asyncio
 import logging
+import httpx
 import requests
 from datetime import datetime, timezone
+from typing import AsyncIterator
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin
 from dotenv import load_dotenv
 
 from .base import BaseScraper
+from .http_client import make_session, response_validators
+from .parser_pool import run_parser
 
 load_dotenv()
 logger = logging.getLogger(__name__)
 
+OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+LLM_TIMEOUT = 45
+
 
 def get_default_openrouter_key() -> str | None:
     api_key = os.getenv("OPENROUTER_API_KEY")
@@ -51,9 +59,10 @@ class FiatPgdScraper(BaseScraper):
         self.use_llm = use_llm
         self.llm_model = llm_model
         self.openrouter_api_key = get_default_openrouter_key()
+        self._llm_client: httpx.AsyncClient | None = None
 
     def _make_session(self) -> requests.Session:
-        s = requests.Session()
+        s = make_session()
         s.headers.update({
             "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36",
             "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8",
@@ -92,6 +101,12 @@ class FiatPgdScraper(BaseScraper):
         """
         Zbiera adresy URL ofert samochodów, przechodząc przez paginację.
         """
+        return [url async for url in self.iter_urls(limit=limit, base_url=base_url, **kwargs)]
+
+    async def iter_urls(self, limit: int | None = None, base_url: str | None = None, **kwargs) -> AsyncIterator[str]:
+        """
+        Zwraca adresy URL ofert strona po stronie - parsowanie może ruszyć przed końcem paginacji.
+        """
         target_list_url = base_url or self.DEFAULT_LIST_URL
         self.logger.info(f"Rozpoczynam zbieranie URL-i z Fiat PGD: {target_list_url} (limit: {limit})")
 
@@ -105,7 +120,7 @@ class FiatPgdScraper(BaseScraper):
 
             self.logger.info(f"Pobieranie strony {page}: {page_url}")
             try:
-                resp = self.session.get(page_url, timeout=30)
+                resp = await asyncio.to_thread(self.session.get, page_url, timeout=30)
                 if resp.status_code == 404:
                     self.logger.info(f"Strona {page} zwróciła 404 - koniec paginacji.")
                     break
@@ -130,10 +145,13 @@ class FiatPgdScraper(BaseScraper):
                 break
 
             self.logger.info(f"Strona {page}: znaleziono {len(found_urls)} ofert (łącznie dotychczas: {len(all_urls) + len(found_urls)})")
+            if limit:
+                found_urls = found_urls[:limit - len(all_urls)]
             all_urls.extend(found_urls)
+            for found_url in found_urls:
+                yield found_url
 
             if limit and len(all_urls) >= limit:
-                all_urls = all_urls[:limit]
                 break
 
             pagination = soup.find("ul", class_="pagination")
@@ -148,7 +166,6 @@ class FiatPgdScraper(BaseScraper):
             page += 1
 
         self.logger.info(f"Łącznie zebrano {len(all_urls)} unikalnych URL-i z Fiat PGD")
-        return all_urls
 
     def _extract_all_raw_equipment(self, soup: BeautifulSoup) -> list[str]:
         """
@@ -208,14 +225,8 @@ class FiatPgdScraper(BaseScraper):
 
         return unique_items
 
-    def _categorize_with_llm(self, raw_items: list[str]) -> dict:
-        """
-        Kategoryzuje pełną listę wyposażenia przy użyciu modelu LLM przez OpenRouter.
-        Dokonuje inteligentnej dedukublikacji semantycznej oraz oczyszcza kody fabryczne.
-        """
-        if not raw_items or not self.openrouter_api_key:
-            return self._categorize_fallback(raw_items)
-
+    def _llm_request(self, raw_items: list[str]) -> dict:
+        """Nagłówki i treść zapytania OpenRouter kategoryzującego wyposażenie."""
         prompt = f"""Jesteś ekspertem motoryzacyjnym portalu Car-Scout.
 Otrzymujesz surową listę wyposażenia samochodu dostawczego/ciężarowego z portalu dealera.
 Lista zawiera powtórzenia (ogólne hasła ze skrótów oraz szczegółowe opisy z kodami wyposażenia standardowego i dodatkowego).
@@ -239,40 +250,67 @@ SUROWE WYPOSAŻENIE:
 {json.dumps(raw_items, ensure_ascii=False, indent=2)}
 """
 
-        headers = {
-            "Authorization": f"Bearer {self.openrouter_api_key}",
-            "HTTP-Referer": "https://car-scout.pl",
-            "X-Title": "Auto-Scraper Car-Scout"
+        return {
+            "headers": {
+                "Authorization": f"Bearer {self.openrouter_api_key}",
+                "HTTP-Referer": "https://car-scout.pl",
+                "X-Title": "Auto-Scraper Car-Scout"
+            },
+            "json": {
+                "model": self.llm_model,
+                "messages": [{"role": "user", "content": prompt}],
+                "response_format": {"type": "json_object"}
+            },
         }
 
+    def _llm_result(self, resp, raw_items: list[str]) -> dict:
+        """Wynik kategoryzacji z odpowiedzi OpenRouter (requests lub httpx) albo fallback."""
+        if resp.status_code == 200:
+            res_data = resp.json()
+            content = res_data["choices"][0]["message"]["content"]
+            parsed = json.loads(content)
+            return {
+                "equipment_audio_multimedia": "|".join(parsed.get("equipment_audio_multimedia", [])),
+                "equipment_safety": "|".join(parsed.get("equipment_safety", [])),
+                "equipment_comfort_extras": "|".join(parsed.get("equipment_comfort_extras", [])),
+                "equipment_other": "|".join(parsed.get("equipment_other", []))
+            }
+        self.logger.warning(f"OpenRouter zwrócił kod {resp.status_code}: {resp.text[:150]}, używam fallbacku")
+        return self._categorize_fallback(raw_items)
+
+    def _categorize_with_llm(self, raw_items: list[str]) -> dict:
+        """
+        Kategoryzuje pełną listę wyposażenia przy użyciu modelu LLM przez OpenRouter.
+        Dokonuje inteligentnej dedukublikacji semantycznej oraz oczyszcza kody fabryczne.
+        """
+        if not raw_items or not self.openrouter_api_key:
+            return self._categorize_fallback(raw_items)
         try:
-            resp = requests.post(
-                "https://openrouter.ai/api/v1/chat/completions",
-                headers=headers,
-                json={
-                    "model": self.llm_model,
-                    "messages": [{"role": "user", "content": prompt}],
-                    "response_format": {"type": "json_object"}
-                },
-                timeout=45
-            )
-            if resp.status_code == 200:
-                res_data = resp.json()
-                content = res_data["choices"][0]["message"]["content"]
-                parsed = json.loads(content)
-                return {
-                    "equipment_audio_multimedia": "|".join(parsed.get("equipment_audio_multimedia", [])),
-                    "equipment_safety": "|".join(parsed.get("equipment_safety", [])),
-                    "equipment_comfort_extras": "|".join(parsed.get("equipment_comfort_extras", [])),
-                    "equipment_other": "|".join(parsed.get("equipment_other", []))
-                }
-            else:
-                self.logger.warning(f"OpenRouter zwrócił kod {resp.status_code}: {resp.text[:150]}, używam fallbacku")
+            resp = requests.post(OPENROUTER_URL, timeout=LLM_TIMEOUT, **self._llm_request(raw_items))
+            return self._llm_result(resp, raw_items)
         except Exception as e:
             self.logger.warning(f"Błąd wywołania OpenRouter LLM: {e}, przełączam na regułowy fallback")
+        return self._categorize_fallback(raw_items)
 
+    async def _categorize_with_llm_async(self, raw_items: list[str]) -> dict:
+        """Asynchroniczny wariant _categorize_with_llm (httpx) - wywoływany poza pulą parsera."""
+        if not raw_items or not self.openrouter_api_key:
+            return self._categorize_fallback(raw_items)
+        if self._llm_client is None:
+            self._llm_client = httpx.AsyncClient(timeout=LLM_TIMEOUT)
+        try:
+            resp = await self._llm_client.post(OPENROUTER_URL, **self._llm_request(raw_items))
+            return self._llm_result(resp, raw_items)
+        except Exception as e:
+            self.logger.warning(f"Błąd wywołania OpenRouter LLM: {e}, przełączam na regułowy fallback")
         return self._categorize_fallback(raw_items)
 
+    async def aclose(self) -> None:
+        await super().aclose()
+        if self._llm_client is not None:
+            await self._llm_client.aclose()
+            self._llm_client = None
+
     def _categorize_fallback(self, raw_items: list[str]) -> dict:
         """
         Deterministyczny fallback kategoryzacji, gdy LLM jest niedostępny.
@@ -309,7 +347,34 @@ SUROWE WYPOSAŻENIE:
         """
         resp = self.session.get(url, timeout=30)
         resp.raise_for_status()
-        soup = BeautifulSoup(resp.text, "html.parser")
+        return self.parse_offer_html(url, resp.text)
+
+    async def parse_offer_async(self, url: str, validators: dict | None = None) -> dict:
+        """
+        Asynchroniczny wariant parse_offer - pobranie przez wspólnego klienta httpx,
+        parsowanie HTML w puli procesów parsera, kategoryzacja LLM (sieć) już tutaj, w pętli zdarzeń.
+        """
+        resp = await self.fetch_async(url, validators=validators)
+        data, raw_equipment = await run_parser(parse_offer_html_worker, url, resp.content, self.base_url)
+        if self.use_llm and self.openrouter_api_key:
+            data.update(await self._categorize_with_llm_async(raw_equipment))
+        return {**data, **response_validators(resp)}
+
+    def parse_offer_html(self, url: str, html: str | bytes) -> dict:
+        """
+        Parsuje pobrany już HTML oferty (bez pobierania strony).
+        """
+        data, raw_equipment = self.parse_offer_html_raw(url, html)
+        if self.use_llm and self.openrouter_api_key:
+            data.update(self._categorize_with_llm(raw_equipment))
+        return data
+
+    def parse_offer_html_raw(self, url: str, html: str | bytes) -> tuple[dict, list[str]]:
+        """
+        Parsowanie HTML bez sieci: wyposażenie skategoryzowane regułowo (_categorize_fallback)
+        oraz surowa lista pozycji do ewentualnej kategoryzacji LLM przez wywołującego.
+        """
+        soup = BeautifulSoup(html, "html.parser")
 
         # 1. Identyfikatory
         listing_id_match = re.search(r"/id/(\d+)", url)
@@ -426,12 +491,9 @@ SUROWE WYPOSAŻENIE:
         image_count = len(images)
         image_urls_str = " | ".join(images)
 
-        # 6. Pełne wyposażenie i kategoryzacja (LLM + Fallback)
+        # 6. Pełne wyposażenie i kategoryzacja regułowa (LLM nadpisuje ją w parse_offer_html*)
         all_raw_equipment = self._extract_all_raw_equipment(soup)
-        if self.use_llm and self.openrouter_api_key:
-            eq_categorized = self._categorize_with_llm(all_raw_equipment)
-        else:
-            eq_categorized = self._categorize_fallback(all_raw_equipment)
+        eq_categorized = self._categorize_fallback(all_raw_equipment)
 
         # 7. Dodatkowe informacje / Pełny opis
         add_info_h3 = soup.find(lambda e: e.name == "h3" and "dodatkowe informacje" in e.text.lower())
@@ -510,7 +572,7 @@ SUROWE WYPOSAŻENIE:
 
         now_iso = datetime.now(timezone.utc).isoformat()
 
-        return {
+        data = {
             "listing_id": listing_id,
             "numer_oferty": numer_oferty,
             "url": url,
@@ -578,6 +640,7 @@ SUROWE WYPOSAŻENIE:
             "specs_json": specs_json,
             "source": "fiat.pgd.pl"
         }
+        return data, all_raw_equipment
 
     def to_car_scout_row(self, data: dict) -> dict:
         """
@@ -628,3 +691,20 @@ SUROWE WYPOSAŻENIE:
             "additional_info_content": data.get("additional_info_content") or "",
             "specs_json": data.get("specs_json") or ""
         }
+
+
+# Instancje scrapera w procesach roboczych puli parserów (jedna na base_url)
+_worker_scrapers: dict[str, FiatPgdScraper] = {}
+
+
+def parse_offer_html_worker(url: str, html: bytes, base_url: str) -> tuple[dict, list[str]]:
+    """
+    Punkt wejścia dla puli procesów parsera - metody instancji nie da się przekazać
+    do innego procesu, więc scraper jest tworzony raz na proces i base_url.
+    Tylko HTML -> dict (parse_offer_html_raw); wywołanie LLM robi parse_offer_async.
+    """
+    scraper = _worker_scrapers.get(base_url)
+    if scraper is None:
+        scraper = FiatPgdScraper(base_url=base_url, use_llm=False)
+        _worker_scrapers[base_url] = scraper
+    return scraper.parse_offer_html_raw(url, html)
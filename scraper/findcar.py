@@ -1,12 +1,13 @@
 import re
 import json
-import time
 import random
+import asyncio
 import logging
-import requests
 from datetime import datetime, timezone
+from typing import AsyncIterator
 from bs4 import BeautifulSoup
 from .base import BaseScraper
+from .http_client import make_session, response_validators, NotModified
 
 logger = logging.getLogger(__name__)
 
@@ -18,7 +19,7 @@ class FindcarScraper(BaseScraper):
         self.session = self._make_session()
 
     def _make_session(self):
-        s = requests.Session()
+        s = make_session()
         s.headers.update({
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36",
             "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",
@@ -125,13 +126,14 @@ class FindcarScraper(BaseScraper):
         }
 
     async def collect_urls(self, max_pages=10, page_size=45, start_page=0, **kwargs) -> list[str]:
-        all_ids = []
-        
+        return [url async for url in self.iter_urls(max_pages=max_pages, page_size=page_size, start_page=start_page, **kwargs)]
+
+    async def iter_urls(self, max_pages=10, page_size=45, start_page=0, **kwargs) -> AsyncIterator[str]:
         # Warm up session by visiting home page
         try:
             self.logger.info("Rozgrzewanie sesji (visit home page)...")
-            self.session.get(self.base_url, timeout=20)
-            time.sleep(random.uniform(1.0, 2.5))
+            await asyncio.to_thread(self.session.get, self.base_url, timeout=20)
+            await asyncio.sleep(random.uniform(1.0, 2.5))
         except Exception as e:
             self.logger.warning(f"Problem z rozgrzewaniem sesji: {e}")
 
@@ -161,10 +163,11 @@ class FindcarScraper(BaseScraper):
 
             for attempt in range(max_retries):
                 try:
-                    if p_idx > start_page or attempt > 0:
-                        time.sleep(random.uniform(1.5, 3.5) * (attempt + 1))
+                    # Tempo kolejnych stron reguluje limiter hosta; tu tylko backoff po błędzie
+                    if attempt > 0:
+                        await asyncio.sleep(random.uniform(1.5, 3.5) * attempt)
 
-                    response = self.session.get(target_url, timeout=30)
+                    response = await asyncio.to_thread(self.session.get, target_url, timeout=30)
                     
                     if response.status_code == 404:
                         self.logger.info(f"  ⚠️ 404 Not Found dla {target_url} - koniec paginacji.")
@@ -195,8 +198,9 @@ class FindcarScraper(BaseScraper):
                         break
 
                     result = sorted(list(ids))
-                    all_ids.extend(result)
                     self.logger.info(f"  📌 Znaleziono {len(ids)} ofert na stronie.")
+                    for lid in result:
+                        yield f"{self.base_url}/listings/{lid}"
                     
                     consecutive_failures = 0  # Reset failures on success
                     break # Success, break out of retry loop
@@ -213,8 +217,6 @@ class FindcarScraper(BaseScraper):
             if consecutive_failures >= 5:
                 self.logger.critical("  🚨 Zbyt wiele kolejnych błędów. Przerwano paginację, by uniknąć trwałej blokady.")
                 break
-        
-        return [f"{self.base_url}/listings/{lid}" for lid in all_ids]
 
     def parse_offer(self, url: str) -> dict:
         listing_id = url.split("/")[-1]
@@ -224,3 +226,14 @@ class FindcarScraper(BaseScraper):
         except Exception as e:
             self.logger.error(f"Błąd ID {listing_id}: {e}")
             raise
+
+    async def parse_offer_async(self, url: str, validators: dict | None = None) -> dict:
+        listing_id = url.split("/")[-1]
+        try:
+            response = await self.fetch_async(self.detail_api.format(listing_id), validators=validators)
+            return {**self.detail_to_row(response.json(), listing_id), **response_validators(response)}
+        except NotModified:
+            raise
+        except Exception as e:
+            self.logger.error(f"Błąd ID {listing_id}: {e}")
+            raise
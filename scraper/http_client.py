@@ -0,0 +1,146 @@
+"""
+HTTP - wspólna konfiguracja klientów HTTP (httpx async i requests) dla scraperów
+
+Każdy request przechodzi przez współdzielony limiter per host (rate_limiter.py),
+który zastępuje stałe opóźnienia (time.sleep) rozsiane wcześniej po scraperach.
+"""
+import os
+import time
+import logging
+import httpx
+import requests
+
+from .rate_limiter import get_limiter
+
+logger = logging.getLogger(__name__)
+# httpx loguje każdy request na poziomie INFO - przy setkach ofert zaśmieca to logi
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+# Limity puli połączeń jednego klienta (nadpisywalne zmiennymi środowiskowymi)
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "200"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "50"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))
+# Warunkowe pobieranie ofert (If-None-Match / If-Modified-Since); 0 wymusza pełne pobranie
+HTTP_CONDITIONAL = os.getenv("HTTP_CONDITIONAL", "1") == "1"
+
+
+class NotModified(Exception):
+    """Serwer odpowiedział 304 - oferta nie zmieniła się od poprzedniego pobrania."""
+
+    def __init__(self, url: str):
+        super().__init__(f"304 Not Modified: {url}")
+        self.url = url
+
+
+def conditional_headers(validators: dict | None) -> dict:
+    """
+    Nagłówki warunkowego GET na podstawie walidatorów zapisanych przy pojeździe.
+
+    Args:
+        validators: Słownik z kluczami http_etag / http_last_modified (kolumny Vehicle)
+    """
+    if not HTTP_CONDITIONAL or not validators:
+        return {}
+    headers = {}
+    if validators.get("http_etag"):
+        headers["If-None-Match"] = validators["http_etag"]
+    if validators.get("http_last_modified"):
+        headers["If-Modified-Since"] = validators["http_last_modified"]
+    return headers
+
+
+def check_not_modified(response: httpx.Response) -> None:
+    """Rzuca NotModified dla odpowiedzi 304."""
+    if response.status_code == 304:
+        raise NotModified(str(response.request.url))
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """
+    Czy błąd httpx warto ponowić: błędy transportu (połączenie, timeout), 429 i 5xx.
+    Pozostałe odpowiedzi 4xx (np. 404 / 410 - oferta zdjęta) są ostateczne.
+    """
+    if isinstance(exc, httpx.TransportError):
+        return True
+    if isinstance(exc, httpx.HTTPStatusError):
+        status = exc.response.status_code
+        return status == 429 or status >= 500
+    return False
+
+
+def response_validators(response) -> dict:
+    """Walidatory z odpowiedzi (httpx lub requests) do zapisania przy pojeździe."""
+    return {
+        "http_etag": response.headers.get("ETag"),
+        "http_last_modified": response.headers.get("Last-Modified"),
+    }
+
+
+class RateLimitedTransport(httpx.AsyncBaseTransport):
+    """Transport httpx czekający na token limitera hosta i raportujący mu wynik requestu."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        limiter = get_limiter(str(request.url))
+        await limiter.acquire_async()
+        started = time.monotonic()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except httpx.TransportError:
+            limiter.record(None, time.monotonic() - started)
+            raise
+        limiter.record(response.status_code, time.monotonic() - started, response.headers.get("Retry-After"))
+        return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+class RateLimitedSession(requests.Session):
+    """requests.Session, która przed każdym requestem czeka na token limitera hosta."""
+
+    def request(self, method, url, *args, **kwargs):
+        limiter = get_limiter(url)
+        limiter.acquire()
+        started = time.monotonic()
+        try:
+            response = super().request(method, url, *args, **kwargs)
+        except requests.RequestException:
+            limiter.record(None, time.monotonic() - started)
+            raise
+        limiter.record(response.status_code, time.monotonic() - started, response.headers.get("Retry-After"))
+        return response
+
+
+def make_async_client(headers: dict | None = None, cookies=None) -> httpx.AsyncClient:
+    """
+    Tworzy klienta httpx z pulą połączeń (keep-alive) współdzieloną przez wszystkie
+    równoległe requesty danego scrapera.
+
+    Args:
+        headers: Domyślne nagłówki (np. skopiowane z requests.Session scrapera)
+        cookies: Ciasteczka (np. CookieJar z rozgrzanej sesji requests)
+
+    Returns:
+        Skonfigurowany httpx.AsyncClient - należy go zamknąć przez `await client.aclose()`
+    """
+    transport = httpx.AsyncHTTPTransport(
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+        ),
+    )
+    return httpx.AsyncClient(
+        headers=headers,
+        cookies=cookies,
+        timeout=httpx.Timeout(HTTP_TIMEOUT),
+        transport=RateLimitedTransport(transport),
+        follow_redirects=True,
+    )
+
+
+def make_session() -> requests.Session:
+    """Tworzy sesję requests objętą współdzielonym limiterem per host."""
+    return RateLimitedSession()
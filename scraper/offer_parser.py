@@ -7,13 +7,17 @@ import logging
 from datetime import datetime
 from urllib.parse import urljoin
 import requests
+import httpx
 from bs4 import BeautifulSoup
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
+from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception, retry_if_exception_type
+
+from .http_client import make_session, conditional_headers, check_not_modified, response_validators, NotModified, is_retryable
+from .parser_pool import run_parser
 
 logger = logging.getLogger(__name__)
 
 # Session dla wszystkich requestów
-SESSION = requests.Session()
+SESSION = make_session()
 SESSION.headers.update({
     "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120 Safari/537.36"
 })
@@ -92,6 +96,23 @@ def fetch_html(url: str) -> str:
     return r.text
 
 
+@retry(
+    reraise=True,
+    stop=stop_after_attempt(3),
+    wait=wait_exponential(multiplier=1, min=1, max=8),
+    retry=retry_if_exception(is_retryable),
+)
+async def fetch_html_async(client: httpx.AsyncClient, url: str, validators: dict | None = None) -> httpx.Response:
+    """
+    Pobiera stronę asynchronicznie (wspólny klient httpx); ponawia błędy transportu, 429 i 5xx.
+    Z walidatorami wysyła warunkowy GET - odpowiedź 304 rzuca NotModified.
+    """
+    r = await client.get(url, headers=conditional_headers(validators))
+    check_not_modified(r)
+    r.raise_for_status()
+    return r
+
+
 def _extract_json_data(html: str) -> dict | None:
     """
     Wyciąga i parsuje dane JSON z window.__NUXT__ w HTML.
@@ -463,6 +484,44 @@ def parse_offer(url: str) -> dict:
     
     try:
         html = fetch_html(url)
+    except Exception as e:
+        logger.error(f"Błąd parsowania {url}: {e}")
+        raise
+    return parse_offer_html(url, html)
+
+
+async def parse_offer_async(client: httpx.AsyncClient, url: str, validators: dict | None = None) -> dict:
+    """
+    Asynchroniczny odpowiednik parse_offer - pobiera HTML przez wspólnego klienta
+    httpx, a parsowanie (CPU) przekazuje surowymi bajtami do puli procesów parsera.
+    """
+    logger.info(f"Parsowanie (async): {url}")
+    
+    try:
+        response = await fetch_html_async(client, url, validators)
+    except NotModified:
+        raise
+    except Exception as e:
+        logger.error(f"Błąd parsowania {url}: {e}")
+        raise
+    data = await run_parser(parse_offer_html, url, response.content)
+    return {**data, **response_validators(response)}
+
+
+def parse_offer_html(url: str, html: str | bytes) -> dict:
+    """
+    Parsuje pobrany już HTML oferty (bez dostępu do sieci).
+    
+    Args:
+        url: URL oferty (do metadanych i względnych linków)
+        html: Kod HTML strony oferty (str lub surowe bajty UTF-8)
+        
+    Returns:
+        Słownik z wyparsowanymi danymi oferty
+    """
+    if isinstance(html, bytes):
+        html = html.decode("utf-8", errors="replace")
+    try:
         soup = BeautifulSoup(html, "lxml")
         
         # === PRIORYTET 1: Ekstrakcja z JSON ===
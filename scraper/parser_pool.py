@@ -0,0 +1,84 @@
+"""
+Parser Pool - pula procesów do parsowania HTML ofert (BeautifulSoup + lxml)
+
+Parsowanie jest CPU-bound i trzyma GIL, więc przy równoległym pobieraniu jeden rdzeń
+ogranicza przepustowość. Pobieranie zostaje w pętli zdarzeń, a surowe bajty HTML
+trafiają do procesów roboczych, które zwracają zwykłe słowniki.
+"""
+import os
+import sys
+import asyncio
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger(__name__)
+
+# Liczba procesów (domyślnie liczba rdzeni). 0 wyłącza pulę - parsowanie idzie wtedy w wątku.
+PARSER_POOL_WORKERS = int(os.getenv("PARSER_POOL_WORKERS", str(os.cpu_count() or 1)))
+# Po tylu zadaniach proces roboczy jest wymieniany na nowy (ogranicza przyrost pamięci lxml)
+PARSER_POOL_MAX_TASKS = int(os.getenv("PARSER_POOL_MAX_TASKS", "200"))
+
+# max_tasks_per_child jest dostępne od Pythona 3.11 (obraz Playwright ma 3.10) - wcześniej
+# cała pula jest wymieniana ręcznie po PARSER_POOL_MAX_TASKS zadaniach na proces
+NATIVE_MAX_TASKS = sys.version_info >= (3, 11)
+
+_pool: ProcessPoolExecutor | None = None
+_pool_tasks = 0
+_pool_lock = threading.Lock()
+
+
+def get_parser_pool() -> ProcessPoolExecutor:
+    """Zwraca (tworząc przy pierwszym użyciu) współdzieloną pulę procesów parsera - jedno wywołanie na zlecane zadanie."""
+    global _pool, _pool_tasks
+    retired = None
+    with _pool_lock:
+        if _pool is not None and not NATIVE_MAX_TASKS and _pool_tasks >= PARSER_POOL_MAX_TASKS * PARSER_POOL_WORKERS:
+            # Zlecone już zadania stara pula dokończy w tle
+            retired, _pool = _pool, None
+        if _pool is None:
+            logger.info(f"Uruchamiam pulę parserów: {PARSER_POOL_WORKERS} procesów, recykling co {PARSER_POOL_MAX_TASKS} zadań")
+            options = {"max_tasks_per_child": PARSER_POOL_MAX_TASKS} if NATIVE_MAX_TASKS else {}
+            _pool = ProcessPoolExecutor(
+                max_workers=PARSER_POOL_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                **options,
+            )
+            _pool_tasks = 0
+        _pool_tasks += 1
+        pool = _pool
+    if retired is not None:
+        retired.shutdown(wait=False)
+    return pool
+
+
+async def run_parser(func, *args):
+    """
+    Uruchamia funkcję parsującą w puli procesów i zwraca jej wynik.
+
+    Args:
+        func: Funkcja zdefiniowana na poziomie modułu (musi dać się zpicklować)
+        *args: Argumenty funkcji (np. URL i surowe bajty HTML)
+    """
+    if PARSER_POOL_WORKERS <= 0:
+        return await asyncio.to_thread(func, *args)
+
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(get_parser_pool(), func, *args)
+    except BrokenProcessPool:
+        # Proces roboczy padł (np. OOM) - kolejne zadania dostaną nową pulę
+        logger.error("Pula parserów uszkodzona - zostanie utworzona ponownie")
+        shutdown_parser_pool(wait=False)
+        raise
+
+
+def shutdown_parser_pool(wait: bool = True) -> None:
+    """Zamyka pulę procesów parsera (np. przy zamykaniu aplikacji)."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=wait, cancel_futures=True)
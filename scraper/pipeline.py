@@ -0,0 +1,86 @@
+"""
+Pipeline - potokowe zbieranie URL-i i parsowanie ofert
+
+Odkrywane URL-e trafiają do ograniczonej kolejki, z której od razu czytają workery
+parsujące. Pełna kolejka wstrzymuje zbieranie (backpressure), więc discovery nie
+wyprzedza parsowania o więcej niż `queue_size` ofert.
+"""
+import time
+import asyncio
+import logging
+from contextlib import aclosing
+from typing import AsyncIterator, Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+
+async def with_deadline(urls: AsyncIterator[str], deadline: float | None) -> AsyncIterator[str]:
+    """
+    Przekazuje URL-e do chwili `deadline` (wartość time.monotonic()); później kończy
+    strumień - oferty już przekazane do parsowania są dokańczane.
+    """
+    async with aclosing(urls):
+        async for url in urls:
+            if deadline is not None and time.monotonic() >= deadline:
+                logger.info("Wyczerpany budżet czasu przebiegu - kończę przekazywanie URL-i")
+                return
+            yield url
+
+
+async def run_pipeline(
+    urls: AsyncIterator[str],
+    handle: Callable[[str], Awaitable[None]],
+    workers: int,
+    queue_size: int | None = None,
+    limit: int | None = None,
+    on_discovered: Callable[[int], None] | None = None,
+) -> list[str]:
+    """
+    Uruchamia zbieranie URL-i i ich przetwarzanie równolegle.
+
+    Args:
+        urls: Asynchroniczny iterator URL-i (np. scraper.iter_urls(...))
+        handle: Korutyna przetwarzająca pojedynczy URL (parsowanie + zapis)
+        workers: Liczba równoległych workerów przetwarzających
+        queue_size: Pojemność kolejki (domyślnie 4 * workers)
+        limit: Maksymalna liczba URL-i do przetworzenia
+        on_discovered: Callback wywoływany z łączną liczbą odkrytych URL-i
+
+    Returns:
+        Lista odkrytych (unikalnych) URL-i w kolejności odkrycia
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size or workers * 4)
+    discovered: list[str] = []
+    seen: set[str] = set()
+
+    async def consume():
+        while True:
+            url = await queue.get()
+            if url is None:
+                return
+            try:
+                await handle(url)
+            except Exception as e:
+                logger.error(f"Błąd przetwarzania {url}: {e}")
+
+    consumers = [asyncio.create_task(consume()) for _ in range(workers)]
+    try:
+        async with aclosing(urls):
+            async for url in urls:
+                if url in seen:
+                    continue
+                seen.add(url)
+                discovered.append(url)
+                if on_discovered:
+                    on_discovered(len(discovered))
+                await queue.put(url)
+                if limit and len(discovered) >= limit:
+                    logger.info(f"Osiągnięto limit {limit} ofert - kończę zbieranie")
+                    break
+    finally:
+        # Workery dokańczają kolejkę także wtedy, gdy zbieranie zakończyło się błędem
+        for _ in consumers:
+            await queue.put(None)
+        await asyncio.gather(*consumers)
+
+    return discovered
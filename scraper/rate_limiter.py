@@ -0,0 +1,144 @@
+"""
+Rate Limiter - adaptacyjny limiter requestów per host (token bucket + AIMD)
+
+Każdy host ma własny kubełek tokenów, którego tempo (requesty/s) dostosowuje się do
+odpowiedzi serwera:
+- szybkie odpowiedzi 2xx/3xx -> tempo rośnie addytywnie,
+- 429 / 5xx / błąd połączenia / wyraźny wzrost latencji -> tempo spada multiplikatywnie.
+
+Limiter jest współdzielony przez wszystkie scrapery (sesje requests i klienty httpx),
+działa zarówno z wątków (acquire) jak i z pętli zdarzeń (acquire_async).
+"""
+import os
+import time
+import asyncio
+import logging
+import threading
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_INITIAL_RPS = float(os.getenv("RATE_LIMIT_INITIAL_RPS", "2.0"))
+RATE_LIMIT_MIN_RPS = float(os.getenv("RATE_LIMIT_MIN_RPS", "0.2"))
+RATE_LIMIT_MAX_RPS = float(os.getenv("RATE_LIMIT_MAX_RPS", "10.0"))
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "2"))
+
+# Parametry AIMD
+ADDITIVE_INCREASE = 0.1        # +rps po każdej szybkiej odpowiedzi 2xx/3xx
+MULTIPLICATIVE_DECREASE = 0.5  # mnożnik tempa po 429/5xx/błędzie
+LATENCY_DECREASE = 0.8         # łagodniejszy mnożnik przy rosnącej latencji
+LATENCY_FACTOR = 2.0           # "rosnąca latencja" = latencja > bazowa * LATENCY_FACTOR
+DECREASE_COOLDOWN = 1.0        # min. odstęp (s) między kolejnymi spadkami tempa
+
+
+class HostRateLimiter:
+    """Token bucket z adaptacją AIMD dla pojedynczego hosta."""
+
+    def __init__(self, host: str, rate: float = RATE_LIMIT_INITIAL_RPS, min_rate: float = RATE_LIMIT_MIN_RPS,
+                 max_rate: float = RATE_LIMIT_MAX_RPS, burst: float = RATE_LIMIT_BURST):
+        self.host = host
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.rate = min(max(rate, min_rate), max_rate)
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.last_decrease = 0.0
+        self.baseline_latency: float | None = None
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Rezerwuje token i zwraca czas (s), który trzeba odczekać przed requestem."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(wait, self.blocked_until - now)
+
+    def acquire(self) -> None:
+        """Blokujące oczekiwanie na token (kod synchroniczny / wątki)."""
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self) -> None:
+        """Oczekiwanie na token bez blokowania pętli zdarzeń."""
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def record(self, status: int | None, latency: float, retry_after: str | None = None) -> None:
+        """
+        Aktualizuje tempo na podstawie wyniku requestu.
+
+        Args:
+            status: Kod HTTP odpowiedzi (None dla błędu połączenia / timeoutu)
+            latency: Czas odpowiedzi w sekundach
+            retry_after: Wartość nagłówka Retry-After (jeśli serwer ją podał)
+        """
+        with self._lock:
+            now = time.monotonic()
+            if status is None or status == 429 or status >= 500:
+                self._decrease(now, MULTIPLICATIVE_DECREASE)
+                if retry_after and retry_after.strip().isdigit():
+                    self.blocked_until = max(self.blocked_until, now + int(retry_after.strip()))
+                return
+
+            if self.baseline_latency is None:
+                self.baseline_latency = latency
+            slow = latency > self.baseline_latency * LATENCY_FACTOR
+            # Bazowa latencja zmienia się powoli, żeby pojedyncze skoki jej nie zawyżały
+            self.baseline_latency = 0.95 * self.baseline_latency + 0.05 * latency
+
+            if slow:
+                self._decrease(now, LATENCY_DECREASE)
+            elif status < 400:
+                self.rate = min(self.max_rate, self.rate + ADDITIVE_INCREASE)
+
+    def _decrease(self, now: float, factor: float) -> None:
+        # Wiele równoległych requestów zwraca błąd naraz - tniemy tempo raz na okno
+        if now - self.last_decrease < DECREASE_COOLDOWN:
+            return
+        self.last_decrease = now
+        old_rate = self.rate
+        self.rate = max(self.min_rate, self.rate * factor)
+        logger.info(f"[{self.host}] Zwalniam: {old_rate:.2f} -> {self.rate:.2f} req/s")
+
+
+_limiters: dict[str, HostRateLimiter] = {}
+_limiters_lock = threading.Lock()
+_overrides: dict = {}
+
+
+def get_limiter(url: str) -> HostRateLimiter:
+    """Zwraca współdzielony limiter dla hosta z podanego URL-a."""
+    host = urlparse(url).netloc or url
+    with _limiters_lock:
+        limiter = _limiters.get(host)
+        if limiter is None:
+            limiter = HostRateLimiter(host, **_overrides)
+            _limiters[host] = limiter
+        return limiter
+
+
+def configure_rate_limits(min_interval: float | None = None, max_interval: float | None = None) -> None:
+    """
+    Ustawia granice tempa dla wszystkich hostów na podstawie odstępów między requestami
+    (np. z opcji CLI --min-delay / --max-delay).
+
+    Args:
+        min_interval: Najkrótszy odstęp (s) - wyznacza maksymalne tempo
+        max_interval: Najdłuższy odstęp (s) - wyznacza minimalne tempo przy wycofaniu
+    """
+    if min_interval:
+        _overrides["max_rate"] = 1.0 / min_interval
+    if max_interval:
+        _overrides["min_rate"] = 1.0 / max_interval
+    with _limiters_lock:
+        for limiter in _limiters.values():
+            limiter.max_rate = _overrides.get("max_rate", limiter.max_rate)
+            limiter.min_rate = _overrides.get("min_rate", limiter.min_rate)
+            limiter.rate = min(max(limiter.rate, limiter.min_rate), limiter.max_rate)
@@ -0,0 +1,112 @@
+"""
+Runner - wspólna logika przebiegu scrapowania (API i workery)
+
+Ukrywa różnice między marketplace'ami: pewneauto to osobny moduł z wieloma
+konfiguracjami dealerów, pozostałe źródła to klasy BaseScraper. Runner nie
+korzysta z bazy danych - konfiguracje dealerów przekazuje wywołujący.
+"""
+import os
+import asyncio
+import logging
+from typing import AsyncIterator
+
+from . import get_scraper
+from .http_client import make_async_client, make_session
+
+logger = logging.getLogger(__name__)
+
+# Domyślna liczba równolegle parsowanych ofert dla każdego marketplace.
+# Nadpisywalne zmienną środowiskową SCRAPE_CONCURRENCY_<MARKETPLACE>, np. SCRAPE_CONCURRENCY_AUTOPUNKT=16
+SCRAPE_CONCURRENCY = {
+    "autopunkt": 8,
+    "pewneauto": 6,
+    "findcar": 4,
+    "vehis": 8,
+    "fiat_pgd": 4,
+}
+
+
+def get_scrape_concurrency(marketplace: str) -> int:
+    key = "fiat_pgd" if marketplace in ["fiat_pgd", "pgd", "fiat"] else marketplace
+    default = SCRAPE_CONCURRENCY.get(key, 4)
+    try:
+        return max(1, int(os.getenv(f"SCRAPE_CONCURRENCY_{key.upper()}", default)))
+    except ValueError:
+        return default
+
+
+class MarketplaceRunner:
+    """
+    Zbiera URL-e i parsuje oferty jednego marketplace.
+
+    Args:
+        marketplace: Nazwa marketplace (autopunkt, pewneauto, findcar, vehis, fiat_pgd)
+        dealer_configs: Lista (dealer_name, base_url) - wymagana tylko do zbierania URL-i pewneauto
+    """
+
+    def __init__(self, marketplace: str, dealer_configs: list[tuple[str, str]] | None = None):
+        self.marketplace = marketplace
+        self.dealer_configs = dealer_configs or []
+        # URL -> grupa dealera (pewneauto), uzupełniane podczas zbierania
+        self.url_to_group: dict[str, str] = {}
+        self._session = None
+        self._async_client = None
+
+        if marketplace == "pewneauto":
+            import scraper_pewneauto
+            self.scraper = scraper_pewneauto
+        else:
+            self.scraper = get_scraper(marketplace)
+
+    async def iter_urls(self, limit: int | None = None) -> AsyncIterator[str]:
+        """Strumieniuje URL-e ofert (duplikaty usuwa wywołujący)."""
+        marketplace = self.marketplace
+        if marketplace == "pewneauto":
+            if self._session is None:
+                self._session = make_session()
+            for dealer_name, base_url in self.dealer_configs:
+                logger.info(f"Scraping config: {dealer_name} ({base_url})")
+                links = self.scraper.iter_offer_links(self._session, max_pages=10 if limit else 1000, base_url=base_url)
+                while True:
+                    url = await asyncio.to_thread(next, links, None)
+                    if url is None:
+                        break
+                    self.url_to_group.setdefault(url, dealer_name)
+                    yield url
+            return
+
+        if marketplace == "autopunkt":
+            urls = self.scraper.iter_urls(limit=limit)
+        elif marketplace == "findcar":
+            max_pages = (limit // 50) + 1 if limit else 1000
+            urls = self.scraper.iter_urls(max_pages=max_pages)
+        elif marketplace in ["fiat_pgd", "pgd", "fiat"]:
+            urls = self.scraper.iter_urls(limit=limit)
+        else:  # vehis
+            max_pages = (limit // 50) + 1 if limit else 1000
+            urls = self.scraper.iter_urls(max_pages=max_pages, page_size=50)
+
+        async for url in urls:
+            yield url
+
+    async def parse(self, url: str, dealer_group: str | None = None, validators: dict | None = None) -> dict | None:
+        """
+        Parsuje pojedynczą ofertę; zwraca None, gdy nie udało się pobrać danych.
+        Z walidatorami (ETag / Last-Modified pojazdu) niezmieniona oferta rzuca NotModified.
+        """
+        if self.marketplace == "pewneauto":
+            if self._async_client is None:
+                self._async_client = make_async_client(headers=self.scraper.HEADERS)
+            data = await self.scraper.scrape_offer_async(self._async_client, url, validators)
+            if data:
+                data["dealer_group"] = dealer_group or self.url_to_group.get(url)
+            return data
+        return await self.scraper.parse_offer_async(url, validators=validators)
+
+    async def aclose(self) -> None:
+        """Zamyka klienty HTTP scrapera."""
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+        if hasattr(self.scraper, "aclose"):
+            await self.scraper.aclose()
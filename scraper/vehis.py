@@ -1,7 +1,10 @@
 import os
+import asyncio
 import requests
 from datetime import datetime, timezone
+from typing import AsyncIterator
 from .base import BaseScraper
+from .http_client import make_session, response_validators
 
 
 class VehisScraper(BaseScraper):
@@ -12,7 +15,7 @@ class VehisScraper(BaseScraper):
         self._token = None
 
     def _make_session(self) -> requests.Session:
-        session = requests.Session()
+        session = make_session()
         session.headers.update({
             "User-Agent": "auto-scraper/1.0",
             "Accept": "application/json",
@@ -38,6 +41,12 @@ class VehisScraper(BaseScraper):
         self._token = token
         self.session.headers.update({"Authorization": f"Bearer {token}"})
 
+    async def auth_headers_async(self) -> dict:
+        """Nagłówek Authorization dla zapytań o szczegóły (loguje się przy pierwszym użyciu)."""
+        if not self._token:
+            await asyncio.to_thread(self._ensure_auth)
+        return {"Authorization": f"Bearer {self._token}"}
+
     def _safe_int(self, value):
         if value is None:
             return None
@@ -103,8 +112,10 @@ class VehisScraper(BaseScraper):
         return f"{self.base_url}/broker/subjects/{group_id}/{subject_id}"
 
     async def collect_urls(self, max_pages=10, page_size=50, start_offset=0, **kwargs) -> list[str]:
-        self._ensure_auth()
-        urls = []
+        return [url async for url in self.iter_urls(max_pages=max_pages, page_size=page_size, start_offset=start_offset, **kwargs)]
+
+    async def iter_urls(self, max_pages=10, page_size=50, start_offset=0, **kwargs) -> AsyncIterator[str]:
+        await asyncio.to_thread(self._ensure_auth)
         offset = start_offset
         for _ in range(max_pages):
             params = {
@@ -113,7 +124,8 @@ class VehisScraper(BaseScraper):
                 "sortBy": "subject_id",
                 "sortOrder": "asc",
             }
-            response = self.session.get(
+            response = await asyncio.to_thread(
+                self.session.get,
                 f"{self.base_url}/broker/subjects",
                 params=params,
                 timeout=30,
@@ -127,15 +139,20 @@ class VehisScraper(BaseScraper):
                 subject_id = subject.get("subject_id")
                 group_id = subject.get("group_id")
                 if subject_id and group_id:
-                    urls.append(self._build_detail_url(group_id, subject_id))
+                    yield self._build_detail_url(group_id, subject_id)
             offset += page_size
-        return urls
 
     def parse_offer(self, url: str) -> dict:
         self._ensure_auth()
         response = self.session.get(url, timeout=30)
         response.raise_for_status()
-        payload = response.json() or {}
+        return self.payload_to_row(url, response.json() or {})
+
+    async def parse_offer_async(self, url: str, validators: dict | None = None) -> dict:
+        response = await self.fetch_async(url, validators=validators, headers=await self.auth_headers_async())
+        return {**self.payload_to_row(url, response.json() or {}), **response_validators(response)}
+
+    def payload_to_row(self, url: str, payload: dict) -> dict:
         subjects = payload.get("subjects") or []
         if not subjects:
             raise ValueError(f"Brak danych pojazdu w odpowiedzi Vehis dla {url}")
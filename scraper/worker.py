@@ -0,0 +1,454 @@
+"""
+Worker - samodzielny proces scrapujący zasilany kolejką w bazie danych
+
+Uruchomienie:
+    python -m scraper.worker [--role all|discovery|parse] [--batch-size 20]
+
+Przy SCRAPE_MODE=worker API tylko tworzy przebieg (ScrapeLog ze statusem 'queued')
+i raportuje postęp. Worker:
+1. przejmuje oczekujący przebieg (SELECT ... FOR UPDATE SKIP LOCKED), zbiera jego
+   URL-e i zapisuje je do tabeli scrape_queue,
+2. pobiera z scrape_queue URL-e (również SKIP LOCKED) i dobiera kolejne, gdy w locie
+   zostaje mniej niż pół paczki - wolny URL nie wstrzymuje pozostałych; wyniki zapisuje
+   paczkami (upsert pojazdów + snapshoty),
+3. worker, który jako ostatni opróżni kolejkę przebiegu, zamyka go (archiwizacja,
+   przeliczenie harmonogramu odświeżania, status 'completed').
+
+Przebieg w trybie 'refresh' zamiast zbierania kolejkuje zaległe oferty z harmonogramu
+(refresh.py). Po przekroczeniu budżetu czasu (time_budget) pozostałe URL-e przebiegu
+są pomijane (status 'skipped').
+
+Workerów można uruchomić dowolnie wiele, także w osobnych kontenerach. URL-e
+przejęte przez worker, który przestał działać, wracają do puli po WORKER_CLAIM_TIMEOUT.
+
+Zapytania do bazy idą w wątkach (asyncio.to_thread), każde w krótkiej sesji - pętla
+zdarzeń (Playwright przy zbieraniu, pobieranie ofert) nie jest przez nie wstrzymywana.
+"""
+import os
+import time
+import socket
+import asyncio
+import logging
+import argparse
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+import models, database
+from ingest import (
+    save_offers, archive_missing, load_dealer_configs, iter_frontier, queue_counts,
+    load_validators, touch_vehicles,
+)
+from .http_client import NotModified
+from migrations import apply_migrations
+from refresh import due_vehicles, schedule_refreshes
+from stats import update_stats
+import artifacts
+from .parser_pool import shutdown_parser_pool
+from .pipeline import with_deadline
+from .runner import MarketplaceRunner, get_scrape_concurrency
+
+logger = logging.getLogger(__name__)
+
+WORKER_ID = os.getenv("WORKER_ID", f"{socket.gethostname()}-{os.getpid()}")
+# Liczba URL-i przejmowanych jednym zapytaniem
+WORKER_BATCH_SIZE = int(os.getenv("WORKER_BATCH_SIZE", "20"))
+# Odstęp (s) między sprawdzeniami pustej kolejki
+WORKER_POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", "5"))
+# Po tylu sekundach URL przejęty przez (prawdopodobnie martwy) worker wraca do puli
+WORKER_CLAIM_TIMEOUT = int(os.getenv("WORKER_CLAIM_TIMEOUT", "600"))
+# Maksymalna liczba prób sparsowania jednego URL-a
+WORKER_MAX_ATTEMPTS = int(os.getenv("WORKER_MAX_ATTEMPTS", "3"))
+# Co ile odkrytych URL-i zapisywać je do kolejki (parsowanie startuje przed końcem zbierania)
+DISCOVERY_FLUSH_SIZE = 50
+
+
+def claim_scrape_log(db: Session) -> models.ScrapeLog | None:
+    """Przejmuje najstarszy oczekujący przebieg do zebrania URL-i."""
+    scrape_log = (
+        db.query(models.ScrapeLog)
+        .filter(models.ScrapeLog.status == "queued")
+        .order_by(models.ScrapeLog.id)
+        .with_for_update(skip_locked=True)
+        .first()
+    )
+    if scrape_log:
+        scrape_log.status = "running"
+        scrape_log.worker_id = WORKER_ID
+    db.commit()
+    return scrape_log
+
+
+def claim_job(db: Session) -> dict | None:
+    """claim_scrape_log jako parametry dla discover() (bez obiektów ORM poza sesją)."""
+    scrape_log = claim_scrape_log(db)
+    if not scrape_log:
+        return None
+    return dict(
+        log_id=scrape_log.id,
+        marketplace=scrape_log.marketplace,
+        limit=scrape_log.scrape_limit,
+        discovery_done=bool(scrape_log.discovery_done),
+        mode=scrape_log.mode or "full",
+        time_budget=scrape_log.time_budget,
+        start_time=scrape_log.start_time,
+    )
+
+
+def claim_batch(db: Session, size: int) -> list[models.ScrapeQueueItem]:
+    """Przejmuje paczkę URL-i oczekujących (lub porzuconych przez inny worker)."""
+    stale_before = datetime.utcnow() - timedelta(seconds=WORKER_CLAIM_TIMEOUT)
+    items = (
+        db.query(models.ScrapeQueueItem)
+        .filter(or_(
+            models.ScrapeQueueItem.status == "pending",
+            and_(models.ScrapeQueueItem.status == "claimed", models.ScrapeQueueItem.claimed_at < stale_before),
+        ))
+        .order_by(models.ScrapeQueueItem.id)
+        .limit(size)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    now = datetime.utcnow()
+    for item in items:
+        item.status = "claimed"
+        item.claimed_by = WORKER_ID
+        item.claimed_at = now
+        item.attempts = (item.attempts or 0) + 1
+    db.commit()
+    return items
+
+
+def finalize_if_done(db: Session, log_id: int) -> bool:
+    """
+    Zamyka przebieg, jeśli URL-e są zebrane, a kolejka przebiegu opróżniona.
+    Blokada wiersza ScrapeLog gwarantuje, że zrobi to dokładnie jeden worker.
+    """
+    scrape_log = (
+        db.query(models.ScrapeLog)
+        .filter(models.ScrapeLog.id == log_id, models.ScrapeLog.status == "running", models.ScrapeLog.discovery_done == 1)
+        .with_for_update(skip_locked=True)
+        .first()
+    )
+    if not scrape_log:
+        db.commit()
+        return False
+
+    counts = queue_counts(db, log_id)
+    if counts.get("pending", 0) or counts.get("claimed", 0):
+        db.commit()
+        return False
+
+    total_urls = sum(counts.values())
+    is_full_scrape = (scrape_log.mode or "full") == "full" and not scrape_log.scrape_limit and not scrape_log.time_budget
+    if is_full_scrape and total_urls:
+        try:
+            archive_missing(db, scrape_log.marketplace, log_id)
+        except Exception as e:
+            logger.error(f"Error during archiving logic: {e}")
+            db.rollback()
+    try:
+        schedule_refreshes(db, scrape_log.marketplace)
+    except Exception as e:
+        logger.error(f"Error scheduling refreshes: {e}")
+        db.rollback()
+    stats = update_stats(db)
+
+    scrape_log.status = "completed"
+    scrape_log.vehicles_scraped = total_urls
+    scrape_log.end_time = datetime.utcnow()
+    scrape_log.total_vehicles_in_db = stats.total_vehicles if stats else db.query(models.Vehicle).count()
+    db.commit()
+    logger.info(f"Przebieg {log_id} ({scrape_log.marketplace}) zakończony: {total_urls} ofert, nieudane: {counts.get('failed', 0)}")
+    return True
+
+
+def budget_expired(start_time: datetime | None, time_budget: int | None) -> bool:
+    return bool(time_budget and start_time and datetime.utcnow() >= start_time + timedelta(seconds=time_budget))
+
+
+def in_session(func, *args):
+    """Wywołuje func(db, *args) we własnej, krótkiej sesji (do asyncio.to_thread)."""
+    with database.SessionLocal() as db:
+        return func(db, *args)
+
+
+@dataclass
+class QueueItem:
+    """Przejęty URL z scrape_queue (kopia wiersza - bez sesji w trakcie parsowania)."""
+    id: int
+    log_id: int
+    marketplace: str
+    url: str
+    dealer_group: str | None
+    attempts: int
+
+
+def claim_work(db: Session, size: int) -> tuple[list[QueueItem], dict[str, dict], dict[int, str]]:
+    """
+    Przejmuje do `size` URL-i: (URL-e do sparsowania, ich walidatory HTTP,
+    przebiegi z URL-ami pominiętymi po przekroczeniu budżetu czasu -> marketplace).
+    """
+    items = claim_batch(db, size)
+    if not items:
+        return [], {}, {}
+    logs = db.query(models.ScrapeLog.id, models.ScrapeLog.start_time, models.ScrapeLog.time_budget).filter(
+        models.ScrapeLog.id.in_({item.log_id for item in items})
+    ).all()
+    expired = {log_id for log_id, start_time, time_budget in logs if budget_expired(start_time, time_budget)}
+    skipped = {}
+    for item in items:
+        if item.log_id in expired:
+            item.status = "skipped"
+            item.error_message = "Przekroczony budżet czasu przebiegu"
+            skipped[item.log_id] = item.marketplace
+    work = [
+        QueueItem(item.id, item.log_id, item.marketplace, item.url, item.dealer_group, item.attempts or 0)
+        for item in items if item.log_id not in expired
+    ]
+    db.commit()
+    return work, load_validators(db, [item.url for item in work]), skipped
+
+
+def save_results(db: Session, results: list[tuple[QueueItem, dict | None, Exception | None]]):
+    """Zapisuje wyniki parsowania (oferty, heartbeaty 304) i statusy URL-i w kolejce - jedna transakcja."""
+    # Zapis paczkami per marketplace i przebieg (normalizacja wyposażenia zależy od źródła)
+    offers: dict[tuple[str, int], list[tuple[str, dict]]] = {}
+    unchanged: dict[int, list[str]] = {}
+    for item, data, error in results:
+        if isinstance(error, NotModified):
+            unchanged.setdefault(item.log_id, []).append(item.url)
+        elif data:
+            offers.setdefault((item.marketplace, item.log_id), []).append((item.url, data))
+    save_errors = {}
+    for (marketplace, log_id), batch in offers.items():
+        save_errors.update(save_offers(db, marketplace, batch, log_id))
+    for log_id, urls in unchanged.items():
+        touch_vehicles(db, urls, log_id, commit=False)
+
+    rows = {row.id: row for row in db.query(models.ScrapeQueueItem).filter(
+        models.ScrapeQueueItem.id.in_([item.id for item, _, _ in results])
+    )}
+    for item, data, error in results:
+        row = rows.get(item.id)
+        if row is None:
+            continue
+        if isinstance(error, NotModified) or (data and item.url not in save_errors):
+            row.status = "done"
+            row.error_message = None
+        elif data:
+            row.status = "failed"
+            row.error_message = save_errors[item.url]
+        elif error is not None and item.attempts < WORKER_MAX_ATTEMPTS:
+            # Błąd sieci / parsera - URL wraca do puli na kolejną próbę
+            row.status = "pending"
+            row.error_message = str(error)
+        else:
+            row.status = "failed"
+            row.error_message = str(error) if error is not None else "Brak danych oferty"
+    db.commit()
+
+
+def finalize_logs(db: Session, logs: dict[int, str]) -> list[str]:
+    """finalize_if_done dla przebiegów; zwraca marketplace zamkniętych przebiegów."""
+    return [marketplace for log_id, marketplace in logs.items() if finalize_if_done(db, log_id)]
+
+
+def mark_discovery_done(db: Session, log_id: int):
+    db.query(models.ScrapeLog).filter(models.ScrapeLog.id == log_id).update({"discovery_done": 1})
+    db.commit()
+
+
+def mark_log_error(db: Session, log_id: int, error: str):
+    db.query(models.ScrapeLog).filter(models.ScrapeLog.id == log_id).update({
+        "status": "error",
+        "error_message": error,
+        "end_time": datetime.utcnow(),
+    })
+    db.commit()
+
+
+async def discover(log_id: int, marketplace: str, limit: int | None = None, discovery_done: bool = False,
+                   mode: str = "full", time_budget: int | None = None, start_time: datetime | None = None):
+    """
+    Zbiera URL-e przebiegu i zapisuje je do kolejki paczkami. Wznowiony przebieg
+    pomija URL-e, które już są w kolejce, a przy ukończonym zbieraniu tylko go zamyka.
+    """
+    runner = None
+    deadline = None
+    if time_budget and start_time:
+        remaining = (start_time + timedelta(seconds=time_budget) - datetime.utcnow()).total_seconds()
+        deadline = time.monotonic() + remaining
+    try:
+        dealer_configs = []
+        if marketplace == "pewneauto" and mode != "refresh":
+            dealer_configs = await asyncio.to_thread(in_session, load_dealer_configs, marketplace)
+        if discovery_done:
+            logger.info(f"[{WORKER_ID}] Przebieg {log_id}: URL-e już zebrane, wznawiam parsowanie")
+        elif marketplace == "pewneauto" and mode != "refresh" and not dealer_configs:
+            logger.warning("No active configs found for pewneauto. Skipping scrape.")
+        else:
+            logger.info(f"[{WORKER_ID}] Zbieranie URL-i dla przebiegu {log_id} ({marketplace}, tryb {mode})")
+            runner = MarketplaceRunner(marketplace, dealer_configs=dealer_configs)
+            if mode == "refresh":
+                due = await asyncio.to_thread(in_session, due_vehicles, marketplace, limit)
+                runner.url_to_group.update({url: group for url, group in due if group})
+
+                async def discovered_urls():
+                    for url, _ in due:
+                        yield url
+                urls = discovered_urls()
+            else:
+                urls = runner.iter_urls(limit=limit)
+            found = 0
+            async for _ in iter_frontier(log_id, marketplace, with_deadline(urls, deadline),
+                                         runner.url_to_group, limit=limit, flush_size=DISCOVERY_FLUSH_SIZE):
+                found += 1
+            logger.info(f"[{WORKER_ID}] Przebieg {log_id}: zebrano {found} nowych URL-i")
+
+        await asyncio.to_thread(in_session, mark_discovery_done, log_id)
+        if await asyncio.to_thread(in_session, finalize_if_done, log_id):
+            await asyncio.to_thread(artifacts.refresh_artifacts, marketplace)
+    except Exception as e:
+        logger.error(f"Scrape task error: {e}")
+        await asyncio.to_thread(in_session, mark_log_error, log_id, str(e))
+    finally:
+        if runner is not None:
+            await runner.aclose()
+
+
+class Worker:
+    """Pętle zbierania i parsowania jednego procesu workera."""
+
+    def __init__(self, batch_size: int = WORKER_BATCH_SIZE):
+        self.batch_size = max(1, batch_size)
+        # Jeden runner (i pula połączeń HTTP) na marketplace przez cały czas życia workera
+        self.runners: dict[str, MarketplaceRunner] = {}
+        self.semaphores: dict[str, asyncio.Semaphore] = {}
+        self.background_tasks: set[asyncio.Task] = set()
+
+    def get_runner(self, marketplace: str) -> MarketplaceRunner:
+        if marketplace not in self.runners:
+            self.runners[marketplace] = MarketplaceRunner(marketplace)
+        return self.runners[marketplace]
+
+    async def discovery_loop(self):
+        while True:
+            try:
+                job = await asyncio.to_thread(in_session, claim_job)
+            except Exception as e:
+                logger.error(f"Błąd przejmowania przebiegu: {e}")
+                job = None
+
+            if job:
+                await discover(**job)
+            else:
+                await asyncio.sleep(WORKER_POLL_INTERVAL)
+
+    async def parse_loop(self):
+        """
+        Utrzymuje do `batch_size` URL-i w locie: dobiera kolejne, gdy zostaje mniej niż
+        połowa, a wyniki zapisuje paczkami (po połowie paczki lub po WORKER_POLL_INTERVAL).
+        """
+        in_flight: set[asyncio.Task] = set()
+        results: list[tuple[QueueItem, dict | None, Exception | None]] = []
+        refill_at = max(1, self.batch_size // 2)
+        next_claim = 0.0
+        oldest_result = 0.0
+        while True:
+            try:
+                if len(in_flight) < refill_at and time.monotonic() >= next_claim:
+                    wanted = self.batch_size - len(in_flight)
+                    items, validators, skipped = await asyncio.to_thread(in_session, claim_work, wanted)
+                    for item in items:
+                        in_flight.add(asyncio.create_task(self.parse_item(item, validators.get(item.url))))
+                    if len(items) < wanted:
+                        # Kolejka (prawie) pusta - następne zapytanie dopiero po odstępie
+                        next_claim = time.monotonic() + WORKER_POLL_INTERVAL
+                    if skipped:
+                        await self.finalize(skipped)
+
+                if in_flight:
+                    done, in_flight = await asyncio.wait(
+                        in_flight, timeout=WORKER_POLL_INTERVAL, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    if done and not results:
+                        oldest_result = time.monotonic()
+                    results += [task.result() for task in done]
+                elif not results:
+                    await asyncio.sleep(max(0.0, next_claim - time.monotonic()))
+
+                if results and (len(results) >= refill_at or not in_flight
+                                or time.monotonic() - oldest_result >= WORKER_POLL_INTERVAL):
+                    batch, results = results, []
+                    await asyncio.to_thread(in_session, save_results, batch)
+                    await self.finalize({item.log_id: item.marketplace for item, _, _ in batch})
+            except Exception as e:
+                # Np. chwilowa utrata połączenia z bazą - przejęte URL-e wrócą do puli po timeoucie
+                logger.error(f"Błąd przetwarzania paczki: {e}")
+                results = []
+                await asyncio.sleep(WORKER_POLL_INTERVAL)
+
+    async def parse_item(self, item: QueueItem, validators: dict | None) -> tuple[QueueItem, dict | None, Exception | None]:
+        """Parsuje jeden URL (limit równoległości per marketplace); błędy zwraca zamiast rzucać."""
+        if item.marketplace not in self.semaphores:
+            self.semaphores[item.marketplace] = asyncio.Semaphore(get_scrape_concurrency(item.marketplace))
+        async with self.semaphores[item.marketplace]:
+            try:
+                runner = self.get_runner(item.marketplace)
+                return item, await runner.parse(item.url, dealer_group=item.dealer_group, validators=validators), None
+            except NotModified as e:
+                return item, None, e
+            except Exception as e:
+                logger.error(f"Error scraping {item.url}: {e}")
+                return item, None, e
+
+    async def finalize(self, logs: dict[int, str]):
+        """Zamyka przebiegi z opróżnioną kolejką i odświeża ich eksporty."""
+        for marketplace in await asyncio.to_thread(in_session, finalize_logs, logs):
+            self.refresh_exports(marketplace)
+
+    def refresh_exports(self, marketplace: str):
+        """Odbudowa gotowych eksportów car-scout w tle - bez wstrzymywania parsowania."""
+        task = asyncio.create_task(asyncio.to_thread(artifacts.refresh_artifacts, marketplace))
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+
+    async def run(self, role: str = "all"):
+        logger.info(f"Worker {WORKER_ID} uruchomiony (rola: {role}, paczka: {self.batch_size})")
+        loops = []
+        if role in ("all", "discovery"):
+            loops.append(self.discovery_loop())
+        if role in ("all", "parse"):
+            loops.append(self.parse_loop())
+        try:
+            await asyncio.gather(*loops)
+        finally:
+            for runner in self.runners.values():
+                await runner.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker scrapujący zasilany kolejką w bazie danych")
+    parser.add_argument("--role", choices=["all", "discovery", "parse"], default="all",
+                        help="Zakres pracy: zbieranie URL-i, parsowanie ofert lub oba (domyślnie)")
+    parser.add_argument("--batch-size", type=int, default=WORKER_BATCH_SIZE,
+                        help="Maksymalna liczba URL-i w locie (dobierane, gdy zostaje mniej niż połowa)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    models.Base.metadata.create_all(bind=database.engine)
+    apply_migrations()
+
+    try:
+        asyncio.run(Worker(batch_size=args.batch_size).run(role=args.role))
+    except KeyboardInterrupt:
+        logger.info(f"Worker {WORKER_ID} zatrzymany")
+    finally:
+        shutdown_parser_pool()
+
+
+if __name__ == "__main__":
+    main()
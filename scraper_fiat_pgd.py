@@ -8,12 +8,11 @@ import argparse
 import asyncio
 import csv
 import logging
-import random
-import time
 from pathlib import Path
 from tqdm import tqdm
 
 from scraper.fiat_pgd import FiatPgdScraper
+from scraper.rate_limiter import configure_rate_limits
 
 
 def setup_logging(verbose: bool = False):
@@ -46,13 +45,14 @@ async def run_scraper(
     url: str = FiatPgdScraper.DEFAULT_LIST_URL,
     output_path: str = "fiat_pgd_car_scout.csv",
     limit: int | None = None,
-    min_delay: float = 0.4,
-    max_delay: float = 1.0,
+    min_delay: float | None = None,
+    max_delay: float | None = None,
     save_to_db: bool = False,
     use_llm: bool = True,
     llm_model: str = "google/gemini-3.5-flash-lite"
 ):
     logger = logging.getLogger("fiat_pgd_runner")
+    configure_rate_limits(min_interval=min_delay, max_interval=max_delay)
     scraper = FiatPgdScraper(use_llm=use_llm, llm_model=llm_model)
 
     logger.info("=" * 60)
@@ -81,9 +81,6 @@ async def run_scraper(
             
             cs_row = scraper.to_car_scout_row(parsed_data)
             car_scout_rows.append(cs_row)
-
-            delay = random.uniform(min_delay, max_delay)
-            time.sleep(delay)
         except Exception as e:
             logger.error(f"Błąd podczas parsowania {item_url}: {e}")
             errors.append({"url": item_url, "error": str(e)})
@@ -91,52 +88,21 @@ async def run_scraper(
     # Opcjonalny zapis do bazy danych
     if save_to_db and full_rows:
         try:
-            import models
             import database
-            from datetime import datetime
-            
-            db = next(database.get_db())
-            model_keys = models.Vehicle.__table__.columns.keys()
-
-            for data in full_rows:
-                v_url = data["url"]
-                vehicle_data = {k: v for k, v in data.items() if k in model_keys}
-                vehicle_data["source"] = "fiat.pgd.pl"
-                vehicle_data["status"] = "active"
-
-                vehicle = db.query(models.Vehicle).filter(models.Vehicle.url == v_url).first()
-                if not vehicle:
-                    vehicle = models.Vehicle(**vehicle_data)
-                    db.add(vehicle)
-                    db.flush()
-                else:
-                    for k, v in vehicle_data.items():
-                        if v is not None and k not in ("id", "url", "created_at", "status"):
-                            setattr(vehicle, k, v)
-
-                equipment_json = {
-                    "technologia": data.get("equipment_audio_multimedia"),
-                    "bezpieczenstwo": data.get("equipment_safety"),
-                    "komfort": data.get("equipment_comfort_extras"),
-                    "wyglad": data.get("equipment_other"),
-                    "additional_info_header": data.get("additional_info_header"),
-                    "additional_info_content": data.get("additional_info_content"),
-                }
-
-                snapshot = models.VehicleSnapshot(
-                    vehicle_id=vehicle.id,
-                    price=data.get("cena_brutto_pln") or data.get("cena_netto_pln"),
-                    old_price=data.get("stara_cena_pln") or data.get("omnibus_lowest_30d_pln"),
-                    mileage=data.get("przebieg_km"),
-                    equipment_json=equipment_json,
-                    tags=data.get("additional_info_header"),
-                    pictures=data.get("zdjecia"),
-                    source="fiat.pgd.pl",
-                    scraped_at=datetime.now()
-                )
-                db.add(snapshot)
-
-            db.commit()
+            from ingest import save_offers, INGEST_BATCH_SIZE
+            from stats import update_stats
+
+            db = database.SessionLocal()
+            try:
+                offers = [(data["url"], {**data, "source": "fiat.pgd.pl"}) for data in full_rows]
+                failed = {}
+                for i in range(0, len(offers), INGEST_BATCH_SIZE):
+                    failed.update(save_offers(db, "fiat_pgd", offers[i:i + INGEST_BATCH_SIZE]))
+                update_stats(db)
+            finally:
+                db.close()
+            if failed:
+                logger.warning(f"Nie zapisano {len(failed)} ofert do bazy danych")
             logger.info("Pomyślnie zaktualizowano bazę danych!")
         except Exception as e:
             logger.error(f"Błąd podczas zapisu do bazy danych: {e}")
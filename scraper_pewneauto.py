@@ -1,11 +1,14 @@
 import re
-import time
 from datetime import datetime
 from urllib.parse import urljoin, urlparse
 
 import requests
 from bs4 import BeautifulSoup
 import pandas as pd
+from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception
+
+from scraper.http_client import make_session, conditional_headers, check_not_modified, response_validators, is_retryable
+from scraper.parser_pool import run_parser
 
 BASE_URL = "https://pewneauto.pl/oferty/_sort/new"
 BASE_LISTING_URL = BASE_URL + "?strona={page}"
@@ -14,19 +17,23 @@ HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36"
 }
 
-def get_soup(url, session, sleep_time=0.5):
+def get_soup(url, session):
+    # Odstępy między requestami reguluje limiter hosta w sesji (scraper.http_client.make_session)
     try:
         resp = session.get(url, headers=HEADERS, timeout=15)
         if resp.status_code == 404:
             return None
         resp.raise_for_status()
-        time.sleep(sleep_time)
         return BeautifulSoup(resp.text, "lxml")
     except requests.exceptions.RequestException as e:
         print(f"Błąd połączenia: {e}")
         return None
 
 def collect_offer_links(session, max_pages=5, base_url="https://pewneauto.pl"):
+    return sorted(set(iter_offer_links(session, max_pages=max_pages, base_url=base_url)))
+
+def iter_offer_links(session, max_pages=5, base_url="https://pewneauto.pl"):
+    """Generator zwracający nowe linki ofert strona po stronie (do potokowego parsowania)."""
     if base_url and not base_url.startswith("http://") and not base_url.startswith("https://"):
         base_url = "https://" + base_url
 
@@ -66,8 +73,8 @@ def collect_offer_links(session, max_pages=5, base_url="https://pewneauto.pl"):
              break
 
         offer_urls.update(page_links)
+        yield from sorted(new_links)
         page += 1
-    return sorted(list(offer_urls))
 
 def _to_int_pl(s: str) -> int | None:
     if not s: return None
@@ -145,10 +152,41 @@ def extract_equipment_groups(soup):
 
     return eq
 
+@retry(
+    reraise=True,
+    stop=stop_after_attempt(3),
+    wait=wait_exponential(multiplier=1, min=1, max=8),
+    retry=retry_if_exception(is_retryable),
+)
+async def fetch_html_async(url, client, validators=None):
+    """
+    Asynchroniczny odpowiednik get_soup - zwraca odpowiedź lub None (404).
+    Błędy transportu, 429 i 5xx są ponawiane (is_retryable), pozostałe błędy HTTP rzucane.
+    Z walidatorami wysyła warunkowy GET - odpowiedź 304 rzuca NotModified.
+    """
+    resp = await client.get(url, headers={**HEADERS, **conditional_headers(validators)})
+    if resp.status_code == 404:
+        return None
+    check_not_modified(resp)
+    resp.raise_for_status()
+    return resp
+
 def scrape_offer(session, url):
     soup = get_soup(url, session)
     if not soup: return None
-    
+    return parse_offer_soup(soup, url)
+
+async def scrape_offer_async(client, url, validators=None):
+    resp = await fetch_html_async(url, client, validators)
+    if not resp: return None
+    data = await run_parser(parse_offer_html, url, resp.content)
+    return {**data, **response_validators(resp)}
+
+def parse_offer_html(url, html):
+    """Parsuje pobrany już HTML oferty (bez dostępu do sieci)."""
+    return parse_offer_soup(BeautifulSoup(html, "lxml"), url)
+
+def parse_offer_soup(soup, url):
     # 1. Tytuł, marka, model, wersja
     title_tag = soup.find(class_="vdp__name__title")
     if not title_tag:
@@ -397,7 +435,7 @@ def scrape_offer(session, url):
     return data
 
 def main(pages=1, sample_data=True):
-    session = requests.Session()
+    session = make_session()
     links = collect_offer_links(session, max_pages=pages)
     
     if sample_data: 
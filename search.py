@@ -0,0 +1,188 @@
+"""
+Search - wyszukiwanie pełnotekstowe po wyposażeniu, tagach i dodatkowych informacjach
+
+Tabela `vehicle_search` trzyma dokument tekstowy każdego pojazdu zbudowany z najnowszego
+snapshotu (wyposażenie, tagi, additional_info_*) - zapisywany razem ze snapshotem w ingest.py.
+Tekst jest normalizowany (małe litery, bez polskich znaków), a słowa zapytania są skracane
+o końcówkę i dopasowywane prefiksowo ("kamera cofania" znajdzie "kamerą cofania" i "kamery cofaniu").
+
+- Postgres: indeks GIN na to_tsvector('simple', document),
+- SQLite: tabela FTS5 `vehicle_search_fts` synchronizowana triggerami.
+
+Filtry fragmentu tekstu (marka, model, miasto dealera) idą przez `text_match` po kolumnach
+znormalizowanych tym samym `normalize_text` (marka_norm, ...; "sko" znajdzie "Škoda"):
+na Postgresie LIKE '%...%' obsłużone indeksami trigramowymi (pg_trgm), na SQLite dopasowanie
+prefiksu po indeksie na kolumnie. Cache facetów dopasowuje w Pythonie tak samo (`text_matches`).
+"""
+import re
+import logging
+import unicodedata
+from sqlalchemy import Connection, and_, bindparam, func, literal_column, or_, select, table, text, update
+from sqlalchemy.orm import Session
+import models
+
+logger = logging.getLogger(__name__)
+
+# Klucze equipment_json trafiające do dokumentu
+EQUIPMENT_KEYS = ("technologia", "komfort", "bezpieczenstwo", "wyglad",
+                  "additional_info_header", "additional_info_content")
+
+TS_CONFIG = literal_column("'simple'::regconfig")
+
+# Kolumny vehicles filtrowane fragmentem tekstu (kolumny <nazwa>_norm i indeksy w ensure_text_match_indexes)
+TEXT_MATCH_COLUMNS = ("marka", "model", "dealer_city")
+
+SQLITE_FTS = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS vehicle_search_fts USING fts5("
+    "document, content='vehicle_search', content_rowid='vehicle_id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS vehicle_search_ai AFTER INSERT ON vehicle_search BEGIN "
+    "INSERT INTO vehicle_search_fts(rowid, document) VALUES (new.vehicle_id, new.document); END",
+    "CREATE TRIGGER IF NOT EXISTS vehicle_search_ad AFTER DELETE ON vehicle_search BEGIN "
+    "INSERT INTO vehicle_search_fts(vehicle_search_fts, rowid, document) VALUES ('delete', old.vehicle_id, old.document); END",
+    "CREATE TRIGGER IF NOT EXISTS vehicle_search_au AFTER UPDATE ON vehicle_search BEGIN "
+    "INSERT INTO vehicle_search_fts(vehicle_search_fts, rowid, document) VALUES ('delete', old.vehicle_id, old.document); "
+    "INSERT INTO vehicle_search_fts(rowid, document) VALUES (new.vehicle_id, new.document); END",
+]
+
+
+def normalize_text(value: str | None) -> str:
+    """Małe litery, bez polskich znaków i interpunkcji - wspólne dla dokumentu i zapytania."""
+    if not value:
+        return ""
+    value = unicodedata.normalize("NFKD", value.lower().replace("ł", "l"))
+    value = "".join(ch for ch in value if not unicodedata.combining(ch))
+    return " ".join(re.findall(r"[a-z0-9]+", value))
+
+
+def build_document(equipment_json: dict | None, *texts: str | None) -> str:
+    """Dokument wyszukiwania z wyposażenia snapshotu (equipment_json + surowe pola tekstowe)."""
+    parts = [(equipment_json or {}).get(key) for key in EQUIPMENT_KEYS] + list(texts)
+    return normalize_text(" | ".join(str(part) for part in parts if part))
+
+
+def snapshot_document(snapshot: dict) -> str:
+    """build_document dla wiersza snapshotu (słownik kolumn vehicle_snapshots)."""
+    return build_document(snapshot.get("equipment_json"), snapshot.get("equipment"),
+                          snapshot.get("additional_equipment"), snapshot.get("tags"))
+
+
+def search_terms(q: str) -> list[str]:
+    """Słowa zapytania skrócone o końcówkę fleksyjną (dopasowanie prefiksowe)."""
+    terms = []
+    for word in normalize_text(q).split():
+        if len(word) > 6:
+            word = word[:-2]
+        elif len(word) > 4:
+            word = word[:-1]
+        terms.append(word)
+    return terms
+
+
+def search_filter(db: Session, q: str | None):
+    """Warunek `Vehicle.id IN (...)` dla zapytania q (wszystkie słowa muszą wystąpić) lub None."""
+    terms = search_terms(q or "")
+    if not terms:
+        return None
+    if db.get_bind().dialect.name == "postgresql":
+        document = func.to_tsvector(TS_CONFIG, models.VehicleSearch.document)
+        query = func.to_tsquery(TS_CONFIG, " & ".join(f"{term}:*" for term in terms))
+        matches = select(models.VehicleSearch.vehicle_id).where(document.op("@@")(query))
+    else:
+        fts = " ".join(f'"{term}"*' for term in terms)
+        matches = select(literal_column("rowid")).select_from(table("vehicle_search_fts")).where(
+            text("vehicle_search_fts MATCH :fts").bindparams(fts=fts)
+        )
+    return models.Vehicle.id.in_(matches)
+
+
+def ensure_search_index(conn: Connection):
+    """
+    Indeks wyszukiwania dla silnika bazy (GIN / FTS5) i uzupełnienie dokumentów
+    istniejących pojazdów, gdy tabela vehicle_search jest pusta.
+    """
+    if conn.dialect.name == "postgresql":
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_vehicle_search_document ON vehicle_search "
+            "USING GIN (to_tsvector('simple'::regconfig, document))"
+        ))
+    elif conn.dialect.name == "sqlite":
+        for statement in SQLITE_FTS:
+            conn.execute(text(statement))
+
+    if conn.execute(select(models.VehicleSearch.vehicle_id).limit(1)).first():
+        return
+    snapshots = models.VehicleSnapshot.__table__
+    rows = conn.execute(
+        select(models.Vehicle.id, snapshots.c.equipment_json, snapshots.c.equipment,
+               snapshots.c.additional_equipment, snapshots.c.tags)
+        .join(snapshots, snapshots.c.id == models.Vehicle.latest_snapshot_id)
+    )
+    documents = [
+        {"vehicle_id": vehicle_id, "document": build_document(equipment, *texts)}
+        for vehicle_id, equipment, *texts in rows
+    ]
+    if documents:
+        logger.info(f"Uzupełnianie indeksu wyszukiwania dla {len(documents)} pojazdów")
+        conn.execute(models.VehicleSearch.__table__.insert(), documents)
+
+
+def prefix_text_match(db: Session) -> bool:
+    """Czy text_match dopasowuje prefiks (SQLite), a nie dowolny fragment (Postgres)."""
+    return db.get_bind().dialect.name != "postgresql"
+
+
+def text_match(db: Session, column, value: str):
+    """
+    Filtr fragmentu tekstu dla kolumny po jej wersji znormalizowanej (<kolumna>_norm):
+    LIKE '%value%' na Postgresie (indeks pg_trgm), prefiks na SQLite (zakres po indeksie).
+    """
+    normalized = getattr(models.Vehicle, f"{column.key}_norm")
+    needle = normalize_text(value)  # tylko [a-z0-9 ] - bez znaków specjalnych LIKE
+    if not prefix_text_match(db):
+        return normalized.like(f"%{needle}%")
+    return and_(normalized >= needle, normalized < needle + "\U0010ffff")
+
+
+def text_matches(normalized_value: str, needle: str, prefix: bool) -> bool:
+    """Odpowiednik text_match w Pythonie (cache facetów); obie wartości po normalize_text."""
+    return normalized_value.startswith(needle) if prefix else needle in normalized_value
+
+
+def _fill_normalized_columns(conn: Connection):
+    """Uzupełnia <kolumna>_norm pojazdów zapisanych przed ich dodaniem."""
+    vehicles = models.Vehicle.__table__
+    pending = or_(*[and_(vehicles.c[name].isnot(None), vehicles.c[f"{name}_norm"].is_(None))
+                    for name in TEXT_MATCH_COLUMNS])
+    rows = conn.execute(select(vehicles.c.id, *[vehicles.c[name] for name in TEXT_MATCH_COLUMNS]).where(pending)).all()
+    if not rows:
+        return
+    logger.info(f"Uzupełnianie znormalizowanych kolumn filtrów dla {len(rows)} pojazdów")
+    conn.execute(
+        update(vehicles).where(vehicles.c.id == bindparam("vehicle_id")),
+        [{"vehicle_id": row[0], **{f"{name}_norm": normalize_text(value) or None
+                                   for name, value in zip(TEXT_MATCH_COLUMNS, row[1:])}} for row in rows],
+    )
+
+
+def ensure_text_match_indexes(conn: Connection):
+    """
+    Kolumny znormalizowane i indeksy dla text_match: GIN gin_trgm_ops (Postgres)
+    lub B-tree (SQLite). Indeksy z surowych kolumn (poprzednia wersja) są usuwane.
+    """
+    _fill_normalized_columns(conn)
+    dialect = conn.dialect.name
+    for name in TEXT_MATCH_COLUMNS:
+        conn.execute(text(f"DROP INDEX IF EXISTS ix_vehicles_{name}_trgm"))
+        conn.execute(text(f"DROP INDEX IF EXISTS ix_vehicles_{name}_lower"))
+    if dialect == "postgresql":
+        try:
+            with conn.begin_nested():
+                conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        except Exception as e:
+            logger.warning(f"Brak rozszerzenia pg_trgm ({e}) - filtry tekstowe bez indeksu trigramowego")
+            return
+        for name in TEXT_MATCH_COLUMNS:
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_vehicles_{name}_norm_trgm ON vehicles USING GIN ({name}_norm gin_trgm_ops)"))
+    elif dialect == "sqlite":
+        for name in TEXT_MATCH_COLUMNS:
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_vehicles_{name}_norm ON vehicles ({name}_norm)"))
@@ -0,0 +1,113 @@
+"""
+Stats - agregaty dla GET /stats utrzymywane przyrostowo
+
+Tabela `source_stats` ma wiersz na źródło i wiersz łączny (ALL_SOURCES). Liczniki snapshotów
+(liczba, suma i liczba cen) są doliczane w transakcji zapisu paczki (ingest._count_snapshots),
+więc nie zależą od kolejności commitów równoległych workerów. Po zakończeniu przebiegu
+`update_stats` przelicza tylko liczniki pojazdów (rozmiar bieżącej oferty, nie historii),
+a /stats czyta jeden wiersz niezależnie od liczby snapshotów.
+
+Pierwsze przeliczenie (brak wiersza łącznego, np. po wdrożeniu lub wyczyszczeniu bazy) liczy
+wszystkie snapshoty; na Postgresie pod blokadą SHARE tabeli vehicle_snapshots, która czeka na
+trwające zapisy i wstrzymuje nowe do commitu - żaden snapshot nie zostanie pominięty ani
+policzony dwa razy.
+"""
+import logging
+from datetime import datetime
+from sqlalchemy import func, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+import models
+
+logger = logging.getLogger(__name__)
+
+ALL_SOURCES = "*"
+
+
+def _count_all_snapshots(db: Session, rows: dict[str, models.SourceStats]) -> models.SourceStats:
+    """Jednorazowe przeliczenie liczników snapshotów (tworzy wiersz łączny)."""
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("LOCK TABLE vehicle_snapshots IN SHARE MODE"))
+    for row in rows.values():
+        row.total_snapshots = row.price_sum = row.price_count = 0
+    total = rows[ALL_SOURCES] = models.SourceStats(source=ALL_SOURCES, total_snapshots=0, price_sum=0, price_count=0)
+    db.add(total)
+    snapshots = db.query(
+        models.VehicleSnapshot.source,
+        func.count(models.VehicleSnapshot.id),
+        func.coalesce(func.sum(models.VehicleSnapshot.price), 0),
+        func.count(models.VehicleSnapshot.price),
+    ).group_by(models.VehicleSnapshot.source).all()
+    for source, count, price_sum, price_count in snapshots:
+        targets = [total]
+        if source:
+            if source not in rows:
+                rows[source] = models.SourceStats(source=source)
+                db.add(rows[source])
+            targets.append(rows[source])
+        for row in targets:
+            row.total_snapshots = (row.total_snapshots or 0) + count
+            row.price_sum = (row.price_sum or 0) + int(price_sum)
+            row.price_count = (row.price_count or 0) + price_count
+    db.flush()
+    return total
+
+
+def _update_stats(db: Session) -> models.SourceStats:
+    rows = {row.source: row for row in db.query(models.SourceStats).with_for_update()}
+    total = rows.get(ALL_SOURCES)
+    if total is None:
+        total = _count_all_snapshots(db, rows)
+
+    vehicles = {
+        source: (count, brands) for source, count, brands in db.query(
+            models.Vehicle.source, func.count(models.Vehicle.id), func.count(func.distinct(models.Vehicle.marka))
+        ).group_by(models.Vehicle.source)
+    }
+
+    now = datetime.utcnow()
+    for source in set(vehicles) | set(rows):
+        if not source or source == ALL_SOURCES:
+            continue
+        if source not in rows:
+            rows[source] = models.SourceStats(source=source, total_snapshots=0, price_sum=0, price_count=0)
+            db.add(rows[source])
+        row = rows[source]
+        row.total_vehicles, row.unique_brands = vehicles.get(source, (0, 0))
+        row.updated_at = now
+    total.total_vehicles = sum(count for count, _ in vehicles.values())
+    total.unique_brands = db.query(func.count(func.distinct(models.Vehicle.marka))).scalar() or 0
+    total.updated_at = now
+    db.commit()
+    return total
+
+
+def update_stats(db: Session) -> models.SourceStats | None:
+    """Przelicza liczniki pojazdów (przy pierwszym wywołaniu także snapshotów); zwraca wiersz łączny."""
+    for _ in range(3):
+        try:
+            return _update_stats(db)
+        except IntegrityError:
+            # Wiersz łączny utworzony w międzyczasie przez inny proces
+            db.rollback()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Błąd aktualizacji statystyk (source_stats): {e}")
+            return None
+    logger.error("Nie udało się zaktualizować statystyk (source_stats)")
+    return None
+
+
+def read_stats(db: Session, source: str | None = None) -> dict:
+    """Statystyki dla /stats z source_stats (łączne lub jednego źródła)."""
+    row = db.get(models.SourceStats, source or ALL_SOURCES)
+    if row is None and source is None:
+        row = update_stats(db)  # pierwsze odczytanie po wdrożeniu - jednorazowe przeliczenie
+    if row is None:
+        return {"total_vehicles": 0, "total_snapshots": 0, "avg_price": 0.0, "unique_brands": 0}
+    return {
+        "total_vehicles": row.total_vehicles or 0,
+        "total_snapshots": row.total_snapshots or 0,
+        "avg_price": row.price_sum / row.price_count if row.price_count else 0.0,
+        "unique_brands": row.unique_brands or 0,
+    }
@@ -0,0 +1,50 @@
+"""
+Wspólne fixtures testów: osobna baza SQLite w katalogu tymczasowym, czyszczona przed każdym testem.
+
+Zmienne środowiskowe muszą być ustawione przed importem modułów aplikacji (database.py
+tworzy silnik przy imporcie).
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+TEST_DIR = Path(tempfile.mkdtemp(prefix="auto-scraper-tests-"))
+os.environ["DATABASE_URL"] = f"sqlite:///{TEST_DIR / 'test.db'}"
+os.environ["EXPORT_DIR"] = str(TEST_DIR / "export_artifacts")
+# Wersja danych sprawdzana przy każdym odczycie - cache odpowiedzi widzi zapis od razu
+os.environ["CACHE_VERSION_CHECK_SECONDS"] = "0"
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pytest
+from fastapi.testclient import TestClient
+
+import api
+import cache
+import database
+import models
+
+
+@pytest.fixture
+def db():
+    with database.engine.begin() as conn:
+        for table in reversed(models.Base.metadata.sorted_tables):
+            conn.execute(table.delete())
+    # Identyfikatory w SQLite mogą się powtórzyć po czyszczeniu - nowa generacja wersji danych
+    cache.data_version.invalidate()
+    session = database.SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def client(db):
+    return TestClient(api.app)
+
+
+def offer(marka="Škoda", model="Octavia", price=50000, **fields) -> dict:
+    """Sparsowana oferta w formacie parserów (klucze jak w scraperach)."""
+    return {"source": "findcar.pl", "marka": marka, "model": model, "cena_brutto_pln": price,
+            "dealer_city": "Łódź", **fields}
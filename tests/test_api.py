@@ -0,0 +1,66 @@
+from ingest import save_offers
+from conftest import offer
+
+
+def test_vehicles_keyset_pagination_walks_all_pages(db, client):
+    save_offers(db, "findcar", [(f"u{i}", offer(price=1000 * (i % 3))) for i in range(7)])
+
+    for sort in ("newest", "price_asc"):
+        seen, cursor = [], None
+        while True:
+            params = {"limit": 3, "sort": sort, **({"cursor": cursor} if cursor else {})}
+            response = client.get("/vehicles", params=params)
+            assert response.status_code == 200
+            seen += [v["id"] for v in response.json()]
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+        assert sorted(seen) == sorted(set(seen)) and len(seen) == 7
+
+    assert client.get("/vehicles", params={"cursor": "zepsuty"}).status_code == 400
+
+
+def test_vehicles_count_header_is_opt_in(db, client):
+    save_offers(db, "findcar", [("u1", offer()), ("u2", offer(marka="Kia"))])
+
+    assert "X-Total-Count" not in client.get("/vehicles").headers
+    response = client.get("/vehicles", params={"count": "true", "marka": "sko"})
+    assert response.headers["X-Total-Count"] == "1"
+    assert response.headers["X-Total-Count-Exact"] == "true"
+
+
+def test_text_filters_fold_diacritics_like_facets(db, client):
+    save_offers(db, "findcar", [("u1", offer()), ("u2", offer(marka="Kia", model="Ceed", dealer_city="Kraków"))])
+
+    assert [v["url"] for v in client.get("/vehicles", params={"marka": "sko"}).json()] == ["u1"]
+    assert [v["url"] for v in client.get("/vehicles", params={"miasto": "LODZ"}).json()] == ["u1"]
+    assert client.get("/models", params={"marka": "sko"}).json() == ["Octavia"]
+
+
+def test_change_feed_pages_by_cursor(db, client):
+    save_offers(db, "findcar", [("u1", offer(price=1)), ("u2", offer(price=2)), ("u3", offer(price=3))], run_id=1)
+    save_offers(db, "findcar", [("u1", offer(price=5))], run_id=2)
+
+    page = client.get("/api/public/vehicles/changes", params={"since": 0, "limit": 3}).json()
+    assert [c["type"] for c in page["changes"]] == ["new", "new", "new"]
+    assert page["has_more"] is True
+
+    page = client.get("/api/public/vehicles/changes", params={"since": page["next_cursor"]}).json()
+    assert [(c["type"], c["fields"], c["vehicle"]["price"]) for c in page["changes"]] == [("updated", ["price"], 5)]
+    assert page["has_more"] is False
+
+    empty = client.get("/api/public/vehicles/changes", params={"since": page["next_cursor"]}).json()
+    assert empty["changes"] == [] and empty["next_cursor"] == page["next_cursor"]
+
+
+def test_etag_revalidation_until_data_changes(db, client):
+    save_offers(db, "findcar", [("u1", offer())])
+
+    first = client.get("/vehicles")
+    etag = first.headers["ETag"]
+    assert client.get("/vehicles", headers={"If-None-Match": etag}).status_code == 304
+
+    save_offers(db, "findcar", [("u2", offer())])
+    changed = client.get("/vehicles", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag and len(changed.json()) == 2
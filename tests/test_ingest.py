@@ -0,0 +1,71 @@
+from sqlalchemy import func
+
+import models
+from ingest import archive_missing, save_offers, touch_vehicles
+from conftest import offer
+
+
+def changes(db):
+    return [(c.change_type, c.changed_fields) for c in db.query(models.VehicleChange).order_by(models.VehicleChange.id)]
+
+
+def test_upsert_keeps_one_vehicle_and_points_at_latest_snapshot(db):
+    save_offers(db, "findcar", [("u1", offer(price=50000))], run_id=1)
+    save_offers(db, "findcar", [("u1", offer(price=48000))], run_id=2)
+
+    vehicle = db.query(models.Vehicle).one()
+    latest = db.query(func.max(models.VehicleSnapshot.id)).scalar()
+    assert db.query(models.VehicleSnapshot).filter_by(vehicle_id=vehicle.id).count() == 2
+    assert vehicle.latest_snapshot_id == latest
+    assert db.get(models.VehicleSnapshot, latest).price == 48000
+    assert vehicle.last_seen_run_id == 2
+    assert vehicle.marka_norm == "skoda" and vehicle.dealer_city_norm == "lodz"
+
+
+def test_upsert_does_not_overwrite_with_missing_values(db):
+    save_offers(db, "findcar", [("u1", offer(vin="VIN1", http_etag='"a"'))])
+    save_offers(db, "findcar", [("u1", offer(model=None, vin=None, http_etag=None))])
+
+    vehicle = db.query(models.Vehicle).one()
+    assert (vehicle.model, vehicle.vin) == ("Octavia", "VIN1")
+    # Walidatory HTTP zawsze z ostatniej odpowiedzi
+    assert vehicle.http_etag is None
+
+
+def test_duplicate_urls_in_batch_keep_last_offer(db):
+    save_offers(db, "findcar", [("u1", offer(price=1)), ("u1", offer(price=2))])
+
+    assert db.query(models.Vehicle).count() == 1
+    assert [s.price for s in db.query(models.VehicleSnapshot)] == [2]
+
+
+def test_failed_batch_is_saved_offer_by_offer(db):
+    bad = offer(marka={"nie": "tekst"})
+    errors = save_offers(db, "findcar", [("u1", offer()), ("u2", bad), ("u3", offer())])
+
+    assert list(errors) == ["u2"]
+    assert sorted(url for url, in db.query(models.Vehicle.url)) == ["u1", "u3"]
+
+
+def test_change_log_records_new_and_price_updates(db):
+    save_offers(db, "findcar", [("u1", offer(price=50000, przebieg_km=10))])
+    save_offers(db, "findcar", [("u1", offer(price=50000, przebieg_km=10))])
+    save_offers(db, "findcar", [("u1", offer(price=47000, przebieg_km=10))])
+
+    assert changes(db) == [("new", None), ("updated", ["price"])]
+
+
+def test_archive_missing_archives_vehicles_not_seen_in_run(db):
+    save_offers(db, "findcar", [("u1", offer()), ("u2", offer())], run_id=1)
+    save_offers(db, "autopunkt", [("a1", offer(source="autopunkt.pl"))], run_id=1)
+    save_offers(db, "findcar", [("u1", offer())], run_id=2)
+
+    assert archive_missing(db, "findcar", 2) == 1
+    statuses = dict(db.query(models.Vehicle.url, models.Vehicle.status))
+    assert statuses == {"u1": "active", "u2": "archiwum", "a1": "active"}
+    assert changes(db)[-1] == ("archived", None)
+
+    # Oferta wraca bez zmian treści (304) - znów aktywna, zmiana statusu w dzienniku
+    touch_vehicles(db, ["u2"], run_id=3)
+    assert db.query(models.Vehicle).filter_by(url="u2").one().status == "active"
+    assert changes(db)[-1] == ("updated", ["status"])
@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta
+
+import models
+from ingest import enqueue_urls, save_offers
+from scraper.worker import claim_batch, claim_work, WORKER_CLAIM_TIMEOUT
+from conftest import offer
+
+
+def scrape_log(db, **fields) -> int:
+    log = models.ScrapeLog(marketplace="findcar", status="running", **fields)
+    db.add(log)
+    db.commit()
+    return log.id
+
+
+def test_claim_batch_hands_out_each_url_once(db):
+    log_id = scrape_log(db)
+    enqueue_urls(db, log_id, "findcar", [f"u{i}" for i in range(5)])
+
+    first = [item.url for item in claim_batch(db, 3)]
+    second = [item.url for item in claim_batch(db, 3)]
+
+    assert first == ["u0", "u1", "u2"] and second == ["u3", "u4"]
+    assert claim_batch(db, 3) == []
+    assert {item.status for item in db.query(models.ScrapeQueueItem)} == {"claimed"}
+
+
+def test_stale_claims_are_reclaimed(db):
+    log_id = scrape_log(db)
+    enqueue_urls(db, log_id, "findcar", ["u0"])
+    claim_batch(db, 1)
+    db.query(models.ScrapeQueueItem).update(
+        {"claimed_at": datetime.utcnow() - timedelta(seconds=WORKER_CLAIM_TIMEOUT + 1)}
+    )
+    db.commit()
+
+    [item] = claim_batch(db, 1)
+    assert (item.url, item.attempts) == ("u0", 2)
+
+
+def test_claim_work_returns_validators_and_skips_expired_runs(db):
+    save_offers(db, "findcar", [("u0", offer(http_etag='"e0"'))])
+    log_id = scrape_log(db)
+    expired_id = scrape_log(db, start_time=datetime.utcnow() - timedelta(hours=2), time_budget=60)
+    enqueue_urls(db, log_id, "findcar", ["u0", "u1"])
+    enqueue_urls(db, expired_id, "findcar", ["u2"])
+
+    items, validators, skipped = claim_work(db, 10)
+
+    assert [item.url for item in items] == ["u0", "u1"]
+    assert validators == {"u0": {"http_etag": '"e0"', "http_last_modified": None}}
+    assert skipped == {expired_id: "findcar"}
+    assert db.query(models.ScrapeQueueItem).filter_by(url="u2").one().status == "skipped"
@@ -46,7 +46,7 @@ export interface ScrapeLog {
 const API_BASE_URL = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000";
 
 export async function getScrapeLogs(limit: number = 5): Promise<ScrapeLog[]> {
-    const res = await fetch(`${API_BASE_URL}/scrape/logs?limit=${limit}`, { cache: "no-store" });
+    const res = await fetch(`${API_BASE_URL}/scrape/logs?limit=${limit}`, { cache: "no-cache" });
     if (!res.ok) throw new Error("Failed to fetch scrape logs");
     return res.json();
 }
@@ -60,19 +60,20 @@ export async function getVehicles(filters: {
     cena_min?: string;
     cena_max?: string;
     miasto?: string;
+    q?: string;
 } = {}): Promise<Vehicle[]> {
     const url = new URL(`${API_BASE_URL}/vehicles`);
     Object.entries(filters).forEach(([key, value]) => {
         if (value) url.searchParams.append(key, value);
     });
 
-    const res = await fetch(url.toString(), { cache: "no-store" });
+    const res = await fetch(url.toString(), { cache: "no-cache" });
     if (!res.ok) throw new Error("Failed to fetch vehicles");
     return res.json();
 }
 
 export async function getBrands(): Promise<string[]> {
-    const res = await fetch(`${API_BASE_URL}/brands`, { cache: "no-store" });
+    const res = await fetch(`${API_BASE_URL}/brands`, { cache: "no-cache" });
     if (!res.ok) throw new Error("Failed to fetch brands");
     return res.json();
 }
@@ -80,33 +81,33 @@ export async function getBrands(): Promise<string[]> {
 export async function getModels(marka?: string): Promise<string[]> {
     const url = new URL(`${API_BASE_URL}/models`);
     if (marka) url.searchParams.append("marka", marka);
-    const res = await fetch(url.toString(), { cache: "no-store" });
+    const res = await fetch(url.toString(), { cache: "no-cache" });
     if (!res.ok) throw new Error("Failed to fetch models");
     return res.json();
 }
 
 export async function getCities(): Promise<string[]> {
-    const res = await fetch(`${API_BASE_URL}/cities`, { cache: "no-store" });
+    const res = await fetch(`${API_BASE_URL}/cities`, { cache: "no-cache" });
     if (!res.ok) throw new Error("Failed to fetch cities");
     return res.json();
 }
 
 export async function getStats(): Promise<Stats> {
-    const res = await fetch(`${API_BASE_URL}/stats`, { cache: "no-store" });
+    const res = await fetch(`${API_BASE_URL}/stats`, { cache: "no-cache" });
     if (!res.ok) throw new Error("Failed to fetch stats");
     return res.json();
 }
 
 export async function getVehicleTrends(vehicleId: number): Promise<PriceTrend[]> {
     const res = await fetch(`${API_BASE_URL}/vehicles/${vehicleId}/trends`, {
-        cache: "no-store",
+        cache: "no-cache",
     });
     if (!res.ok) throw new Error("Failed to fetch vehicle trends");
     return res.json();
 }
 
 export async function getSources(): Promise<string[]> {
-    const res = await fetch(`${API_BASE_URL}/sources`, { cache: "no-store" });
+    const res = await fetch(`${API_BASE_URL}/sources`, { cache: "no-cache" });
     if (!res.ok) throw new Error("Failed to fetch sources");
     return res.json();
 }